@@ -1,38 +1,227 @@
+import asyncio
+import hmac
+import json
 import os
+import time
+import typing as t
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Header, Query, Request, Response
 from fastapi.security import APIKeyHeader
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from app.maze.maze_service import MazeService, MazeNotFoundException
+from app import metrics
+from app.profiling import RequestProfile
+
+from app.maze.incremental import IncrementalSolutions
+from app.maze.maze_service import MazeService, MazeNotFoundException, EagerSolver, InvalidMazeEditException, \
+    InvalidRouteException
 from app.maze.maze_solver import MazeException
-from app.maze.models import CreateMazePayload, Steps
+from app.maze.models import CreateMazePayload, Steps, MazeField, CreateMazeBatchPayload, SolutionBatchPayload, \
+    PathFormat, MazeEdit, parse_coords
+from app.maze.routes import RouteIndexes
+from app.maze.solver_executor import SolverExecutor, SolverBusyException, SolverTimeoutException
+from app.maze.solution_cache import SolutionCache, InMemorySolutionCache, SqliteSolutionCache, NoSolutionCache
+from app.maze.utils import path_runs
 from app.user.models import User
+from app.user.tokens import TokenCache, TokenSigner
 from app.user.user_service import UserService, Credentials, AuthException, UserAlreadyExistsException
-from .database import SessionLocal, engine
-from sqlalchemy.orm import Session
-
-from .persistence.persistence import Persistence, SqlAlchemyPersistence
+from .database import AsyncSessionLocal, SessionLocal, async_engine
+from .persistence.async_persistence import AsyncSqlAlchemyPersistence, init_db_async
+from .persistence.persistence import Persistence, SqlAlchemyPersistence, init_db, sqlalchemy_persistence
 
 app = FastAPI()
 auth = APIKeyHeader(name="X-Token")
 
 
-def get_persistence():
-    return SqlAlchemyPersistence(SessionLocal)
+def create_solution_cache() -> SolutionCache:
+    backend = os.getenv('SOLUTION_CACHE', 'memory')
+    max_entries = int(os.getenv('SOLUTION_CACHE_MAX_ENTRIES', '10000'))
+    max_bytes = int(os.getenv('SOLUTION_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    if backend == 'memory':
+        return InMemorySolutionCache(max_entries, max_bytes)
+    if backend == 'sqlite':
+        return SqliteSolutionCache(os.getenv('SOLUTION_CACHE_PATH', 'solution_cache.sqlite3'), max_entries, max_bytes)
+    return NoSolutionCache()
+
+
+def create_eager_solver() -> t.Optional[EagerSolver]:
+    if os.getenv('EAGER_SOLVE', 'false').lower() != 'true':
+        return None
+    return EagerSolver(solver_executor, sqlalchemy_persistence)
+
+
+def create_solver_executor() -> SolverExecutor:
+    # split the cores between the uvicorn workers running on this host
+    web_workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+    default_workers = max(1, (os.cpu_count() or 1) // web_workers)
+    max_workers = int(os.getenv('SOLVER_WORKERS', str(default_workers)))
+    return SolverExecutor(max_workers=max_workers,
+                          max_pending=int(os.getenv('SOLVER_QUEUE_DEPTH', str(4 * max_workers))),
+                          timeout=float(os.getenv('SOLVER_TIMEOUT', '10')),
+                          retry_after=int(os.getenv('SOLVER_RETRY_AFTER', '1')),
+                          max_expansions=solver_max_expansions, time_limit=solver_time_limit,
+                          numpy_min_cells=solver_numpy_min_cells,
+                          # unset or 0 keeps solving whole grids
+                          tiled_min_cells=int(os.getenv('SOLVER_TILED_MIN_CELLS', '0')) or None,
+                          tile_size=int(os.getenv('SOLVER_TILE_SIZE', '32')),
+                          tile_cache_size=int(os.getenv('SOLVER_TILE_CACHE_SIZE', '100000')))
+
+
+def create_incremental_solutions() -> t.Optional[IncrementalSolutions]:
+    # 0 disables incremental repair of edited mazes
+    max_mazes = int(os.getenv('INCREMENTAL_SOLVER_MAZES', '64'))
+    if max_mazes <= 0:
+        return None
+    return IncrementalSolutions(max_mazes)
+
+
+def create_route_indexes() -> RouteIndexes:
+    return RouteIndexes(int(os.getenv('ROUTE_INDEX_MAZES', '64')))
+
+
+def create_token_cache() -> t.Optional[TokenCache]:
+    if os.getenv('TOKEN_CACHE', 'true').lower() != 'true':
+        return None
+    return TokenCache(ttl=float(os.getenv('TOKEN_CACHE_TTL', '30')),
+                      negative_ttl=float(os.getenv('TOKEN_CACHE_NEGATIVE_TTL', '5')),
+                      max_size=int(os.getenv('TOKEN_CACHE_MAX_SIZE', '100000')))
+
+
+def create_token_signer() -> t.Optional[TokenSigner]:
+    secret = os.getenv('AUTH_TOKEN_SECRET')
+    if not secret:
+        return None
+    if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        # each worker keeps its own revoked tokens, a logout would only hold in the worker that served it
+        raise RuntimeError("AUTH_TOKEN_SECRET can't be used with more than one uvicorn worker, "
+                           "logged out tokens would still be accepted by the other workers.")
+    return TokenSigner(secret, ttl=int(os.getenv('AUTH_TOKEN_TTL', '86400')))
+
+
+solver_max_expansions = int(os.getenv('SOLVER_MAX_EXPANSIONS', '200000'))
+solver_time_limit = float(os.getenv('SOLVER_TIME_LIMIT', '2.0'))
+# 0 disables the NumPy backend
+solver_numpy_min_cells = int(os.getenv('SOLVER_NUMPY_MIN_CELLS', '250000')) or None
+slow_solve_seconds = float(os.getenv('SLOW_SOLVE_SECONDS', '0')) or None
+solution_cache = create_solution_cache()
+solver_executor = create_solver_executor()
+eager_solver = create_eager_solver()
+incremental_solutions = create_incremental_solutions()
+route_indexes = create_route_indexes()
+token_cache = create_token_cache()
+token_signer = create_token_signer()
+
+
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # the router leaves the matched endpoint in the scope, which keeps the label free of path parameters
+    endpoint = request.scope.get('endpoint')
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         handler=endpoint.__name__ if endpoint is not None else 'none',
+                                         status=response.status_code)
+    return response
+
+
+if os.getenv('METRICS', 'false').lower() == 'true':
+    metrics.enable()
+    app.middleware("http")(record_request_metrics)
+
+
+profile_token = os.getenv('PROFILE_TOKEN')
+profile_requests = os.getenv('PROFILE_REQUESTS', 'false').lower() == 'true'
+profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+profile_top = int(os.getenv('PROFILE_TOP', '10'))
+
+
+async def profile_request(request: Request, call_next):
+    token = request.headers.get('X-Profile')
+    # compare_digest only takes ASCII strings, and any byte can come in a header
+    requested = token is not None and profile_token is not None and \
+        hmac.compare_digest(token.encode('utf-8'), profile_token.encode('utf-8'))
+    if not (profile_requests or requested) or RequestProfile.busy():
+        return await call_next(request)
+
+    with RequestProfile() as profile:
+        response = await call_next(request)
+    await asyncio.to_thread(profile.save, profile_dir)
+    response.headers['X-Profile-Id'] = profile.id
+    response.headers['X-Profile-Summary'] = profile.summary(profile_top)
+    return response
+
+
+if profile_requests or profile_token:
+    app.middleware("http")(profile_request)
+
+
+@app.on_event("shutdown")
+def stop_solver():
+    solver_executor.shutdown()
+
+
+@app.on_event("startup")
+async def create_schema():
+    if async_engine is not None:
+        await init_db_async(async_engine)
+    else:
+        await asyncio.to_thread(init_db)
+
+
+async def get_persistence():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield AsyncSqlAlchemyPersistence(session)
+    else:
+        session = SessionLocal()
+        try:
+            yield SqlAlchemyPersistence(session)
+        finally:
+            await asyncio.to_thread(session.close)
+
+
+def get_solution_cache():
+    return solution_cache
+
+
+def get_eager_solver():
+    return eager_solver
 
 
-def get_user_service(persistence=Depends(get_persistence)):
-    return UserService(persistence, os.getenv('PASSWORD_SALT', '1234567890'))
+def get_incremental_solutions():
+    return incremental_solutions
 
 
-def get_maze_service(persistence=Depends(get_persistence)):
-    return MazeService(persistence)
+def get_route_indexes():
+    return route_indexes
 
 
-def get_user(token: str = Depends(auth),
-             user_service=Depends(get_user_service)):
-    return user_service.get_user_for_token_or_throw(token)
+def get_solver_executor():
+    return solver_executor
+
+
+def get_token_cache():
+    return token_cache
+
+
+def get_token_signer():
+    return token_signer
+
+
+def get_user_service(persistence=Depends(get_persistence), cache=Depends(get_token_cache),
+                     signer=Depends(get_token_signer)):
+    return UserService(persistence, os.getenv('PASSWORD_SALT', '1234567890'), cache, signer)
+
+
+def get_maze_service(persistence=Depends(get_persistence), cache=Depends(get_solution_cache),
+                     eager=Depends(get_eager_solver), solver=Depends(get_solver_executor),
+                     incremental=Depends(get_incremental_solutions), routes=Depends(get_route_indexes)):
+    return MazeService(persistence, cache, eager, solver, slow_solve_seconds, incremental, routes)
+
+
+async def get_user(token: str = Depends(auth),
+                   user_service=Depends(get_user_service)):
+    with metrics.AUTH_SECONDS.time():
+        return await user_service.get_user_for_token_or_throw(token)
 
 
 @app.get("/")
@@ -42,35 +231,146 @@ async def root():
 
 @app.post("/user")
 async def register(user: User, user_service=Depends(get_user_service)):
-    user_service.register(user)
+    await user_service.register(user)
     return {'username': user.username}
 
 
 @app.post("/login")
 async def login(credentials: Credentials, user_service=Depends(get_user_service)):
-    token = user_service.login(credentials)
+    token = await user_service.login(credentials)
     return {'token': token}
 
 
+@app.post("/logout")
+async def logout(token: str = Depends(auth), user_service=Depends(get_user_service)):
+    await user_service.logout(token)
+    return {}
+
+
 @app.get("/maze")
-async def get_mazes(user=Depends(get_user), maze_service: MazeService = Depends(get_maze_service)):
-    return maze_service.get_mazes(user)
+async def get_mazes(response: Response,
+                    limit: int = Query(100, ge=1, le=1000),
+                    after: t.Optional[str] = None,
+                    fields: t.Optional[t.List[MazeField]] = Query(None),
+                    user=Depends(get_user),
+                    maze_service: MazeService = Depends(get_maze_service)):
+    if fields and MazeField.ID not in fields:
+        fields = [MazeField.ID] + fields
+    mazes = await maze_service.get_mazes(user, limit=limit, after=after, fields=fields)
+    if len(mazes) == limit:
+        last = mazes[-1]
+        response.headers['X-Next-Cursor'] = last['id'] if isinstance(last, dict) else last.id
+    return mazes
 
 
 @app.post("/maze")
 async def create_maze(payload: CreateMazePayload,
                       user=Depends(get_user),
                       maze_service: MazeService = Depends(get_maze_service)):
-    return maze_service.create_maze(payload, user)
+    return await maze_service.create_maze(payload, user)
+
+
+@app.patch("/maze/{maze_id}")
+async def edit_maze(maze_id: str,
+                    edit: MazeEdit,
+                    user=Depends(get_user),
+                    maze_service: MazeService = Depends(get_maze_service)):
+    return await maze_service.edit_maze(user, maze_id, edit)
+
+
+@app.post("/maze/batch")
+async def create_mazes(payloads: CreateMazeBatchPayload,
+                       user=Depends(get_user),
+                       maze_service: MazeService = Depends(get_maze_service)):
+    return await maze_service.create_mazes(payloads, user)
+
+
+def batch_error(exc: Exception) -> t.Dict[str, t.Any]:
+    """Inline counterpart of the exception handlers below, for one item of a batch."""
+    if isinstance(exc, MazeNotFoundException):
+        return {'status': 404, 'message': "Maze not found."}
+    if isinstance(exc, MazeException):
+        return {'status': 500, 'message': exc.message}
+    if isinstance(exc, SolverBusyException):
+        return {'status': 503, 'message': exc.message}
+    if isinstance(exc, SolverTimeoutException):
+        return {'status': 504, 'message': exc.message}
+    raise exc
+
+
+@app.post("/maze/solutions:batch")
+async def get_solutions(requests: SolutionBatchPayload,
+                        user=Depends(get_user),
+                        maze_service: MazeService = Depends(get_maze_service)):
+    outcomes = await maze_service.get_maze_solutions(user, requests)
+    results = []
+    for request, outcome in zip(requests, outcomes):
+        result = {'mazeId': request.mazeId, 'steps': request.steps.value}
+        if isinstance(outcome, Exception):
+            result['error'] = batch_error(outcome)
+        elif request.steps == Steps.EXITS:
+            result['exits'] = [exit.dict() for exit in outcome.exits]
+        else:
+            result.update(path=outcome.path, exact=outcome.exact)
+            if outcome.strategy is not None:
+                result['strategy'] = outcome.strategy
+        results.append(result)
+    return results
+
+
+NDJSON = 'application/x-ndjson'
+NDJSON_CHUNK_SIZE = 1000
+
+
+def ndjson_chunks(items: t.List[str]) -> t.Iterator[str]:
+    for start in range(0, len(items), NDJSON_CHUNK_SIZE):
+        yield json.dumps(items[start:start + NDJSON_CHUNK_SIZE], separators=(',', ':')) + '\n'
 
 
 @app.get("/maze/{maze_id}/solution")
-def get_solution(maze_id: str,
-                 steps: Steps,
-                 user=Depends(get_user),
-                 maze_service: MazeService = Depends(get_maze_service)):
-    solution = maze_service.get_maze_solution(user, maze_id, steps)
-    return solution
+async def get_solution(maze_id: str,
+                       steps: Steps,
+                       distances: bool = False,
+                       format: PathFormat = PathFormat.CELLS,  # pylint: disable=redefined-builtin
+                       stream: bool = False,
+                       accept: t.Optional[str] = Header(None),
+                       user=Depends(get_user),
+                       maze_service: MazeService = Depends(get_maze_service)):
+    solution = await maze_service.get_maze_solution(user, maze_id, steps,
+                                                    distances=distances and steps == Steps.EXITS)
+    if steps == Steps.EXITS:
+        return solution.dict(include={'exits', 'distances'}, exclude_none=True)
+
+    headers = {'X-Solution-Exact': 'true' if solution.exact else 'false'}
+    if solution.strategy is not None:
+        headers['X-Solution-Strategy'] = solution.strategy
+    with metrics.SERIALIZATION_SECONDS.time(format=format.value):
+        if format == PathFormat.DIRECTIONS:
+            path = list(path_runs([parse_coords(cell) for cell in solution.path]))
+        else:
+            path = solution.path
+        if stream or (accept is not None and NDJSON in accept):
+            return StreamingResponse(ndjson_chunks(path), media_type=NDJSON, headers=headers)
+        return JSONResponse(content=' '.join(path) if format == PathFormat.DIRECTIONS else path, headers=headers)
+
+
+@app.get("/maze/{maze_id}/route")
+async def get_route(maze_id: str,
+                    source: str = Query(..., alias='from'),
+                    target: str = Query(..., alias='to'),
+                    user=Depends(get_user),
+                    maze_service: MazeService = Depends(get_maze_service)):
+    return await maze_service.get_route(user, maze_id, source, target)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get("/solution-cache")
+def get_solution_cache_stats(cache: SolutionCache = Depends(get_solution_cache)):
+    return cache.stats()
 
 
 @app.exception_handler(MazeException)
@@ -81,6 +381,23 @@ def maze_exception_handler(req, exc: MazeException):  # pylint: disable=unused-a
     )
 
 
+@app.exception_handler(SolverBusyException)
+def solver_busy_exception_handler(req, exc: SolverBusyException):  # pylint: disable=unused-argument
+    return JSONResponse(
+        status_code=503,
+        content={'message': exc.message},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(SolverTimeoutException)
+def solver_timeout_exception_handler(req, exc: SolverTimeoutException):  # pylint: disable=unused-argument
+    return JSONResponse(
+        status_code=504,
+        content={'message': exc.message}
+    )
+
+
 @app.exception_handler(MazeNotFoundException)
 def maze_not_found_exception_handler(req, exc):  # pylint: disable=unused-argument
     return JSONResponse(
@@ -89,6 +406,16 @@ def maze_not_found_exception_handler(req, exc):  # pylint: disable=unused-argume
     )
 
 
+@app.exception_handler(InvalidMazeEditException)
+@app.exception_handler(InvalidRouteException)
+def invalid_request_exception_handler(req,  # pylint: disable=unused-argument
+                                      exc: t.Union[InvalidMazeEditException, InvalidRouteException]):
+    return JSONResponse(
+        status_code=422,
+        content={'message': exc.message}
+    )
+
+
 @app.exception_handler(AuthException)
 def auth_exception_handler(req, exc: AuthException):  # pylint: disable=unused-argument
     return JSONResponse(
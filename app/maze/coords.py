@@ -0,0 +1,35 @@
+import typing as t
+from functools import lru_cache
+from string import ascii_uppercase
+
+Coords = t.Tuple[int, int]
+
+
+# a grid has at most a few thousand distinct columns, while a maze can have a million walls
+@lru_cache(maxsize=4096)
+def parse_column(column: str) -> int:
+    x_coord = 0
+    for letter in column:
+        x_coord = x_coord * 26 + ord(letter) - ord('A') + 1
+    return x_coord - 1
+
+
+def print_column(x_coord: int) -> str:
+    letters = []
+    x_coord += 1
+    while x_coord > 0:
+        x_coord, remainder = divmod(x_coord - 1, 26)
+        letters.append(ascii_uppercase[remainder])
+    return ''.join(reversed(letters))
+
+
+def parse_coords(coords: str) -> Coords:
+    """Parses spreadsheet style coordinates: columns A..Z, AA..AZ, BA.., rows from 1."""
+    row = coords.lstrip(ascii_uppercase)
+    if len(row) == len(coords) or not (row.isascii() and row.isdigit()) or row[0] == '0':
+        raise ValueError(f"Invalid coordinates {coords}.")
+    return parse_column(coords[:len(coords) - len(row)]), int(row) - 1
+
+
+def print_coords(coords: Coords) -> str:
+    return f"{print_column(coords[0])}{coords[1] + 1}"
@@ -0,0 +1,79 @@
+import typing as t
+
+MAX_CELLS = 1000 * 1000
+
+WALL = 1
+OPEN = 0
+
+_RENDER = bytes.maketrans(bytes([OPEN, WALL]), b'01')
+_PARSE = bytes.maketrans(b'01', bytes([OPEN, WALL]))
+
+
+class Grid:
+    """Maze cells stored row-major in a single bytearray, one byte per cell.
+
+    The grid is padded with a border of walls, so the neighbours of any cell
+    are always at the fixed ``offsets`` (left, right, up, down) and traversals
+    don't need bounds checks. Cell indices therefore include the padding; use
+    ``index`` and ``coords`` to convert from and to maze coordinates.
+    """
+    __slots__ = ('width', 'height', 'stride', 'cells', 'offsets')
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+        self.cells = bytearray([WALL]) * (self.stride * (height + 2))
+        for y in range(height):
+            start = self.index(0, y)
+            self.cells[start:start + width] = bytes(width)
+        self.offsets = (-1, 1, -self.stride, self.stride)
+
+    @classmethod
+    def from_walls(cls, width: int, height: int, walls: t.Iterable[t.Tuple[int, int]]) -> 'Grid':
+        grid = cls(width, height)
+        for x, y in walls:
+            grid.set_wall(x, y)
+        return grid
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def index(self, x: int, y: int) -> int:
+        return (y + 1) * self.stride + x + 1
+
+    def coords(self, index: int) -> t.Tuple[int, int]:
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def is_wall(self, index: int) -> bool:
+        return self.cells[index] == WALL
+
+    def set_wall(self, x: int, y: int) -> None:
+        self.cells[self.index(x, y)] = WALL
+
+    def bottom_row(self) -> range:
+        start = self.index(0, self.height - 1)
+        return range(start, start + self.width)
+
+    def render_row(self, y: int) -> str:
+        start = self.index(0, y)
+        return self.cells[start:start + self.width].translate(_RENDER).decode('ascii')
+
+    def set_row(self, y: int, row: bytes) -> None:
+        """Sets a row from ``0`` (open) and ``1`` (wall) characters, as rendered by ``render_row``."""
+        start = self.index(0, y)
+        self.cells[start:start + self.width] = row.translate(_PARSE)
+
+    def walls(self) -> t.Iterator[t.Tuple[int, int]]:
+        """Coordinates of the walls inside the grid, row by row."""
+        for y in range(self.height):
+            start = self.index(0, y)
+            end = start + self.width
+            index = self.cells.find(WALL, start, end)
+            while index != -1:
+                yield index - start, y
+                index = self.cells.find(WALL, index + 1, end)
@@ -0,0 +1,270 @@
+"""Hierarchical (HPA*) shortest paths over a grid split into square tiles.
+
+Every tile is abstracted on its own: its transitions, the cells paths cross
+its border by, and the distances between them inside the tile. An
+abstraction only depends on the cells of its tile and the ring of cells
+around it, so tiles are abstracted in parallel and cached by a hash of
+those cells, an edit only invalidates the tiles it touches. A path is
+searched over the graph of transitions, then refined with a BFS restricted
+to the tiles it goes through.
+
+As in HPA*, a run of adjacent crossings between two tiles gets a single
+transition, or one at each end when it's long. Paths through such runs may
+be a little longer than the shortest one, see ``TileAbstraction.compressed``.
+"""
+import hashlib
+import heapq
+import threading
+import typing as t
+from array import array
+from collections import OrderedDict
+from itertools import groupby
+
+from app import metrics
+from app.maze.grid import Grid, WALL
+from app.maze.maze_solver import only_exit
+from app.maze.models import Maze, Solution, parse_coords
+from app.maze.planner import Strategy
+from app.maze.shortest_path import ShortestPathTree, UNVISITED
+from app.maze.utils import maze_to_grid, print_coords
+
+TILE_SIZE = 32
+# runs of crossings at least this long get a transition at both ends rather than one in the middle
+LONG_RUN = 6
+UNREACHED = 2 ** 31 - 1
+NO_PARENT = -1
+
+
+class Tile:
+    """A tile of the grid at ``x``, ``y``, its cells laid out as in a Grid with the ring around it as padding."""
+    __slots__ = ('x', 'y', 'width', 'height', 'cells', 'exits')
+
+    def __init__(self, x: int, y: int, width: int, height: int, cells: bytes, exits: bool) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.cells = cells
+        # whether the bottom row of the tile is the bottom row of the grid
+        self.exits = exits
+
+    @property
+    def stride(self) -> int:
+        return self.width + 2
+
+    def key(self) -> bytes:
+        """Hash of everything the abstraction depends on, so equal tiles anywhere share one."""
+        header = f"{self.width}x{self.height}:{int(self.exits)}:".encode()
+        return hashlib.blake2b(header + self.cells, digest_size=16).digest()
+
+    def grid(self) -> Grid:
+        """The cells of the tile alone, walled in."""
+        grid = Grid(self.width, self.height)
+        for y in range(self.height):
+            start = grid.index(0, y)
+            grid.cells[start:start + self.width] = self.cells[start:start + self.width]
+        return grid
+
+    def to_grid(self, grid: Grid, cell: int) -> int:
+        """Index in ``grid`` of a cell of the tile."""
+        y, x = divmod(cell, self.stride)
+        return grid.index(self.x + x - 1, self.y + y - 1)
+
+
+def split_grid(grid: Grid, tile_size: int) -> t.List[Tile]:
+    """Tiles of ``grid``, row by row; those on the right and bottom edges may be smaller."""
+    tiles = []
+    for y in range(0, grid.height, tile_size):
+        height = min(tile_size, grid.height - y)
+        for x in range(0, grid.width, tile_size):
+            width = min(tile_size, grid.width - x)
+            cells = b''.join(grid.cells[grid.index(x - 1, row):grid.index(x + width + 1, row)]
+                             for row in range(y - 1, y + height + 1))
+            tiles.append(Tile(x, y, width, height, cells, exits=y + height == grid.height))
+    return tiles
+
+
+class TileAbstraction:
+    """Nodes of a tile and the distances between them inside it.
+
+    Nodes are cells of the tile, ``transitions`` first, then the exits not
+    already transitions. ``exits`` lists the node ids of every exit.
+    ``edges`` holds (transition, node, distance) triples, flattened, for
+    every node reachable from a transition without leaving the tile.
+    ``compressed`` tells whether some run of crossings got fewer transitions
+    than crossings, which makes distances over the tiles approximate.
+    """
+    __slots__ = ('nodes', 'transitions', 'exits', 'edges', 'compressed')
+
+    def __init__(self, nodes: t.List[int], transitions: int, exits: t.List[int], edges: array,
+                 compressed: bool) -> None:
+        self.nodes = nodes
+        self.transitions = transitions
+        self.exits = exits
+        self.edges = edges
+        self.compressed = compressed
+
+
+def _transitions(tile: Tile, grid: Grid) -> t.Tuple[t.List[int], bool]:
+    left, right, up, down = grid.offsets
+    sides = (
+        ([grid.index(0, y) for y in range(tile.height)], left),
+        ([grid.index(tile.width - 1, y) for y in range(tile.height)], right),
+        ([grid.index(x, 0) for x in range(tile.width)], up),
+        ([grid.index(x, tile.height - 1) for x in range(tile.width)], down),
+    )
+    transitions: t.List[int] = []
+    compressed = False
+    for border, outwards in sides:
+        # the tile on the other side sees the same runs, so both pick matching transitions
+        for crossing, cells in groupby(border, lambda cell, outwards=outwards:
+                                       not grid.cells[cell] and not tile.cells[cell + outwards]):
+            if not crossing:
+                continue
+            run = list(cells)
+            if len(run) >= LONG_RUN:
+                transitions.extend((run[0], run[-1]))
+            else:
+                transitions.append(run[len(run) // 2])
+            compressed = compressed or len(run) > 1
+    # corner cells can cross two sides
+    return list(dict.fromkeys(transitions)), compressed
+
+
+def abstract_tile(tile: Tile) -> TileAbstraction:
+    grid = tile.grid()
+    transitions, compressed = _transitions(tile, grid)
+    nodes = list(transitions)
+    node_ids = {cell: node for node, cell in enumerate(nodes)}
+    exits = []
+    if tile.exits:
+        for cell in grid.bottom_row():
+            if not grid.cells[cell]:
+                if cell not in node_ids:
+                    node_ids[cell] = len(nodes)
+                    nodes.append(cell)
+                exits.append(node_ids[cell])
+
+    edges = array('i')
+    for source in range(len(transitions)):
+        distances = ShortestPathTree(grid, nodes[source]).distances()
+        for target, cell in enumerate(nodes):
+            if target != source and distances[cell] != UNVISITED:
+                edges.extend((source, target, distances[cell]))
+    return TileAbstraction(nodes, len(transitions), exits, edges, compressed)
+
+
+def abstract_tiles(tiles: t.List[Tile]) -> t.List[TileAbstraction]:
+    return [abstract_tile(tile) for tile in tiles]
+
+
+def tile_maze(maze: Maze, tile_size: int) -> t.Tuple[Grid, t.List[Tile]]:
+    grid = maze_to_grid(maze)
+    return grid, split_grid(grid, tile_size)
+
+
+def solve_tiled(grid: Grid, entrance: int, tile_size: int, tiles: t.List[Tile],
+                abstractions: t.List[TileAbstraction]) -> Solution:
+    """Shortest path from ``entrance`` to the single exit, over the abstractions of ``tiles``."""
+    # nodes of every tile one after the other, as grid cells
+    cells = array('i')
+    tile_of = array('i')
+    first = []
+    for number, (tile, abstraction) in enumerate(zip(tiles, abstractions)):
+        first.append(len(cells))
+        cells.extend(tile.to_grid(grid, cell) for cell in abstraction.nodes)
+        tile_of.extend([number] * len(abstraction.nodes))
+
+    neighbours: t.List[t.List[t.Tuple[int, int]]] = [[] for _ in range(len(cells))]
+    transition_ids = {}
+    for number, abstraction in enumerate(abstractions):
+        base, edges = first[number], abstraction.edges
+        for i in range(0, len(edges), 3):
+            neighbours[base + edges[i]].append((base + edges[i + 1], edges[i + 2]))
+        for node in range(base, base + abstraction.transitions):
+            transition_ids[cells[node]] = node
+    for cell, node in transition_ids.items():
+        for offset in grid.offsets:
+            other = transition_ids.get(cell + offset)
+            if other is not None and tile_of[other] != tile_of[node]:
+                neighbours[node].append((other, 1))
+
+    x, y = grid.coords(entrance)
+    start = (y // tile_size) * -(-grid.width // tile_size) + x // tile_size
+    tile, abstraction = tiles[start], abstractions[start]
+    entrance_grid = tile.grid()
+    entrance_distances = ShortestPathTree(entrance_grid, entrance_grid.index(x - tile.x, y - tile.y)).distances()
+
+    distances = array('i', [UNREACHED]) * len(cells)
+    parents = array('i', [NO_PARENT]) * len(cells)
+    queue = []
+    for node, cell in enumerate(abstraction.nodes, first[start]):
+        if entrance_distances[cell] != UNVISITED:
+            distances[node] = entrance_distances[cell]
+            queue.append((entrance_distances[cell], node))
+    heapq.heapify(queue)
+    expansions = 0
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance > distances[node]:
+            continue
+        expansions += 1
+        for other, weight in neighbours[node]:
+            if distance + weight < distances[other]:
+                distances[other] = distance + weight
+                parents[other] = node
+                heapq.heappush(queue, (distance + weight, other))
+    metrics.SOLVER_EXPANSIONS.inc(expansions, search='hierarchical')
+
+    exit_ids = {cells[node]: node for number, abstraction in enumerate(abstractions)
+                for node in (first[number] + exit_node for exit_node in abstraction.exits)
+                if distances[node] != UNREACHED}
+    exit_cell = only_exit(grid, list(exit_ids))
+
+    route = {start}
+    node = exit_ids[exit_cell]
+    while node != NO_PARENT:
+        route.add(tile_of[node])
+        node = parents[node]
+    restricted = Grid(grid.width, grid.height)
+    restricted.cells = bytearray([WALL]) * len(grid)
+    for number in route:
+        tile = tiles[number]
+        for row in range(tile.y, tile.y + tile.height):
+            begin = grid.index(tile.x, row)
+            restricted.cells[begin:begin + tile.width] = grid.cells[begin:begin + tile.width]
+    path = ShortestPathTree(restricted, entrance).path_to(exit_cell)
+
+    metrics.SOLVER_STRATEGIES.inc(strategy=Strategy.HIERARCHICAL.value)
+    return Solution(path=[print_coords(grid.coords(node)) for node in path],
+                    exact=not any(abstraction.compressed for abstraction in abstractions),
+                    strategy=Strategy.HIERARCHICAL.value)
+
+
+class TileCache:
+    """Abstractions of the most recently used tiles, by tile key."""
+
+    def __init__(self, max_tiles: int) -> None:
+        self._max_tiles = max_tiles
+        self._tiles: 'OrderedDict[bytes, TileAbstraction]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> t.Optional[TileAbstraction]:
+        with self._lock:
+            abstraction = self._tiles.get(key)
+            if abstraction is not None:
+                self._tiles.move_to_end(key)
+            return abstraction
+
+    def put(self, key: bytes, abstraction: TileAbstraction):
+        with self._lock:
+            self._tiles[key] = abstraction
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self._max_tiles:
+                self._tiles.popitem(last=False)
+
+
+def solve_tiles_locally(maze: Maze, tile_size: int = TILE_SIZE) -> Solution:
+    """The whole tiled solve in this process, for tests and benchmarks."""
+    grid, tiles = tile_maze(maze, tile_size)
+    return solve_tiled(grid, grid.index(*parse_coords(maze.entrance)), tile_size, tiles, abstract_tiles(tiles))
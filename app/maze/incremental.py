@@ -0,0 +1,167 @@
+import heapq
+import threading
+import typing as t
+from array import array
+from collections import OrderedDict
+
+from app import metrics
+from app.maze.coords import Coords, parse_coords
+from app.maze.grid import Grid, OPEN, WALL
+from app.maze.maze_solver import single_exit
+from app.maze.models import Maze, Solution
+from app.maze.planner import Strategy
+from app.maze.shortest_path import ShortestPathTree, UNVISITED
+from app.maze.utils import maze_to_grid, print_coords
+
+INFINITY = 2 ** 31 - 1
+
+
+class DynamicShortestPaths:
+    """Distances from root to every cell, repaired in place when walls are added or removed.
+
+    This is LPA* without a heuristic or a goal, as every cell's distance is
+    needed to find the exits. Each cell keeps its distance ``g`` and a one step
+    lookahead ``rhs``, one more than its smallest open neighbour's distance.
+    An edit only changes the lookahead of the edited cell and its neighbours;
+    the cells left inconsistent are then settled in order of distance, so only
+    cells whose distance actually changes are visited.
+    Same interface as ShortestPathTree.
+    """
+
+    def __init__(self, grid: Grid, root: int) -> None:
+        self._grid = grid
+        self._root = root
+        distances = ShortestPathTree(grid, root).distances()
+        self._g = array('i', [INFINITY if distance == UNVISITED else distance for distance in distances])
+        self._rhs = array('i', self._g)
+        self._queue: t.List[t.Tuple[int, int]] = []
+
+    @property
+    def grid(self) -> Grid:
+        return self._grid
+
+    def set_wall(self, x: int, y: int, wall: bool):
+        node = self._grid.index(x, y)
+        self._grid.cells[node] = WALL if wall else OPEN
+        self._update(node)
+        for offset in self._grid.offsets:
+            self._update(node + offset)
+
+    def repair(self):
+        """Settles the cells left inconsistent by the edits since the last repair."""
+        cells, offsets, g, rhs, queue = self._grid.cells, self._grid.offsets, self._g, self._rhs, self._queue
+        expansions = 0
+        while queue:
+            key, node = heapq.heappop(queue)
+            distance, lookahead = g[node], rhs[node]
+            # entries are never removed from the queue, those no longer matching the cell are stale
+            if distance == lookahead or key != min(distance, lookahead):
+                continue
+            expansions += 1
+            if distance > lookahead:
+                g[node] = lookahead
+            else:
+                g[node] = INFINITY
+                self._update(node)
+            for offset in offsets:
+                if not cells[node + offset]:
+                    self._update(node + offset)
+        metrics.SOLVER_EXPANSIONS.inc(expansions, search='incremental')
+
+    def _update(self, node: int):
+        g, rhs = self._g, self._rhs
+        if node == self._root:
+            return
+        cells = self._grid.cells
+        lookahead = INFINITY
+        if not cells[node]:
+            for offset in self._grid.offsets:
+                neighbour = node + offset
+                if not cells[neighbour] and g[neighbour] < lookahead:
+                    lookahead = g[neighbour]
+            if lookahead != INFINITY:
+                lookahead += 1
+        rhs[node] = lookahead
+        if g[node] != lookahead:
+            heapq.heappush(self._queue, (min(g[node], lookahead), node))
+
+    def reached(self, node: int) -> bool:
+        return self._g[node] != INFINITY
+
+    def reached_cells(self) -> t.Iterable[int]:
+        return (node for node, distance in enumerate(self._g) if distance != INFINITY)
+
+    def distances(self) -> array:
+        """Distance from the root to every cell, UNVISITED for the ones that weren't reached."""
+        return array('i', (UNVISITED if distance == INFINITY else distance for distance in self._g))
+
+    def path_to(self, node: int) -> t.Optional[t.List[int]]:
+        if not self.reached(node):
+            return None
+        g, offsets = self._g, self._grid.offsets
+        path = [node]
+        distance = g[node]
+        while distance > 0:
+            distance -= 1
+            for offset in offsets:
+                if g[node + offset] == distance:
+                    node += offset
+                    break
+            path.append(node)
+        path.reverse()
+        return path
+
+
+def walls_fingerprint(walls: t.Iterable[str]) -> int:
+    """Order independent hash of a set of walls, which can be updated wall by wall."""
+    return sum(map(hash, walls))
+
+
+class _MazeState:
+    def __init__(self, paths: DynamicShortestPaths, fingerprint: int) -> None:
+        self.paths = paths
+        self.fingerprint = fingerprint
+
+
+class IncrementalSolutions:
+    """Shortest path state of the most recently edited mazes, kept in memory and repaired on every edit.
+
+    A state is only used for the exact geometry it was last repaired for, so
+    edits made through another process make it fall back to solving.
+    """
+
+    def __init__(self, max_mazes: int) -> None:
+        self._max_mazes = max_mazes
+        self._states: 'OrderedDict[str, _MazeState]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def edit(self, maze: Maze, added: t.List[str], removed: t.List[str]):
+        """Applies the wall changes to the state of ``maze``, from before the edit, creating it if needed."""
+        with self._lock:
+            state = self._states.pop(maze.id, None)
+            if state is None or state.fingerprint != walls_fingerprint(maze.walls):
+                grid = maze_to_grid(maze)
+                state = _MazeState(DynamicShortestPaths(grid, grid.index(*parse_coords(maze.entrance))),
+                                   walls_fingerprint(maze.walls))
+            for wall in added:
+                state.paths.set_wall(*parse_coords(wall), wall=True)
+            for wall in removed:
+                state.paths.set_wall(*parse_coords(wall), wall=False)
+            state.paths.repair()
+            state.fingerprint += walls_fingerprint(added) - walls_fingerprint(removed)
+
+            self._states[maze.id] = state
+            while len(self._states) > self._max_mazes:
+                self._states.popitem(last=False)
+
+    def solution(self, maze: Maze) -> t.Optional[Solution]:
+        """The shortest path of ``maze``, or None without a state for its current walls."""
+        with self._lock:
+            state = self._states.get(maze.id)
+            if state is None or state.fingerprint != walls_fingerprint(maze.walls):
+                return None
+            self._states.move_to_end(maze.id)
+            paths = state.paths
+            path: t.List[Coords] = [paths.grid.coords(node)
+                                    for node in paths.path_to(single_exit(paths.grid, paths))]
+        return Solution(path=[print_coords(cell) for cell in path], strategy=Strategy.INCREMENTAL.value)
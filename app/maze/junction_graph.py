@@ -0,0 +1,155 @@
+import typing as t
+from array import array
+
+from app.maze.grid import Grid, WALL
+
+NO_NODE = -1
+
+
+def prune_dead_ends(grid: Grid, keep: t.Collection[int], candidates: t.Iterable[int]) -> bytearray:
+    """Copy of the grid cells with dead ends walled up until none are left.
+
+    A dead end is an open cell with at most one open neighbour, other than the
+    ``keep`` cells. Walling one up can turn its neighbour into a dead end, so
+    whole pockets and blind corridors are pruned. Only the ``candidates`` cells
+    and the cells they lead to are looked at.
+    """
+    cells = bytearray(grid.cells)
+    left, right, up, down = grid.offsets
+
+    stack = [node for node in candidates
+             if node not in keep and not cells[node]
+             and cells[node + left] + cells[node + right] + cells[node + up] + cells[node + down] >= 3]
+    while stack:
+        node = stack.pop()
+        if cells[node]:
+            continue
+        cells[node] = WALL
+        for neighbour in (node + left, node + right, node + up, node + down):
+            if (not cells[neighbour] and neighbour not in keep and
+                    cells[neighbour + left] + cells[neighbour + right] +
+                    cells[neighbour + up] + cells[neighbour + down] >= 3):
+                stack.append(neighbour)
+    return cells
+
+
+class JunctionGraph:
+    """The cells reachable from ``root``, with dead ends pruned and corridors collapsed.
+
+    Nodes are the cells where a path can branch, any cell with other than two
+    open neighbours, along with ``root`` and ``target``. The corridors between
+    them become edges, weighted by the cells they run through, which are kept
+    so a path over the graph can be expanded back into cells.
+
+    Of parallel corridors between two nodes only the longest is kept, a simple
+    path can only use one of them and the graph is meant for longest paths.
+
+    Every node has a neighbour slot per direction the grid offsets are in, so
+    searches see neighbours in the same order as on the grid. The adjacency is
+    stored in flat arrays: ``neighbours[4 * node + direction]`` is a node id
+    or NO_NODE, ``edges[4 * node + direction]`` the edge leading to it and
+    ``gains[4 * node + direction]`` the cells it adds to a path, its corridor
+    and the node at its other end.
+    """
+
+    def __init__(self, grid: Grid, root: int, target: int, candidates: t.Iterable[int]) -> None:
+        self.stride = grid.stride
+        self.cells = array('q')
+        self.neighbours = array('q')
+        self.edges = array('q')
+        self.gains = array('q')
+        self.edge_ends = array('q')
+        # interior cells of edge e are interiors[edge_starts[e]:edge_starts[e + 1]], from its first end
+        self.edge_starts = array('q', [0])
+        self.interiors = array('q')
+        self._node_ids = array('q', [NO_NODE]) * len(grid)
+        self._build(grid, prune_dead_ends(grid, (root, target), candidates), root, target)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def node(self, cell: int) -> int:
+        return self._node_ids[cell]
+
+    def _add_node(self, cell: int) -> int:
+        node = len(self.cells)
+        self._node_ids[cell] = node
+        self.cells.append(cell)
+        self.neighbours.extend((NO_NODE, NO_NODE, NO_NODE, NO_NODE))
+        self.edges.extend((NO_NODE, NO_NODE, NO_NODE, NO_NODE))
+        self.gains.extend((0, 0, 0, 0))
+        return node
+
+    def _add_edge(self, first: int, first_direction: int, second: int, second_direction: int,
+                  interior: t.List[int]):
+        gain = len(interior) + 1
+        for slot in range(4 * first, 4 * first + 4):
+            if self.neighbours[slot] == second:
+                if self.gains[slot] >= gain:
+                    return
+                self._remove_edge(slot)
+
+        edge = len(self.edge_ends) // 2
+        self.edge_ends.extend((first, second))
+        self.interiors.extend(interior)
+        self.edge_starts.append(len(self.interiors))
+        for slot, other in ((4 * first + first_direction, second), (4 * second + second_direction, first)):
+            self.neighbours[slot] = other
+            self.edges[slot] = edge
+            self.gains[slot] = gain
+
+    def _remove_edge(self, slot: int):
+        edge = self.edges[slot]
+        other = self.neighbours[slot]
+        for end_slot in (slot, 4 * other + self.edges[4 * other:4 * other + 4].index(edge)):
+            self.neighbours[end_slot] = self.edges[end_slot] = NO_NODE
+            self.gains[end_slot] = 0
+
+    def _build(self, grid: Grid, cells: bytearray, root: int, target: int):
+        left, right, up, down = offsets = grid.offsets
+        node_ids = self._node_ids
+        walked = bytearray(len(cells))
+
+        def is_node(cell: int) -> bool:
+            return (cell == root or cell == target or
+                    cells[cell + left] + cells[cell + right] + cells[cell + up] + cells[cell + down] != 2)
+
+        self._add_node(root)
+        head = 0
+        while head < len(self.cells):
+            node = head
+            start = self.cells[node]
+            head += 1
+            for direction, offset in enumerate(offsets):
+                cell = start + offset
+                if cells[cell] or walked[cell]:
+                    continue
+                previous = start
+                interior = []
+                while not is_node(cell):
+                    walked[cell] = 1
+                    interior.append(cell)
+                    for step in offsets:
+                        if cell + step != previous and not cells[cell + step]:
+                            previous, cell = cell, cell + step
+                            break
+                other = node_ids[cell]
+                if other == NO_NODE:
+                    other = self._add_node(cell)
+                # corridors are walked once, from whichever end gets there first, adjacent nodes are
+                # linked from the lower cell; corridors leading back to where they started are useless
+                if other != node and (interior or start < cell):
+                    self._add_edge(node, direction, other, offsets.index(previous - cell), interior)
+
+    def expand(self, nodes: t.List[int], edges: t.List[int]) -> t.List[int]:
+        """Cells of the path visiting ``nodes`` over ``edges``, the edge between each pair of them."""
+        path = [self.cells[nodes[0]]]
+        for node, edge in zip(nodes, edges):
+            interior = self.interiors[self.edge_starts[edge]:self.edge_starts[edge + 1]]
+            if self.edge_ends[2 * edge] == node:
+                path.extend(interior)
+                path.append(self.cells[self.edge_ends[2 * edge + 1]])
+            else:
+                path.extend(reversed(interior))
+                path.append(self.cells[self.edge_ends[2 * edge]])
+        return path
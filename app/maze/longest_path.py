@@ -0,0 +1,201 @@
+import time
+import typing as t
+from array import array
+
+from app import metrics
+from app.maze.junction_graph import JunctionGraph, NO_NODE
+
+
+class LongestPath:
+    def __init__(self, path: t.List[int], exact: bool, expansions: int) -> None:
+        self.path = path
+        self.exact = exact
+        self.expansions = expansions
+
+
+class LongestPathSearch:
+    """Branch-and-bound search for the longest simple path between two nodes of a junction graph.
+
+    The DFS keeps a single visited bitset and path stack that are updated in
+    place while backtracking. Path lengths are counted in grid cells, so every
+    edge adds the cells of its corridor. Every expansion is bounded by the
+    cells of the biconnected components that any simple path from the current
+    node to the target has to go through; branches that can't beat the best
+    path found so far, or can't reach the target at all, are cut. When the
+    node expansion or time budget runs out the best path found so far is
+    returned as inexact.
+    """
+
+    def __init__(self, graph: JunctionGraph, start: int, target: int,
+                 max_expansions: t.Optional[int] = None, time_limit: t.Optional[float] = None) -> None:
+        self._graph = graph
+        self._start = start
+        self._target = target
+        self._max_expansions = max_expansions
+        self._time_limit = time_limit
+
+        size = len(graph)
+        # empty neighbour slots hold NO_NODE, which indexes the last byte: a node that is always visited
+        self._visited = bytearray(size + 1)
+        self._visited[NO_NODE] = 1
+        # scratch space for the bound, reused between calls by bumping a clock instead of clearing
+        self._clock = 0
+        self._disc = array('q', [0]) * size
+        self._low = array('q', [0]) * size
+        self._parent = array('q', [0]) * size
+        self._cells = array('q', [0]) * size
+        self._on_path = array('q', [0]) * size
+
+    def search(self, seed: t.Optional[t.List[int]] = None) -> LongestPath:
+        """Longest path as grid cells, at least as long as the ``seed`` path of cells."""
+        graph, start, target, visited = self._graph, self._start, self._target, self._visited
+        neighbours, gains = graph.neighbours, graph.gains
+        best_cells = list(seed) if seed is not None else []
+        if start == target:
+            return LongestPath([graph.cells[start]], True, 0)
+
+        deadline = time.monotonic() + self._time_limit if self._time_limit is not None else None
+        max_expansions = self._max_expansions
+        expansions = 0
+        exact = True
+        best: t.Optional[t.Tuple[t.List[int], t.List[int]]] = None
+        best_length = len(best_cells)
+
+        visited[start] = 1
+        path = [start]
+        # the neighbour slot taken from every node on the path, 4 * node + direction
+        slots = [4 * start]
+        length = 1
+        if self._upper_bound(start, 1) <= best_length:
+            path.pop()
+            slots.pop()
+            visited[start] = 0
+
+        while path:
+            node = path[-1]
+            slot = slots[-1]
+            if slot >> 2 != node:
+                visited[node] = 0
+                path.pop()
+                slots.pop()
+                if slots:
+                    length -= gains[slots[-1] - 1]
+                continue
+            slots[-1] = slot + 1
+
+            neighbour = neighbours[slot]
+            if visited[neighbour]:
+                continue
+            if neighbour == target:
+                if length + gains[slot] > best_length:
+                    best_length = length + gains[slot]
+                    best = (path + [target], [graph.edges[taken - 1] for taken in slots])
+                continue
+
+            expansions += 1
+            if max_expansions is not None and expansions > max_expansions:
+                exact = False
+                break
+            # every expansion computes a bound over the whole reachable graph, the clock is cheap next to it
+            if deadline is not None and time.monotonic() > deadline:
+                exact = False
+                break
+
+            visited[neighbour] = 1
+            path.append(neighbour)
+            length += gains[slot]
+            if self._upper_bound(neighbour, length) <= best_length:
+                visited[neighbour] = 0
+                path.pop()
+                length -= gains[slot]
+                continue
+            slots.append(4 * neighbour)
+
+        for node in path:
+            visited[node] = 0
+        metrics.SOLVER_EXPANSIONS.inc(expansions, search='longest')
+        if best is not None:
+            best_cells = graph.expand(*best)
+        return LongestPath(best_cells, exact, expansions)
+
+    def _upper_bound(self, root: int, path_length: int) -> int:
+        """Longest possible path length, in cells, if the current path ending at root is extended to the target.
+
+        Runs Tarjan's biconnected components from root over the unvisited nodes.
+        Only the blocks on the block-cut tree path from root to the target can
+        be used by a simple path, so their cells bound the remaining length.
+        The corridor cells of an edge are counted in the block of its deeper
+        end. Returns 0 when the target is unreachable.
+        """
+        graph, visited = self._graph, self._visited
+        neighbours, gains = graph.neighbours, graph.gains
+        disc, low, parent, cells_below = self._disc, self._low, self._parent, self._cells
+        base = self._clock
+        clock = base + 1
+        disc[root] = low[root] = clock
+        parent[root] = -1
+        cells_below[root] = 1
+
+        vertex_stack = [root]
+        call_stack = [root]
+        call_slots = [4 * root]
+        blocks = []
+        while call_stack:
+            node = call_stack[-1]
+            slot = call_slots[-1]
+            if slot >> 2 == node:
+                call_slots[-1] = slot + 1
+                neighbour = neighbours[slot]
+                if visited[neighbour] and neighbour != root:
+                    continue
+                if disc[neighbour] > base:
+                    # a back edge, counted from its deeper end only; the graph has no parallel edges
+                    if neighbour != parent[node] and disc[neighbour] < disc[node]:
+                        cells_below[node] += gains[slot] - 1
+                        if disc[neighbour] < low[node]:
+                            low[node] = disc[neighbour]
+                    continue
+                clock += 1
+                disc[neighbour] = low[neighbour] = clock
+                parent[neighbour] = node
+                cells_below[neighbour] = gains[slot]
+                vertex_stack.append(neighbour)
+                call_stack.append(neighbour)
+                call_slots.append(4 * neighbour)
+                continue
+
+            call_stack.pop()
+            call_slots.pop()
+            above = parent[node]
+            if above < 0:
+                continue
+            if low[node] < low[above]:
+                low[above] = low[node]
+            if low[node] >= disc[above]:
+                size = 0
+                while True:
+                    top = vertex_stack.pop()
+                    size += cells_below[top]
+                    if top == node:
+                        break
+                blocks.append((node, size))
+
+        self._clock = clock
+        target = self._target
+        if disc[target] <= base:
+            return 0
+
+        stamp = clock
+        node = target
+        while node >= 0:
+            self._on_path[node] = stamp
+            node = parent[node]
+        cells = 1 + sum(size for top, size in blocks if self._on_path[top] == stamp)
+
+        # the grid is bipartite, so the parity of any root-target path is fixed
+        stride = graph.stride
+        root_cell, target_cell = graph.cells[root], graph.cells[target]
+        steps_parity = (root_cell % stride + root_cell // stride + target_cell % stride + target_cell // stride) % 2
+        if (cells - 1) % 2 != steps_parity:
+            cells -= 1
+        return path_length - 1 + cells
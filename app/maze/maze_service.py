@@ -1,53 +1,295 @@
+import asyncio
+import json
+import logging
+import time
 import typing as t
 from uuid import uuid4
 
-from app.maze.maze_solver import MazeSolver
-from app.maze.models import CreateMazePayload, Steps, Maze, Path
+from app import metrics
+from app.maze.maze_solver import MazeException, solve_maze
+from app.maze.solver_executor import SolverExecutor, SolverBusyException, SolverTimeoutException
+from app.maze.incremental import IncrementalSolutions
+from app.maze.models import CreateMazePayload, Steps, Maze, Path, Solution, MazeField, SolutionRequest, MazeEdit, \
+    Route, parse_coords, parse_grid_size
+from app.maze.routes import RouteIndexes
+from app.maze.solution_cache import SolutionCache, NoSolutionCache, solution_key
 from app.maze.utils import print_coords
 from app.persistence import schemas
-from app.persistence.persistence import Persistence
+from app.persistence.async_persistence import AsyncPersistence, as_async
+from app.persistence.persistence import Persistence, apply_walls_delta
 
 
 class MazeNotFoundException(Exception):
     pass
 
 
-class MazeWithoutSolutionException(Exception):
-    pass
+class InvalidMazeEditException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class InvalidRouteException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTED_STEPS = (Steps.MIN, Steps.MAX)
+# concurrent solves of a batch when solving in threads rather than on a SolverExecutor
+BATCH_THREADS = 4
+
+
+class EagerSolver:
+    """Solves newly created mazes on the solver processes and stores the results with the maze.
+
+    Eager solves share the SolverExecutor with requests, and its queue depth:
+    a maze created while it's full is left to be solved on request.
+    """
+
+    def __init__(self, solver: SolverExecutor,
+                 persistence_scope: t.Callable[[], t.ContextManager[Persistence]]) -> None:
+        self._solver = solver
+        self._persistence_scope = persistence_scope
+        # the event loop only keeps weak references to tasks
+        self._tasks: t.Set[asyncio.Task] = set()
+
+    def schedule(self, maze: Maze):
+        task = asyncio.get_running_loop().create_task(self._solve_and_store(maze))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """Waits until every scheduled maze is solved and stored."""
+        await asyncio.gather(*self._tasks)
+
+    async def _solve_and_store(self, maze: Maze):
+        try:
+            try:
+                solutions = [self._to_record(maze, steps, solution) for steps, solution in
+                             zip(PRECOMPUTED_STEPS, await self._solver.solve_steps(maze, PRECOMPUTED_STEPS))]
+            except MazeException as e:
+                solutions = [schemas.MazeSolution(maze_id=maze.id, steps=steps.value, error=e.message)
+                             for steps in PRECOMPUTED_STEPS]
+            except (SolverBusyException, SolverTimeoutException) as e:
+                logger.info("Leaving maze %s to be solved on request: %s", maze.id, e.message)
+                return
+            await asyncio.to_thread(self._store, solutions)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to precompute solutions for maze %s", maze.id)
+
+    def _store(self, solutions: t.List[schemas.MazeSolution]):
+        with self._persistence_scope() as persistence:
+            for solution in solutions:
+                persistence.save_maze_solution(solution)
+
+    @staticmethod
+    def _to_record(maze: Maze, steps: Steps, solution: Solution) -> schemas.MazeSolution:
+        return schemas.MazeSolution(maze_id=maze.id, steps=steps.value, path=solution.path,
+                                    exit=solution.path[-1], exact=solution.exact)
 
 
 class MazeService:
-    def __init__(self, persistence: Persistence) -> None:
-        self._persistence = persistence
+    def __init__(self, persistence: t.Union[Persistence, AsyncPersistence], cache: t.Optional[SolutionCache] = None,
+                 eager_solver: t.Optional[EagerSolver] = None, solver: t.Optional[SolverExecutor] = None,
+                 slow_solve_seconds: t.Optional[float] = None,
+                 incremental: t.Optional[IncrementalSolutions] = None,
+                 routes: t.Optional[RouteIndexes] = None) -> None:
+        self._persistence = as_async(persistence)
+        self._cache = cache if cache is not None else NoSolutionCache()
+        self._eager_solver = eager_solver
+        self._solver = solver
+        self._slow_solve_seconds = slow_solve_seconds
+        self._incremental = incremental
+        # without a shared one, indexes only last for the query
+        self._routes = routes if routes is not None else RouteIndexes(max_mazes=0)
 
-    def create_maze(self, payload: CreateMazePayload, owner: str) -> Maze:
-        maze = Maze(entrance=payload.entrance, gridSize=payload.gridSize,
-                    walls=payload.walls, id=str(uuid4()))
-        self._persistence.create_maze(
+    async def create_maze(self, payload: CreateMazePayload, owner: str) -> Maze:
+        # the payload is validated already, checking a million walls twice isn't free
+        maze = Maze.construct(entrance=payload.entrance, gridSize=payload.gridSize,
+                              walls=payload.walls, id=str(uuid4()))
+        await self._persistence.create_maze(
             schemas.Maze(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize, walls=maze.walls), owner)
+        if self._eager_solver is not None:
+            self._eager_solver.schedule(maze)
         return maze
 
-    def get_maze(self, owner: str, maze_id: str) -> t.Optional[Maze]:
-        return next((maze for maze in self.get_mazes(
-            owner) if maze.id == maze_id), None)
+    async def create_mazes(self, payloads: t.List[CreateMazePayload], owner: str) -> t.List[Maze]:
+        mazes = [Maze.construct(entrance=payload.entrance, gridSize=payload.gridSize, walls=payload.walls,
+                                id=str(uuid4()))
+                 for payload in payloads]
+        await self._persistence.create_mazes(
+            [schemas.Maze(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize, walls=maze.walls)
+             for maze in mazes], owner)
+        if self._eager_solver is not None:
+            for maze in mazes:
+                self._eager_solver.schedule(maze)
+        return mazes
+
+    async def edit_maze(self, owner: str, maze_id: str, edit: MazeEdit) -> Maze:
+        """Adds and removes walls, repairing the shortest path of the maze rather than solving it again."""
+        maze = await self.get_maze(owner, maze_id)
+        if maze is None:
+            raise MazeNotFoundException()
+
+        width, height = parse_grid_size(maze.gridSize)
+        for wall in edit.add + edit.remove:
+            x, y = parse_coords(wall)
+            if not (0 <= x < width and 0 <= y < height):
+                raise InvalidMazeEditException(f"Wall {wall} is not within bounds.")
+        if maze.entrance in edit.add:
+            raise InvalidMazeEditException("Entrance can't be where wall is.")
+
+        # an ORM row is expired by the update's commit, and would then reload the edited walls
+        maze = Maze.construct(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize, walls=list(maze.walls))
+        walls = set(maze.walls)
+        added = [wall for wall in dict.fromkeys(edit.add) if wall not in walls]
+        removed = [wall for wall in dict.fromkeys(edit.remove) if wall in walls]
+        if added or removed:
+            await self._persistence.update_maze_walls(maze.id, owner, added, removed)
+            if self._incremental is not None:
+                await asyncio.to_thread(self._incremental.edit, maze, added, removed)
+        return Maze.construct(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize,
+                              walls=apply_walls_delta(maze.walls, added, removed))
+
+    async def get_maze(self, owner: str, maze_id: str) -> t.Optional[Maze]:
+        return await self._persistence.get_maze_by_id_and_owner(maze_id, owner)
 
-    def get_mazes(self, owner: str) -> t.List[Maze]:
-        return self._persistence.get_mazes_by_username(owner)
+    async def get_mazes(self, owner: str, limit: t.Optional[int] = None, after: t.Optional[str] = None,
+                        fields: t.Optional[t.List[MazeField]] = None) -> t.List[t.Union[Maze, t.Dict[str, t.Any]]]:
+        return await self._persistence.get_mazes_by_username(
+            owner, limit=limit, after=after, fields=[field.value for field in fields] if fields else None)
 
-    def get_maze_solution(self, owner: str, maze_id: str,
-                          steps: Steps) -> t.Optional[t.List[str]]:
-        maze = self.get_maze(owner, maze_id)
+    async def get_maze_solution(self, owner: str, maze_id: str,
+                                steps: Steps, distances: bool = False) -> Solution:
+        with metrics.MAZE_FETCH_SECONDS.time():
+            maze = await self.get_maze(owner, maze_id)
         if maze is None:
             raise MazeNotFoundException()
-        solver = MazeSolver(maze)
-
-        if steps == Steps.MIN:
-            path = solver.get_shortest_path()
-        elif steps == Steps.MAX:
-            path = solver.get_longest_path()
-        else:
-            raise NotImplementedError("Steps must be either min or max")
-
-        if path is not None:
-            return [print_coords(x) for x in path]
-        raise MazeWithoutSolutionException()
+
+        stored = await self._persistence.get_maze_solution(maze.id, steps.value)
+        # a solve still running when the maze was edited stores its solution for the old walls
+        if stored is not None and stored.maze_version == maze.version:
+            if stored.error is not None:
+                raise MazeException(stored.error)
+            return Solution(path=stored.path, exact=stored.exact)
+
+        if distances:
+            # a distance map is as large as the grid, not worth keeping in the cache
+            return await self._solve(maze, steps, distances=True)
+        if steps == Steps.MIN and self._incremental is not None:
+            solution = await asyncio.to_thread(self._incremental.solution, maze)
+            if solution is not None:
+                return solution
+        return await self._solve_cached(solution_key(maze, steps), maze, steps)
+
+    async def get_route(self, owner: str, maze_id: str, source: str, target: str) -> Route:
+        """A shortest route between any two open cells of a maze."""
+        version = await self._persistence.get_maze_version(maze_id, owner)
+        if version is None:
+            raise MazeNotFoundException()
+        index = self._routes.get(maze_id, version)
+        if index is None:
+            # the walls are only loaded for mazes not queried since they were created or last edited
+            maze = await self.get_maze(owner, maze_id)
+            if maze is None:
+                raise MazeNotFoundException()
+            index = await asyncio.to_thread(self._routes.build, maze, maze.version)
+
+        grid = index.grid
+        nodes = []
+        for cell in (source, target):
+            try:
+                x, y = parse_coords(cell)
+            except ValueError as e:
+                raise InvalidRouteException(str(e)) from e
+            if not (0 <= x < grid.width and 0 <= y < grid.height):
+                raise InvalidRouteException(f"Cell {cell} is not within bounds.")
+            nodes.append(grid.index(x, y))
+        for cell, node in zip((source, target), nodes):
+            if grid.is_wall(node):
+                raise InvalidRouteException(f"Cell {cell} is a wall.")
+        if not index.connected(*nodes):
+            return Route(reachable=False)
+        path = await asyncio.to_thread(index.route, *nodes)
+        return Route(reachable=True, distance=len(path) - 1,
+                     path=[print_coords(grid.coords(node)) for node in path])
+
+    async def get_maze_solutions(self, owner: str, requests: t.List[SolutionRequest]
+                                 ) -> t.List[t.Union[Solution, Exception]]:
+        """Solves every request, returning either its solution or the exception it failed with.
+
+        Mazes and stored solutions are fetched in one query each, and requests for
+        identical geometries are solved once.
+        """
+        maze_ids = list({request.mazeId for request in requests})
+        with metrics.MAZE_FETCH_SECONDS.time():
+            mazes = {maze.id: maze for maze in await self._persistence.get_mazes_by_ids_and_owner(maze_ids, owner)}
+        stored = {(solution.maze_id, solution.steps): solution
+                  for solution in await self._persistence.get_maze_solutions(list(mazes))
+                  if solution.maze_version == mazes[solution.maze_id].version}
+
+        keys = {}
+        unsolved = {}
+        for request in requests:
+            maze = mazes.get(request.mazeId)
+            if maze is not None and (maze.id, request.steps.value) not in stored:
+                key = solution_key(maze, request.steps)
+                keys[(maze.id, request.steps)] = key
+                unsolved.setdefault(key, (maze, request.steps))
+
+        limit = asyncio.Semaphore(self._solver.max_workers if self._solver is not None else BATCH_THREADS)
+
+        async def solve(key: str, maze: Maze, steps: Steps) -> Solution:
+            async with limit:
+                return await self._solve_cached(key, maze, steps)
+
+        outcomes = await asyncio.gather(*(solve(key, maze, steps) for key, (maze, steps) in unsolved.items()),
+                                        return_exceptions=True)
+        solved = dict(zip(unsolved, outcomes))
+
+        results: t.List[t.Union[Solution, Exception]] = []
+        for request in requests:
+            maze = mazes.get(request.mazeId)
+            if maze is None:
+                results.append(MazeNotFoundException())
+                continue
+            solution = stored.get((maze.id, request.steps.value))
+            if solution is not None:
+                results.append(MazeException(solution.error) if solution.error is not None
+                               else Solution(path=solution.path, exact=solution.exact))
+                continue
+            results.append(solved[keys[(maze.id, request.steps)]])
+        return results
+
+    async def _solve_cached(self, key: str, maze: Maze, steps: Steps) -> Solution:
+        # the cache may hit the disk, keep it off the event loop
+        cached = await asyncio.to_thread(self._cache.get, key)
+        if cached is not None:
+            if 'error' in cached:
+                raise MazeException(cached['error'])
+            return Solution(**cached)
+
+        try:
+            solution = await self._solve(maze, steps)
+        except MazeException as e:
+            await asyncio.to_thread(self._cache.put, key, {'error': e.message})
+            raise
+        await asyncio.to_thread(self._cache.put, key, solution.dict())
+        return solution
+
+    async def _solve(self, maze: Maze, steps: Steps, distances: bool = False) -> Solution:
+        start = time.perf_counter()
+        try:
+            if self._solver is not None:
+                return await self._solver.solve(maze, steps, distances=distances)
+            return await asyncio.to_thread(solve_maze, maze, steps, distances=distances)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self._slow_solve_seconds is not None and elapsed > self._slow_solve_seconds:
+                # the geometry is a valid POST /maze payload, so the solve can be replayed
+                geometry = {'entrance': maze.entrance, 'gridSize': maze.gridSize, 'walls': list(maze.walls)}
+                logger.warning("Solving maze %s for %s steps took %.3fs: %s",
+                               maze.id, steps.value, elapsed, json.dumps(geometry))
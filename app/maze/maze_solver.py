@@ -1,77 +1,182 @@
+import time
 import typing as t
 
-from app.maze.models import parse_grid_size, Maze, parse_coords, Path, Coords
-from app.maze.utils import maze_to_matrix, print_coords
+from app import metrics
+from app.maze.grid import Grid
+from app.maze.models import Maze, parse_coords, parse_grid_size, Path, Coords, Solution, Steps, Exit
+from app.maze.junction_graph import JunctionGraph
+from app.maze.longest_path import LongestPath, LongestPathSearch
+from app.maze.numpy_solver import DistanceField, numpy_available
+from app.maze.planner import MazeAnalysis, Strategy, analyse
+from app.maze.shortest_path import ShortestPathTree, UNVISITED
+from app.maze.utils import maze_to_grid, print_coords
 
 
 class MazeException(Exception):
     def __init__(self, message):
-        super().__init__()
+        super().__init__(message)
         self.message = message
 
 
+class MazeWithoutSolutionException(Exception):
+    pass
+
+
+ShortestPaths = t.Union[ShortestPathTree, DistanceField]
+
+
+def shortest_paths(grid: Grid, root: int, numpy_min_cells: t.Optional[int] = None) -> ShortestPaths:
+    """Shortest paths from root, with the NumPy backend for grids of at least ``numpy_min_cells`` cells."""
+    if numpy_min_cells is not None and numpy_available() and grid.width * grid.height >= numpy_min_cells:
+        return DistanceField(grid, root)
+    return ShortestPathTree(grid, root)
+
+
+def reachable_exits(grid: Grid, tree: ShortestPaths) -> t.List[int]:
+    # exit located at bottom row
+    return [node for node in grid.bottom_row() if tree.reached(node)]
+
+
+def single_exit(grid: Grid, tree: ShortestPaths) -> int:
+    return only_exit(grid, reachable_exits(grid, tree))
+
+
+def only_exit(grid: Grid, exits: t.List[int]) -> int:
+    if len(exits) > 1:
+        exits_pretty = [print_coords(grid.coords(e)) for e in sorted(exits)]
+        print_exits = ", ".join(exits_pretty)
+        raise MazeException(f"Multiple exits detected: {print_exits}.")
+    if len(exits) == 0:
+        raise MazeException("No exit found.")
+    return exits[0]
+
+
 class MazeSolver:
-    _width: int
-    _height: int
-    _entrance: t.Tuple[int, int]
-    _width: int
-
-    def __init__(self, maze: Maze) -> None:
-        self._width, self._height = parse_grid_size(maze.gridSize)
-        self._matrix = maze_to_matrix(maze)
-        self._entrance = parse_coords(maze.entrance)
+    _entrance: int
+    _exit: int
+
+    def __init__(self, maze: Maze, max_expansions: t.Optional[int] = None,
+                 time_limit: t.Optional[float] = None, numpy_min_cells: t.Optional[int] = None) -> None:
+        self._grid = maze_to_grid(maze)
+        self._entrance = self._grid.index(*parse_coords(maze.entrance))
+        self._max_expansions = max_expansions
+        self._time_limit = time_limit
+        self._numpy_min_cells = numpy_min_cells
+        self._longest = None
+        self._analysis: t.Optional[MazeAnalysis] = None
         self._solve()
 
     def _solve(self):
-        paths = []
-
-        def dfs(vertex, visited):
-            visited.append(vertex)
-            for neighbour in self._get_neighbours(vertex):
-                if neighbour not in visited:
-                    dfs(neighbour, visited.copy())
+        self._tree = shortest_paths(self._grid, self._entrance, self._numpy_min_cells)
 
-            # append path if leads to exit (exit located at bottom row)
-            if vertex[1] == self._height - 1:
-                paths.append(visited)
+        self._exit = single_exit(self._grid, self._tree)
 
-        dfs(self._entrance, [])
+    def analysis(self) -> MazeAnalysis:
+        if self._analysis is None:
+            self._analysis = analyse(self._grid, self._tree)
+        return self._analysis
 
-        exits = [c[-1] for c in paths]
-        exits = set(exits)
-        if len(exits) > 1:
-            exits_pretty = sorted([print_coords(e) for e in exits])
-            print_exits = ", ".join(exits_pretty)
-            raise MazeException(f"Multiple exits detected: {print_exits}.")
-        if len(exits) == 0:
-            raise MazeException("No exit found.")
+    def plan(self, steps: Steps) -> Strategy:
+        """The cheapest way to get the path.
 
-        paths.sort(key=len)
-        self._paths = paths
+        Mazes without exactly one exit fail before getting here. The BFS that
+        found the exit already holds the shortest path, and in a tree it is
+        the longest one too.
+        """
+        if steps == Steps.MIN:
+            return Strategy.BFS
+        if self.analysis().cycle_rank == 0:
+            return Strategy.TREE_WALK
+        return Strategy.JUNCTION_SEARCH
 
-    def get_paths(self):
-        return self._paths
+    def get_exit(self) -> Coords:
+        return self._grid.coords(self._exit)
 
     def get_shortest_path(self) -> t.Optional[Path]:
-        if len(self._paths) > 0:
-            return self._paths[0]
+        path = self._tree.path_to(self._exit)
+        if path is not None:
+            return [self._grid.coords(node) for node in path]
         return None
 
     def get_longest_path(self) -> t.Optional[Path]:
-        if len(self._paths) > 0:
-            return self._paths[-1]
+        if self._longest is None and self.plan(Steps.MAX) == Strategy.TREE_WALK:
+            self._longest = LongestPath(self._tree.path_to(self._exit), True, 0)
+        if self._longest is None:
+            started = time.monotonic()
+            graph = JunctionGraph(self._grid, self._entrance, self._exit, self._tree.reached_cells())
+            # building the graph is part of the time budget
+            time_limit = self._time_limit
+            if time_limit is not None:
+                time_limit = max(0.0, time_limit - (time.monotonic() - started))
+            search = LongestPathSearch(graph, graph.node(self._entrance), graph.node(self._exit),
+                                       max_expansions=self._max_expansions, time_limit=time_limit)
+            self._longest = search.search(self._tree.path_to(self._exit))
+        if len(self._longest.path) > 0:
+            return [self._grid.coords(node) for node in self._longest.path]
         return None
 
-    def _get_neighbours(self, node: Coords) -> t.List[Coords]:
-        candidates = [
-            (node[0] - 1, node[1]),
-            (node[0] + 1, node[1]),
-            (node[0], node[1] - 1),
-            (node[0], node[1] + 1)
-        ]
-        return [
-            c for c in candidates
-            # within bounds
-            if 0 <= c[0] < self._width and 0 <= c[1] < self._height
-               and self._matrix[c[1]][c[0]] == "0"  # and is not wall
-        ]
+    def is_longest_path_exact(self) -> bool:
+        self.get_longest_path()
+        return self._longest.exact
+
+
+def find_exits(maze: Maze, distances: bool = False, numpy_min_cells: t.Optional[int] = None) -> Solution:
+    """Every exit reachable from the entrance with its shortest path, found by a single BFS.
+
+    Exits are ordered by distance, then left to right. With ``distances`` the
+    distance of every cell is returned too, row by row, ``None`` for walls and
+    unreachable cells.
+    """
+    grid = maze_to_grid(maze)
+    tree = shortest_paths(grid, grid.index(*parse_coords(maze.entrance)), numpy_min_cells)
+
+    exits = []
+    for node in reachable_exits(grid, tree):
+        path = [print_coords(grid.coords(x)) for x in tree.path_to(node)]
+        exits.append(Exit(exit=path[-1], distance=len(path) - 1, path=path))
+    exits.sort(key=lambda e: e.distance)
+
+    distance_map = None
+    if distances:
+        cell_distances = tree.distances()
+        distance_map = []
+        for y in range(grid.height):
+            row = cell_distances[grid.index(0, y):grid.index(grid.width, y)]
+            distance_map.append([d if d != UNVISITED else None for d in row])
+    return Solution(exits=exits, distances=distance_map)
+
+
+def solve_maze(maze: Maze, steps: Steps, max_expansions: t.Optional[int] = None,
+               time_limit: t.Optional[float] = None, distances: bool = False,
+               numpy_min_cells: t.Optional[int] = None) -> Solution:
+    width, height = parse_grid_size(maze.gridSize)
+    with metrics.SOLVER_SECONDS.time(steps=steps.value, size=metrics.size_bucket(width * height)):
+        if steps == Steps.EXITS:
+            return find_exits(maze, distances, numpy_min_cells)
+        return solution_for(MazeSolver(maze, max_expansions=max_expansions, time_limit=time_limit,
+                                       numpy_min_cells=numpy_min_cells), steps)
+
+
+def solve_maze_steps(maze: Maze, steps: t.Sequence[Steps], max_expansions: t.Optional[int] = None,
+                     time_limit: t.Optional[float] = None,
+                     numpy_min_cells: t.Optional[int] = None) -> t.List[Solution]:
+    """Solutions for each of ``steps``, sharing the BFS and the analysis of a single MazeSolver."""
+    solver = MazeSolver(maze, max_expansions=max_expansions, time_limit=time_limit, numpy_min_cells=numpy_min_cells)
+    return [solution_for(solver, step) for step in steps]
+
+
+def solution_for(solver: MazeSolver, steps: Steps) -> Solution:
+    strategy = solver.plan(steps)
+    metrics.SOLVER_STRATEGIES.inc(strategy=strategy.value)
+    exact = True
+    if steps == Steps.MIN:
+        path = solver.get_shortest_path()
+    elif steps == Steps.MAX:
+        path = solver.get_longest_path()
+        exact = solver.is_longest_path_exact()
+    else:
+        raise NotImplementedError("Steps must be either min or max")
+
+    if path is not None:
+        return Solution(path=[print_coords(x) for x in path], exact=exact, strategy=strategy.value)
+    raise MazeWithoutSolutionException()
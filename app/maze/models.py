@@ -1,22 +1,35 @@
+import base64
+import binascii
 import typing as t
 from enum import Enum
 
 from pydantic import BaseModel, root_validator, constr, conlist  # pylint: disable=no-name-in-module
 
-Coords = t.Tuple[int, int]
+from app.maze.coords import Coords, parse_coords, print_column
+from app.maze.grid import Grid, MAX_CELLS, WALL
+
 GridSize = t.Tuple[int, int]
 Path = t.List[Coords]
 
+MAX_BATCH_SIZE = 100
+
 
 class Steps(Enum):
     MIN = "min"
     MAX = "max"
+    EXITS = "exits"
+
 
+class PathFormat(Enum):
+    CELLS = "cells"
+    DIRECTIONS = "directions"
 
-def parse_coords(coords: str) -> t.Tuple[int, int]:
-    x_coord = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'.index(coords[0])
-    y_coord = int(coords[1]) - 1
-    return x_coord, y_coord
+
+class MazeField(Enum):
+    ID = "id"
+    ENTRANCE = "entrance"
+    GRID_SIZE = "gridSize"
+    WALLS = "walls"
 
 
 def parse_grid_size(grid_size: str) -> t.Tuple[int, int]:
@@ -24,39 +37,148 @@ def parse_grid_size(grid_size: str) -> t.Tuple[int, int]:
     return int(dimensions[0]), int(dimensions[1])
 
 
-class CreateMazePayload(BaseModel):
-    entrance: constr(regex=r'^[A-Z][0-9]+$')
+class MazeGeometry(BaseModel):
+    # coordinates are checked by parse_coords in the validator below
+    entrance: str
     gridSize: constr(regex=r'[1-9][0-9]*x[1-9][0-9]*')
-    walls: conlist(constr(regex=r'^[A-Z][0-9]+$'))
+    walls: t.List[str]
 
     @root_validator(skip_on_failure=True)
     @classmethod
-    def check_entrance_within_bounds(cls, values):
-        entrance_coords = parse_coords(values['entrance'])
-        grid = parse_grid_size(values['gridSize'])
-        if entrance_coords[0] >= grid[0] or entrance_coords[1] >= grid[1]:
+    def check_geometry(cls, values):
+        """Checks the grid size, the entrance and each wall once, dropping duplicate walls."""
+        width, height = parse_grid_size(values['gridSize'])
+        if width * height > MAX_CELLS:
+            raise ValueError(f"Grid can't have more than {MAX_CELLS} cells.")
+        grid = Grid(width, height)
+        entrance = parse_coords(values['entrance'])
+        if not grid.contains(*entrance):
             raise ValueError("Entrance is not within bounds.")
+
+        values['walls'] = cls._set_walls(grid, values)
+        if grid.is_wall(grid.index(*entrance)):
+            raise ValueError("Entrance can't be where wall is.")
         return values
 
-    @root_validator(skip_on_failure=True)
     @classmethod
-    def check_walls_within_bounds(cls, values):
-        grid = parse_grid_size(values['gridSize'])
+    def _set_walls(cls, grid: Grid, values: t.Dict[str, t.Any]) -> t.List[str]:
+        walls = []
         for wall in values['walls']:
             coords = parse_coords(wall)
-            if coords[0] >= grid[0] or coords[1] >= grid[1]:
+            if not grid.contains(*coords):
                 raise ValueError(f"Wall {wall} is not within bounds.")
-        return values
+            index = grid.index(*coords)
+            if not grid.is_wall(index):
+                grid.cells[index] = WALL
+                walls.append(wall)
+        return walls
+
+
+def decode_walls_bitmap(grid: Grid, bitmap: str):
+    """Sets the walls of a base64 encoded bitmap, one bit per cell row by row, most significant bit first."""
+    try:
+        data = base64.b64decode(bitmap, validate=True)
+    except binascii.Error as e:
+        raise ValueError("Walls bitmap is not valid base64.") from e
+    cells = grid.width * grid.height
+    if len(data) != (cells + 7) // 8:
+        raise ValueError(f"Walls bitmap must have {(cells + 7) // 8} bytes for a {grid.width}x{grid.height} grid.")
+    bits = format(int.from_bytes(data, 'big'), f'0{len(data) * 8}b').encode('ascii')
+    for y in range(grid.height):
+        grid.set_row(y, bits[y * grid.width:(y + 1) * grid.width])
+
+
+def decode_walls_grid(grid: Grid, rows: t.List[str]):
+    """Sets the walls of rows of ``0`` (open) and ``1`` (wall) characters, as printed by print_maze."""
+    if len(rows) != grid.height:
+        raise ValueError(f"Walls grid must have {grid.height} rows.")
+    for y, row in enumerate(rows):
+        if len(row) != grid.width or row.strip('01'):
+            raise ValueError(f"Walls grid row {y + 1} must be {grid.width} characters of 0 and 1.")
+        grid.set_row(y, row.encode('ascii'))
+
+
+def print_walls(grid: Grid) -> t.List[str]:
+    columns: t.Dict[int, str] = {}
+    walls = []
+    for x, y in grid.walls():
+        column = columns.get(x)
+        if column is None:
+            column = columns[x] = print_column(x)
+        walls.append(f"{column}{y + 1}")
+    return walls
+
+
+class CreateMazePayload(MazeGeometry):
+    """Walls are given as a list of coordinates, or in one of the compact encodings.
+
+    The compact encodings skip parsing coordinates altogether, and are turned
+    into the list of walls once validated.
+    """
+    walls: t.Optional[t.List[str]] = None
+    wallsBitmap: t.Optional[str] = None
+    wallsGrid: t.Optional[t.List[str]] = None
 
-    @root_validator()
     @classmethod
-    def check_entrance_not_at_all(cls, values):
-        entrance = values['entrance']
-        walls = values['walls']
-        if entrance in walls:
-            raise ValueError("Entrance can't be where wall is.")
-        return values
+    def _set_walls(cls, grid: Grid, values: t.Dict[str, t.Any]) -> t.List[str]:
+        encodings = [values[name] is not None for name in ('walls', 'wallsBitmap', 'wallsGrid')]
+        if sum(encodings) != 1:
+            raise ValueError("Exactly one of walls, wallsBitmap and wallsGrid must be given.")
+        if values['wallsBitmap'] is not None:
+            decode_walls_bitmap(grid, values['wallsBitmap'])
+        elif values['wallsGrid'] is not None:
+            decode_walls_grid(grid, values['wallsGrid'])
+        else:
+            return super()._set_walls(grid, values)
+        values['wallsBitmap'] = values['wallsGrid'] = None
+        return print_walls(grid)
 
 
-class Maze(CreateMazePayload):
+class Maze(MazeGeometry):
     id: str
+
+
+class MazeEdit(BaseModel):
+    """Walls to add to and remove from a maze, checked against its grid when applied."""
+    add: t.List[str] = []
+    remove: t.List[str] = []
+
+    @root_validator(skip_on_failure=True)
+    @classmethod
+    def check_walls(cls, values):
+        for wall in values['add'] + values['remove']:
+            parse_coords(wall)
+        if set(values['add']) & set(values['remove']):
+            raise ValueError("A wall can't be both added and removed.")
+        return values
+
+
+class Exit(BaseModel):
+    exit: str
+    distance: int
+    path: t.List[str]
+
+
+class Solution(BaseModel):
+    path: t.List[str] = []
+    exact: bool = True
+    # how the path was found, see planner.Strategy; unknown for solutions stored before solving was planned
+    strategy: t.Optional[str] = None
+    exits: t.Optional[t.List[Exit]] = None
+    distances: t.Optional[t.List[t.List[t.Optional[int]]]] = None
+
+
+class Route(BaseModel):
+    reachable: bool
+    # steps between the two cells, None when unreachable
+    distance: t.Optional[int] = None
+    path: t.List[str] = []
+
+
+class SolutionRequest(BaseModel):
+    mazeId: str
+    steps: Steps
+
+
+CreateMazeBatchPayload = conlist(CreateMazePayload, min_items=1, max_items=MAX_BATCH_SIZE)
+SolutionBatchPayload = conlist(SolutionRequest, min_items=1, max_items=MAX_BATCH_SIZE)
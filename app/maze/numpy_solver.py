@@ -0,0 +1,101 @@
+import typing as t
+from array import array
+
+from app import metrics
+from app.maze.grid import Grid, OPEN
+from app.maze.shortest_path import UNVISITED
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+# a NumPy level costs about as much as visiting a dozen cells in Python, so narrower levels are expanded in Python
+SMALL_FRONTIER = 16
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+class DistanceField:
+    """NumPy counterpart of ShortestPathTree, with the same interface.
+
+    Distances from the root are filled in one BFS frontier at a time, each
+    frontier expanded with vectorised operations over cell indices, so the
+    Python overhead is per BFS level rather than per cell. That makes it
+    about three times faster than a plain BFS on large open grids, which have
+    few wide levels, but several times slower in corridors, whose many levels
+    are a cell or two wide, so levels narrower than ``SMALL_FRONTIER`` are
+    expanded cell by cell. Paths are read back by descending the distance
+    field from the target.
+    """
+
+    def __init__(self, grid: Grid, root: int) -> None:
+        if np is None:
+            raise RuntimeError("NumPy is not installed.")
+        self._offsets = grid.offsets
+        self._distances = self._bfs(grid, root)
+
+    @staticmethod
+    def _bfs(grid: Grid, root: int) -> 'np.ndarray':
+        # Python and NumPy views of the same buffers, for narrow and wide levels
+        unvisited = bytearray((np.frombuffer(grid.cells, dtype=np.uint8) == OPEN).tobytes())
+        unvisited_mask = np.frombuffer(unvisited, dtype=np.bool_)
+        found = array('i', [UNVISITED]) * len(grid)
+        distances = np.frombuffer(found, dtype=np.int32)
+        offsets = grid.offsets
+        offsets_array = np.array(offsets, dtype=np.intp)
+
+        # walls, including the border, are never unvisited
+        unvisited[root] = False
+        found[root] = 0
+        frontier: t.List[int] = [root]
+        distance = 0
+        visited = 1
+        while frontier:
+            distance += 1
+            if len(frontier) < SMALL_FRONTIER:
+                layer = []
+                for node in frontier:
+                    for offset in offsets:
+                        neighbour = node + offset
+                        if unvisited[neighbour]:
+                            unvisited[neighbour] = False
+                            found[neighbour] = distance
+                            layer.append(neighbour)
+                frontier = layer
+            else:
+                neighbours = (np.array(frontier, dtype=np.intp)[:, np.newaxis] + offsets_array).ravel()
+                layer_array = np.unique(neighbours[unvisited_mask[neighbours]])
+                unvisited_mask[layer_array] = False
+                distances[layer_array] = distance
+                frontier = layer_array.tolist()
+            visited += len(frontier)
+        metrics.SOLVER_EXPANSIONS.inc(visited, search='bfs')
+        return distances
+
+    def reached(self, node: int) -> bool:
+        return self._distances[node] != UNVISITED
+
+    def reached_cells(self) -> t.Iterable[int]:
+        return np.flatnonzero(self._distances != UNVISITED).tolist()
+
+    def distances(self) -> array:
+        return array('i', self._distances.tobytes())
+
+    def path_to(self, node: int) -> t.Optional[t.List[int]]:
+        if not self.reached(node):
+            return None
+        distances, offsets = self._distances, self._offsets
+        path = [node]
+        distance = int(distances[node])
+        while distance > 0:
+            distance -= 1
+            for offset in offsets:
+                if distances[node + offset] == distance:
+                    node += offset
+                    break
+            path.append(node)
+        path.reverse()
+        return path
@@ -0,0 +1,58 @@
+import typing as t
+from enum import Enum
+
+from app.maze.grid import Grid, OPEN
+
+if t.TYPE_CHECKING:
+    from app.maze.maze_solver import ShortestPaths
+
+
+class Strategy(Enum):
+    # the shortest path read back from the BFS tree
+    BFS = "bfs"
+    # the component has no cycles, so the shortest path read back from the BFS tree is the only one
+    TREE_WALK = "tree-walk"
+    # branch-and-bound longest path search over the junction graph
+    JUNCTION_SEARCH = "junction-search"
+    # the shortest path read back from distances repaired after an edit, see incremental.py
+    INCREMENTAL = "incremental"
+    # the shortest path over the tiles of a large grid, see hierarchical.py
+    HIERARCHICAL = "hierarchical"
+
+
+def count_edges(cells: t.Union[bytes, bytearray], stride: int) -> int:
+    """Pairs of open (zero) cells next to each other, the grid having a border of non-zero cells.
+
+    The cells are read as one big integer, OR-ed with itself shifted by a cell
+    and by a row, so a zero byte is left exactly where both cells are open.
+    """
+    value = int.from_bytes(cells, 'big')
+    size = len(cells)
+    return ((value | value >> 8).to_bytes(size, 'big').count(0) +
+            (value | value >> 8 * stride).to_bytes(size, 'big').count(0))
+
+
+class MazeAnalysis:
+    """Structure of the component of the entrance, the only one a path can go through.
+
+    The cycle rank, edges - nodes + 1 for a single component, is the number of
+    independent cycles; a maze whose component has none is a tree.
+    """
+
+    def __init__(self, open_cells: int, reachable_cells: int, edges: int) -> None:
+        self.open_cells = open_cells
+        self.reachable_cells = reachable_cells
+        self.edges = edges
+
+    @property
+    def cycle_rank(self) -> int:
+        return self.edges - self.reachable_cells + 1
+
+
+def analyse(grid: Grid, tree: 'ShortestPaths') -> MazeAnalysis:
+    reached = bytearray(b'\x01') * len(grid)
+    reachable_cells = 0
+    for node in tree.reached_cells():
+        reached[node] = 0
+        reachable_cells += 1
+    return MazeAnalysis(grid.cells.count(OPEN), reachable_cells, count_edges(reached, grid.stride))
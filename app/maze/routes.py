@@ -0,0 +1,181 @@
+import heapq
+import threading
+import typing as t
+from array import array
+from collections import OrderedDict
+
+from app import metrics
+from app.maze.grid import Grid, OPEN
+from app.maze.models import Maze
+from app.maze.planner import count_edges
+from app.maze.utils import maze_to_grid
+
+NO_COMPONENT = -1
+# above this many edges per open cell the grid is mostly open space, where A* heads straight for the target
+OPEN_SPACE_EDGES_PER_CELL = 1.5
+
+
+def label_components(grid: Grid) -> array:
+    """Connected component of every open cell, NO_COMPONENT for walls."""
+    cells, offsets = grid.cells, grid.offsets
+    labels = array('i', [NO_COMPONENT]) * len(grid)
+    component = 0
+    for y in range(grid.height):
+        start = grid.index(0, y)
+        for root in range(start, start + grid.width):
+            if cells[root] or labels[root] != NO_COMPONENT:
+                continue
+            labels[root] = component
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                for offset in offsets:
+                    neighbour = node + offset
+                    if not cells[neighbour] and labels[neighbour] == NO_COMPONENT:
+                        labels[neighbour] = component
+                        stack.append(neighbour)
+            component += 1
+    return labels
+
+
+class RouteIndex:
+    """A maze prepared for any number of point to point route queries.
+
+    Cells in different components are answered as unreachable without
+    searching. Routes within a component are found with A* and a Manhattan
+    heuristic on mostly open grids, where it barely strays from the straight
+    line, and with a bidirectional BFS in mazes, where corridors make the
+    heuristic useless and two half-depth searches visit far fewer cells.
+    """
+
+    def __init__(self, grid: Grid) -> None:
+        self.grid = grid
+        self._labels = label_components(grid)
+        open_cells = grid.cells.count(OPEN)
+        self.open_space = count_edges(grid.cells, grid.stride) > OPEN_SPACE_EDGES_PER_CELL * open_cells
+
+    def connected(self, source: int, target: int) -> bool:
+        return self._labels[source] != NO_COMPONENT and self._labels[source] == self._labels[target]
+
+    def route(self, source: int, target: int) -> t.Optional[t.List[int]]:
+        """A shortest path from source to target, or None when there is none."""
+        if not self.connected(source, target):
+            return None
+        if source == target:
+            return [source]
+        if self.open_space:
+            return self._a_star(source, target)
+        return self._bidirectional(source, target)
+
+    def _a_star(self, source: int, target: int) -> t.List[int]:
+        cells, offsets, stride = self.grid.cells, self.grid.offsets, self.grid.stride
+        target_y, target_x = divmod(target, stride)
+
+        def estimate(node: int) -> int:
+            y, x = divmod(node, stride)
+            return abs(x - target_x) + abs(y - target_y)
+
+        parents = {source: source}
+        distances = {source: 0}
+        # ties go to the deepest node, which on open ground is the one closest to the target
+        queue = [(estimate(source), 0, source)]
+        expansions = 0
+        while True:
+            _, depth, node = heapq.heappop(queue)
+            depth = -depth
+            if node == target:
+                break
+            if depth > distances[node]:
+                continue
+            expansions += 1
+            for offset in offsets:
+                neighbour = node + offset
+                if not cells[neighbour] and depth + 1 < distances.get(neighbour, depth + 2):
+                    distances[neighbour] = depth + 1
+                    parents[neighbour] = node
+                    heapq.heappush(queue, (depth + 1 + estimate(neighbour), -depth - 1, neighbour))
+        metrics.SOLVER_EXPANSIONS.inc(expansions, search='route')
+        return self._walk(parents, target)[::-1]
+
+    def _bidirectional(self, source: int, target: int) -> t.List[int]:
+        cells, offsets = self.grid.cells, self.grid.offsets
+        # parent and distance of every cell reached from each end
+        parents: t.Tuple[t.Dict[int, int], t.Dict[int, int]] = ({source: source}, {target: target})
+        distances: t.Tuple[t.Dict[int, int], t.Dict[int, int]] = ({source: 0}, {target: 0})
+        frontiers = ([source], [target])
+        expansions = 0
+        while True:
+            # grow the smaller frontier by a whole layer, the shortest route may meet it anywhere along it
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            own_parents, own_distances = parents[side], distances[side]
+            other_distances = distances[1 - side]
+            depth = own_distances[frontiers[side][0]] + 1
+            best: t.Optional[t.Tuple[int, int, int]] = None
+            layer = []
+            for node in frontiers[side]:
+                expansions += 1
+                for offset in offsets:
+                    neighbour = node + offset
+                    if cells[neighbour]:
+                        continue
+                    if neighbour in other_distances:
+                        length = depth + other_distances[neighbour]
+                        if best is None or length < best[0]:
+                            best = (length, node, neighbour)
+                    if neighbour not in own_parents:
+                        own_parents[neighbour] = node
+                        own_distances[neighbour] = depth
+                        layer.append(neighbour)
+            if best is not None:
+                metrics.SOLVER_EXPANSIONS.inc(expansions, search='route')
+                _, node, neighbour = best
+                path = self._walk(own_parents, node)[::-1] + self._walk(parents[1 - side], neighbour)
+                return path if side == 0 else path[::-1]
+            frontiers = (layer, frontiers[1]) if side == 0 else (frontiers[0], layer)
+
+    @staticmethod
+    def _walk(parents: t.Dict[int, int], node: int) -> t.List[int]:
+        path = [node]
+        while parents[node] != node:
+            node = parents[node]
+            path.append(node)
+        return path
+
+
+class _IndexedMaze:
+    def __init__(self, index: RouteIndex, version: int) -> None:
+        self.index = index
+        self.version = version
+
+
+class RouteIndexes:
+    """Route indexes of the most recently queried mazes, by maze version, so an edit makes them stale.
+
+    Checking the version first lets queries skip loading the walls of mazes already indexed.
+    """
+
+    def __init__(self, max_mazes: int) -> None:
+        self._max_mazes = max_mazes
+        self._mazes: 'OrderedDict[str, _IndexedMaze]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, maze_id: str, version: int) -> t.Optional[RouteIndex]:
+        with self._lock:
+            indexed = self._mazes.get(maze_id)
+            if indexed is None or indexed.version != version:
+                return None
+            self._mazes.move_to_end(maze_id)
+            return indexed.index
+
+    def build(self, maze: Maze, version: int) -> RouteIndex:
+        # built outside the lock, two queries racing on a new maze both build it rather than wait
+        index = RouteIndex(maze_to_grid(maze))
+        with self._lock:
+            indexed = self._mazes.get(maze.id)
+            # a query that loaded the maze before an edit mustn't replace the index of the edited walls
+            if indexed is None or indexed.version <= version:
+                self._mazes[maze.id] = _IndexedMaze(index, version)
+                self._mazes.move_to_end(maze.id)
+            while len(self._mazes) > self._max_mazes:
+                self._mazes.popitem(last=False)
+        return index
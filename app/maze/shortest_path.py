@@ -0,0 +1,63 @@
+import typing as t
+from array import array
+
+from app import metrics
+from app.maze.grid import Grid
+
+UNVISITED = -1
+
+
+class ShortestPathTree:
+    """Breadth-first search tree over the cells of a grid.
+
+    Every cell reachable from ``root`` gets a parent pointer, so the shortest
+    path to any of them can be read back in O(path length).
+    """
+
+    def __init__(self, grid: Grid, root: int) -> None:
+        self._parents = array('i', [UNVISITED]) * len(grid)
+        self._order = self._bfs(grid, root)
+
+    def _bfs(self, grid: Grid, root: int) -> array:
+        cells, offsets, parents = grid.cells, grid.offsets, self._parents
+
+        parents[root] = root
+        queue = array('i', [root])
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for offset in offsets:
+                neighbour = node + offset
+                if not cells[neighbour] and parents[neighbour] == UNVISITED:
+                    parents[neighbour] = node
+                    queue.append(neighbour)
+        metrics.SOLVER_EXPANSIONS.inc(len(queue), search='bfs')
+        return queue
+
+    def reached(self, node: int) -> bool:
+        return self._parents[node] != UNVISITED
+
+    def reached_cells(self) -> t.Iterable[int]:
+        return self._order
+
+    def distances(self) -> array:
+        """Distance from the root to every cell, UNVISITED for the ones that weren't reached."""
+        parents = self._parents
+        distances = array('i', [UNVISITED]) * len(parents)
+        root = self._order[0]
+        distances[root] = 0
+        # cells were queued in BFS order, so every parent comes before its children
+        for node in self._order[1:]:
+            distances[node] = distances[parents[node]] + 1
+        return distances
+
+    def path_to(self, node: int) -> t.Optional[t.List[int]]:
+        if not self.reached(node):
+            return None
+        path = [node]
+        while self._parents[node] != node:
+            node = self._parents[node]
+            path.append(node)
+        path.reverse()
+        return path
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import typing as t
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app import metrics
+from app.maze.models import Maze, Steps
+
+CacheEntry = t.Dict[str, t.Any]
+
+
+def solution_key(maze: Maze, steps: Steps) -> str:
+    """Canonical hash of the maze geometry, so identical mazes share an entry regardless of id or owner."""
+    canonical = json.dumps([maze.gridSize, maze.entrance, sorted(set(maze.walls)), steps.value],
+                           separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _encode(entry: CacheEntry) -> bytes:
+    return json.dumps(entry, separators=(',', ':')).encode('utf-8')
+
+
+def _decode(value: bytes) -> CacheEntry:
+    return json.loads(value)
+
+
+class SolutionCache:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> t.Optional[CacheEntry]:
+        pass
+
+    def put(self, key: str, entry: CacheEntry):
+        pass
+
+    def stats(self) -> t.Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _count(self, entry: t.Optional[CacheEntry]) -> t.Optional[CacheEntry]:
+        if entry is None:
+            self.misses += 1
+            metrics.SOLUTION_CACHE_LOOKUPS.inc(result='miss')
+        else:
+            self.hits += 1
+            metrics.SOLUTION_CACHE_LOOKUPS.inc(result='hit')
+        return entry
+
+
+class NoSolutionCache(SolutionCache):
+    def get(self, key: str) -> t.Optional[CacheEntry]:
+        return self._count(None)
+
+
+class InMemorySolutionCache(SolutionCache):
+    """Per-process LRU cache bounded by entry count and encoded size."""
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        super().__init__()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Optional[CacheEntry]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        return self._count(_decode(value) if value is not None else None)
+
+    def put(self, key: str, entry: CacheEntry):
+        value = _encode(entry)
+        if len(value) > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> t.Dict[str, int]:
+        return {**super().stats(), 'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class SqliteSolutionCache(SolutionCache):
+    """LRU cache in a local SQLite file, shared by every worker process on the host."""
+
+    # recency is a logical clock rather than a timestamp, so it's strictly ordered across processes
+    _TICK = "(SELECT COALESCE(MAX(last_used), 0) + 1 FROM solutions)"
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int) -> None:
+        super().__init__()
+        self._path = path
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                       "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS ix_solutions_last_used ON solutions (last_used)")
+
+    @contextmanager
+    def _connect(self) -> t.Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self._path, timeout=5.0)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key: str) -> t.Optional[CacheEntry]:
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                db.execute(f"UPDATE solutions SET last_used = {self._TICK} WHERE key = ?", (key,))
+        return self._count(_decode(row[0]) if row is not None else None)
+
+    def put(self, key: str, entry: CacheEntry):
+        value = _encode(entry)
+        if len(value) > self._max_bytes:
+            return
+        with self._connect() as db:
+            db.execute(f"INSERT OR REPLACE INTO solutions (key, value, size, last_used) VALUES (?, ?, ?, {self._TICK})",
+                       (key, value, len(value)))
+            db.execute("DELETE FROM solutions WHERE key IN ("
+                       "SELECT key FROM solutions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                       (self._max_entries,))
+            db.execute("DELETE FROM solutions WHERE key IN ("
+                       "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS total "
+                       "FROM solutions) WHERE total > ?)",
+                       (self._max_bytes,))
+
+    def stats(self) -> t.Dict[str, int]:
+        with self._connect() as db:
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM solutions").fetchone()
+        return {**super().stats(), 'entries': entries, 'bytes': size}
@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import typing as t
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import metrics, profiling
+from app.maze.hierarchical import TILE_SIZE, TileCache, abstract_tiles, solve_tiled, tile_maze
+from app.maze.maze_solver import solve_maze, solve_maze_steps
+from app.maze.models import Maze, Solution, Steps, parse_coords, parse_grid_size
+
+logger = logging.getLogger(__name__)
+
+
+class SolverBusyException(Exception):
+    def __init__(self, message, retry_after: int):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class SolverTimeoutException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class _PoolRecycled(Exception):
+    """A solve that hadn't started when its pool was recycled, to be run again on the new pool."""
+
+
+# the token of the task each worker of the pool runs, 0 when idle, and the slot of this worker
+_running: t.Optional[t.Any] = None
+_slot = 0
+
+
+def _init_worker(running, workers):
+    global _running, _slot  # pylint: disable=global-statement
+    with workers.get_lock():
+        _slot = workers.value
+        workers.value += 1
+    _running = running
+
+
+def run_in_worker(token: int, metrics_enabled: bool, profile: bool, func: t.Callable,
+                  *args) -> t.Tuple[t.Any, t.Dict, t.Optional[profiling.StatsDict]]:
+    """Runs func in a worker process.
+
+    Returns the metrics recorded while running and, when asked to profile,
+    the profile stats along with the result.
+    """
+    if _running is not None:
+        _running[_slot] = token
+    try:
+        metrics.enable(metrics_enabled)
+        # forked workers start with a copy of the web process' samples, which must not be sent back
+        metrics.REGISTRY.drain()
+        if profile:
+            result, stats = profiling.collect(func, *args)
+        else:
+            result, stats = func(*args), None
+        return result, metrics.REGISTRY.drain(), stats
+    finally:
+        if _running is not None:
+            _running[_slot] = 0
+
+
+class SolverExecutor:
+    """Runs MazeSolver in a bounded pool of worker processes.
+
+    Solving is CPU-bound pure Python, so a process pool is the only way to use
+    more than one core per uvicorn worker. At most ``max_pending`` solves are
+    queued or running at a time, anything above that is rejected straight away.
+    A solve that misses its deadline can't be interrupted inside the worker,
+    so the pool is replaced. Solves of other requests that hadn't started on
+    the old pool start over on the new one, those running are left to finish,
+    and the old pool's processes are terminated once none of them is awaited.
+
+    Shortest paths of grids of at least ``tiled_min_cells`` cells are found
+    over tiles (see hierarchical.py), abstracted by all the workers at once
+    and cached here, so solving a maze again after an edit only abstracts
+    the tiles the edit touched.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: float, retry_after: int = 1,
+                 max_expansions: t.Optional[int] = None, time_limit: t.Optional[float] = None,
+                 numpy_min_cells: t.Optional[int] = None, tiled_min_cells: t.Optional[int] = None,
+                 tile_size: int = TILE_SIZE, tile_cache_size: int = 100_000) -> None:
+        self.max_workers = max_workers
+        self._max_pending = max_pending
+        self._timeout = timeout
+        self._retry_after = retry_after
+        self._max_expansions = max_expansions
+        self._time_limit = time_limit
+        self._numpy_min_cells = numpy_min_cells
+        self._tiled_min_cells = tiled_min_cells
+        self._tile_size = tile_size
+        self._tile_cache = TileCache(tile_cache_size)
+        self._pending = 0
+        self._tokens = itertools.count(1)
+        # per pool, the task tokens its workers run, and the futures awaited on it with their tokens and waiters
+        self._running: t.Dict[ProcessPoolExecutor, t.Any] = {}
+        self._awaited: t.Dict[ProcessPoolExecutor, t.Dict[Future, t.Tuple[int, asyncio.Future]]] = {}
+        self._requeued: t.Set[Future] = set()
+        self._pool = self._create_pool()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        running = multiprocessing.Array('q', self.max_workers, lock=False)
+        pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                   initargs=(running, multiprocessing.Value('i', 0)))
+        self._running[pool] = running
+        self._awaited[pool] = {}
+        return pool
+
+    async def solve(self, maze: Maze, steps: Steps, timeout: t.Optional[float] = None,
+                    distances: bool = False) -> Solution:
+        # the maze may be an ORM row, send the worker a plain model
+        maze = Maze.construct(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize, walls=list(maze.walls))
+        if steps == Steps.MIN and not distances and self._is_tiled(maze):
+            return await self._bounded(maze, steps.value, timeout, lambda pool: self._solve_tiled(pool, maze))
+        return await self._bounded(maze, steps.value, timeout, lambda pool: self._run(
+            pool, solve_maze, maze, steps, self._max_expansions, self._time_limit, distances, self._numpy_min_cells))
+
+    async def solve_steps(self, maze: Maze, steps: t.Sequence[Steps],
+                          timeout: t.Optional[float] = None) -> t.List[Solution]:
+        """Solutions for each of ``steps``, found by a single solver in one worker."""
+        maze = Maze.construct(id=maze.id, entrance=maze.entrance, gridSize=maze.gridSize, walls=list(maze.walls))
+        return await self._bounded(maze, '/'.join(step.value for step in steps), timeout, lambda pool: self._run(
+            pool, solve_maze_steps, maze, steps, self._max_expansions, self._time_limit, self._numpy_min_cells))
+
+    async def _bounded(self, maze: Maze, steps: str, timeout: t.Optional[float],
+                       solve: t.Callable[[ProcessPoolExecutor], t.Awaitable[t.Any]]) -> t.Any:
+        """Runs solve on the pool within the queue depth and the deadline."""
+        if self._pending >= self._max_pending:
+            raise SolverBusyException("Too many mazes are being solved, try again later.", self._retry_after)
+
+        timeout = timeout if timeout is not None else self._timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._pending += 1
+        try:
+            while True:
+                pool = self._pool
+                try:
+                    return await asyncio.wait_for(solve(pool), max(0.0, deadline - loop.time()))
+                except _PoolRecycled:
+                    continue
+                except asyncio.TimeoutError as e:
+                    logger.warning("Solving maze %s for %s steps timed out after %ss", maze.id, steps, timeout)
+                    self._recycle(pool)
+                    raise SolverTimeoutException("Solving the maze took too long.") from e
+                except BrokenProcessPool as e:
+                    self._recycle(pool)
+                    raise SolverBusyException("Solver was restarted, try again later.", self._retry_after) from e
+        finally:
+            self._pending -= 1
+
+    def _is_tiled(self, maze: Maze) -> bool:
+        if self._tiled_min_cells is None:
+            return False
+        width, height = parse_grid_size(maze.gridSize)
+        return width * height >= self._tiled_min_cells
+
+    async def _run(self, pool: ProcessPoolExecutor, func: t.Callable, *args) -> t.Any:
+        if pool is not self._pool:
+            # a later step of a solve whose pool was recycled meanwhile
+            raise _PoolRecycled()
+        request_profile = profiling.current_profile.get()
+        token = next(self._tokens)
+        future = pool.submit(run_in_worker, token, metrics.REGISTRY.enabled, request_profile is not None, func,
+                             *args)
+        waiter = asyncio.wrap_future(future)
+        awaited = self._awaited[pool]
+        awaited[future] = (token, waiter)
+        try:
+            result, samples, stats = await waiter
+        except asyncio.CancelledError:
+            if future in self._requeued:
+                raise _PoolRecycled() from None
+            raise
+        finally:
+            del awaited[future]
+            self._requeued.discard(future)
+            self._reap(pool)
+        metrics.REGISTRY.merge(samples)
+        if stats is not None:
+            request_profile.add(stats)
+        return result
+
+    async def _solve_tiled(self, pool: ProcessPoolExecutor, maze: Maze) -> Solution:
+        grid, tiles = await self._run(pool, tile_maze, maze, self._tile_size)
+        keys = [tile.key() for tile in tiles]
+        abstractions = [self._tile_cache.get(key) for key in keys]
+        missing = [number for number, abstraction in enumerate(abstractions) if abstraction is None]
+        # one batch per worker, a task per tile would mostly be spent pickling
+        batches = [missing[start::self.max_workers] for start in range(min(self.max_workers, len(missing)))]
+        abstracted = await asyncio.gather(*(self._run(pool, abstract_tiles, [tiles[number] for number in batch])
+                                            for batch in batches))
+        for batch, batch_abstractions in zip(batches, abstracted):
+            for number, abstraction in zip(batch, batch_abstractions):
+                abstractions[number] = abstraction
+                self._tile_cache.put(keys[number], abstraction)
+        return await self._run(pool, solve_tiled, grid, grid.index(*parse_coords(maze.entrance)), self._tile_size,
+                               tiles, abstractions)
+
+    def _recycle(self, pool: ProcessPoolExecutor):
+        if pool is not self._pool:
+            return
+        self._pool = self._create_pool()
+        started = set(self._running[pool])
+        for future, (token, waiter) in list(self._awaited[pool].items()):
+            if token not in started:
+                # may already be in the call queue, where it can't be cancelled, and is abandoned all the same
+                self._requeued.add(future)
+                future.cancel()
+                waiter.cancel()
+        self._reap(pool)
+
+    def _reap(self, pool: ProcessPoolExecutor):
+        """Terminates a replaced pool once none of its solves are awaited, only timed out ones may be left."""
+        if pool is self._pool or pool not in self._awaited or self._awaited[pool]:
+            return
+        del self._awaited[pool]
+        del self._running[pool]
+        self._terminate(pool)
+
+    @staticmethod
+    def _terminate(pool: ProcessPoolExecutor):
+        processes = list((pool._processes or {}).values())  # pylint: disable=protected-access
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self):
+        for pool in list(self._awaited):
+            if pool is not self._pool:
+                self._terminate(pool)
+        self._pool.shutdown(wait=False, cancel_futures=True)
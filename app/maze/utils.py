@@ -1,3 +1,7 @@
+import typing as t
+
+from app.maze.coords import print_coords
+from app.maze.grid import Grid
 from app.maze.models import parse_grid_size, Maze, parse_coords, Coords, Path
 
 
@@ -11,16 +15,49 @@ def maze_to_matrix(maze: Maze):
     return matrix
 
 
-def print_maze(maze: Maze) -> str:
-    matrix = maze_to_matrix(maze)
-    return '\n'.join([''.join(row) for row in matrix])
+def maze_to_grid(maze: Maze) -> Grid:
+    width, height = parse_grid_size(maze.gridSize)
+    return Grid.from_walls(width, height, (parse_coords(wall) for wall in maze.walls))
 
 
-def print_coords(coords: Coords) -> str:
-    x_coord = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[coords[0]]
-    y_coord = coords[1] + 1
-    return f"{x_coord}{y_coord}"
+def print_maze(maze: Maze) -> str:
+    grid = maze_to_grid(maze)
+    return '\n'.join([grid.render_row(y) for y in range(grid.height)])
 
 
 def print_path(path: Path) -> str:
     return ' '.join([print_coords(c) for c in path])
+
+
+DIRECTIONS = {(0, 1): 'D', (0, -1): 'U', (1, 0): 'R', (-1, 0): 'L'}
+MOVES = {direction: move for move, direction in DIRECTIONS.items()}
+
+
+def path_runs(path: Path) -> t.Iterator[str]:
+    """Run-length encoded moves along a path, such as ``D3``, ``R2``, ``D1``."""
+    direction, count = None, 0
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        step = DIRECTIONS[(x2 - x1, y2 - y1)]
+        if step == direction:
+            count += 1
+            continue
+        if direction is not None:
+            yield f"{direction}{count}"
+        direction, count = step, 1
+    if direction is not None:
+        yield f"{direction}{count}"
+
+
+def print_directions(path: Path) -> str:
+    return ' '.join(path_runs(path))
+
+
+def parse_directions(start: Coords, directions: str) -> Path:
+    x, y = start
+    path = [start]
+    for run in directions.split():
+        dx, dy = MOVES[run[0]]
+        for _ in range(int(run[1:])):
+            x, y = x + dx, y + dy
+            path.append((x, y))
+    return path
@@ -0,0 +1,215 @@
+"""Counters and histograms exposed in the Prometheus text format.
+
+Recording is a no-op until ``enable()`` is called, so the hooks spread over
+the request path cost a single attribute check when metrics are off.
+Solver worker processes have registries of their own; ``drain()`` takes what
+a worker recorded and ``merge()`` adds it to the registry of the web process.
+"""
+import asyncio
+import functools
+import threading
+import time
+import typing as t
+from contextlib import contextmanager, nullcontext
+
+Labels = t.Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_DISABLED = nullcontext()
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.metrics: t.Dict[str, 'Metric'] = {}
+
+    def register(self, metric: 'Metric') -> 'Metric':
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self.metrics.values())
+
+    def drain(self) -> t.Dict[str, t.Dict[Labels, t.Any]]:
+        return {name: metric.drain() for name, metric in self.metrics.items()}
+
+    def merge(self, samples: t.Dict[str, t.Dict[Labels, t.Any]]):
+        for name, values in samples.items():
+            self.metrics[name].merge(values)
+
+
+REGISTRY = Registry()
+
+
+def enable(enabled: bool = True):
+    REGISTRY.enabled = enabled
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = (),
+                 registry: Registry = REGISTRY) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values: t.Dict[Labels, t.Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _labels(self, labels: t.Dict[str, t.Any]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: Labels, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}\n", f"# TYPE {self.name} {self.kind}\n"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.extend(self._render_value(labels, value))
+        return ''.join(lines)
+
+    def _render_value(self, labels: Labels, value: t.Any) -> t.List[str]:
+        raise NotImplementedError
+
+    def drain(self) -> t.Dict[Labels, t.Any]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: t.Dict[Labels, t.Any]):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, labels: Labels, value: float) -> t.List[str]:
+        return [f"{self.name}{self._format_labels(labels)} {value}\n"]
+
+    def merge(self, values: t.Dict[Labels, float]):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = (),
+                 buckets: t.Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._labels(labels)
+        # per bucket counts, then the overflow bucket, the count and the sum
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, **labels) -> t.ContextManager:
+        if not self._registry.enabled:
+            return _DISABLED
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels: t.Dict[str, t.Any]) -> t.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, labels: Labels, value: t.List[float]) -> t.List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value):
+            cumulative += count
+            upper = '+Inf' if bound == float('inf') else bound
+            bucket = self._format_labels(labels, f'le="{upper}"')
+            lines.append(f"{self.name}_bucket{bucket} {cumulative}\n")
+        lines.append(f"{self.name}_count{self._format_labels(labels)} {cumulative}\n")
+        lines.append(f"{self.name}_sum{self._format_labels(labels)} {value[-1]}\n")
+        return lines
+
+    def merge(self, values: t.Dict[Labels, t.List[float]]):
+        with self._lock:
+            for key, value in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    self._values[key] = list(value)
+                else:
+                    self._values[key] = [a + b for a, b in zip(state, value)]
+
+
+def instrument(histogram: Histogram):
+    """Class decorator timing every public method, sync or async, labelled with the method name."""
+    def wrap(method: t.Callable) -> t.Callable:
+        name = method.__name__
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def timed_async(*args, **kwargs):
+                with histogram.time(method=name):
+                    return await method(*args, **kwargs)
+            return timed_async
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with histogram.time(method=name):
+                return method(*args, **kwargs)
+        return timed
+
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if callable(member) and not name.startswith('_'):
+                setattr(cls, name, wrap(member))
+        return cls
+    return decorate
+
+
+def size_bucket(cells: int) -> str:
+    """Coarse grid size label, so solver timings can be told apart without a label per grid size."""
+    for bound in (100, 10_000, 100_000):
+        if cells <= bound:
+            return f"le{bound}"
+    return "gt100000"
+
+
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', "HTTP request duration.",
+                                 ['method', 'handler', 'status'])
+AUTH_SECONDS = Histogram('auth_lookup_duration_seconds', "Time spent resolving an auth token.")
+MAZE_FETCH_SECONDS = Histogram('maze_fetch_duration_seconds', "Time spent loading a maze.")
+SOLVER_SECONDS = Histogram('solver_duration_seconds', "Time spent solving a maze, in the solver process.",
+                           ['steps', 'size'])
+SERIALIZATION_SECONDS = Histogram('solution_serialization_duration_seconds', "Time spent encoding a solution.",
+                                  ['format'])
+PERSISTENCE_SECONDS = Histogram('persistence_duration_seconds', "Time spent in persistence calls.", ['method'])
+DB_POOL_CHECKOUT_SECONDS = Histogram('db_pool_checkout_duration_seconds',
+                                     "Time spent waiting for a database connection.")
+SOLVER_STRATEGIES = Counter('solver_strategy_total', "Paths found by each solver strategy.", ['strategy'])
+SOLVER_EXPANSIONS = Counter('solver_expansions_total', "Cells expanded by the solver searches.", ['search'])
+SOLUTION_CACHE_LOOKUPS = Counter('solution_cache_lookups_total', "Solution cache lookups.", ['result'])
@@ -0,0 +1,251 @@
+import asyncio
+import typing as t
+from contextlib import asynccontextmanager
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import metrics
+from . import models, schemas
+from .persistence import Persistence, apply_walls_delta, array_walls_delta, migrate, update_maze_walls_statement
+
+
+async def init_db_async(bind: AsyncEngine):
+    async with bind.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(migrate)
+
+
+@asynccontextmanager
+async def async_sqlalchemy_persistence(session_maker: sessionmaker) -> t.AsyncIterator['AsyncSqlAlchemyPersistence']:
+    async with session_maker() as session:
+        yield AsyncSqlAlchemyPersistence(session)
+
+
+class AsyncPersistence:
+    async def create_user(self, user: schemas.UserCreate):
+        pass
+
+    async def get_user_by_username(self, username: str):
+        pass
+
+    async def create_maze(self, maze: schemas.Maze, username: str):
+        pass
+
+    async def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        pass
+
+    async def get_user_by_username_and_password(self, username: str, password_hash: str):
+        pass
+
+    async def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None,
+                                    after: t.Optional[str] = None, fields: t.Optional[t.List[str]] = None):
+        pass
+
+    async def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        pass
+
+    async def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        pass
+
+    async def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        pass
+
+    async def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
+        pass
+
+    async def create_token(self, username: str, token: str):
+        pass
+
+    async def get_user_for_token(self, token: str):
+        pass
+
+    async def delete_token(self, token: str):
+        pass
+
+    async def save_maze_solution(self, solution: schemas.MazeSolution):
+        pass
+
+    async def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        pass
+
+    async def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        pass
+
+
+@metrics.instrument(metrics.PERSISTENCE_SECONDS)
+class AsyncSqlAlchemyPersistence(AsyncPersistence):
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def create_user(self, user: schemas.UserCreate):
+        db_user = models.User(username=user.username, hashed_password=user.hashed_password)
+        self._session.add(db_user)
+        await self._session.commit()
+        await self._session.refresh(db_user)
+        return db_user
+
+    async def get_user_by_username(self, username: str):
+        result = await self._session.execute(select(models.User).where(models.User.username == username))
+        return result.scalars().first()
+
+    async def create_maze(self, maze: schemas.Maze, username: str):
+        db_maze = models.Maze(**maze.dict(), owner_username=username)
+        self._session.add(db_maze)
+        await self._session.commit()
+        await self._session.refresh(db_maze)
+        return db_maze
+
+    async def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        await self._session.execute(insert(models.Maze),
+                                    [dict(maze.dict(), owner_username=username) for maze in mazes])
+        await self._session.commit()
+
+    async def get_user_by_username_and_password(self, username: str, password_hash: str):
+        result = await self._session.execute(select(models.User).where(
+            models.User.username == username,
+            models.User.hashed_password == password_hash
+        ))
+        return result.scalars().first()
+
+    async def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None,
+                                    after: t.Optional[str] = None, fields: t.Optional[t.List[str]] = None):
+        columns = [getattr(models.Maze, field) for field in fields] if fields else [models.Maze]
+        query = select(*columns).where(models.Maze.owner_username == username)
+        if after is not None:
+            query = query.where(models.Maze.id > after)
+        query = query.order_by(models.Maze.id)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self._session.execute(query)
+        if fields:
+            return [dict(row._mapping) for row in result]  # pylint: disable=protected-access
+        return result.scalars().all()
+
+    async def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        result = await self._session.execute(select(models.Maze).where(
+            models.Maze.id == maze_id,
+            models.Maze.owner_username == username
+        ))
+        return result.scalars().first()
+
+    async def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        result = await self._session.execute(select(models.Maze).where(
+            models.Maze.id.in_(maze_ids),
+            models.Maze.owner_username == username
+        ))
+        return result.scalars().all()
+
+    async def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        result = await self._session.execute(select(models.Maze.version).where(
+            models.Maze.id == maze_id,
+            models.Maze.owner_username == username
+        ))
+        return result.scalar()
+
+    async def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
+        if self._session.bind.dialect.name == 'postgresql':
+            walls = array_walls_delta(added, removed)
+        else:
+            # JSON walls (SQLite) are rewritten whole
+            maze = await self.get_maze_by_id_and_owner(maze_id, username)
+            if maze is None:
+                return
+            walls = apply_walls_delta(maze.walls, added, removed)
+        if (await self._session.execute(update_maze_walls_statement(maze_id, username, walls))).rowcount:
+            # stored solutions are for the walls before the edit
+            await self._session.execute(delete(models.MazeSolution).where(models.MazeSolution.maze_id == maze_id))
+        await self._session.commit()
+
+    async def create_token(self, username: str, token: str):
+        self._session.add(models.AuthToken(owner_username=username, token=token))
+        await self._session.commit()
+        return token
+
+    async def get_user_for_token(self, token: str):
+        result = await self._session.execute(select(models.AuthToken).where(models.AuthToken.token == token))
+        return result.scalars().first()
+
+    async def delete_token(self, token: str):
+        await self._session.execute(delete(models.AuthToken).where(models.AuthToken.token == token))
+        await self._session.commit()
+
+    async def save_maze_solution(self, solution: schemas.MazeSolution):
+        await self._session.merge(models.MazeSolution(**solution.dict()))
+        await self._session.commit()
+
+    async def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        db_solution = await self._session.get(models.MazeSolution, (maze_id, steps))
+        if db_solution is not None:
+            return schemas.MazeSolution.from_orm(db_solution)
+        return None
+
+    async def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        result = await self._session.execute(
+            select(models.MazeSolution).where(models.MazeSolution.maze_id.in_(maze_ids)))
+        return [schemas.MazeSolution.from_orm(db_solution) for db_solution in result.scalars()]
+
+
+class ThreadedPersistence(AsyncPersistence):
+    """Runs a synchronous persistence in worker threads, so it never blocks the event loop."""
+
+    def __init__(self, persistence: Persistence):
+        self._persistence = persistence
+
+    async def create_user(self, user: schemas.UserCreate):
+        return await asyncio.to_thread(self._persistence.create_user, user)
+
+    async def get_user_by_username(self, username: str):
+        return await asyncio.to_thread(self._persistence.get_user_by_username, username)
+
+    async def create_maze(self, maze: schemas.Maze, username: str):
+        return await asyncio.to_thread(self._persistence.create_maze, maze, username)
+
+    async def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        return await asyncio.to_thread(self._persistence.create_mazes, mazes, username)
+
+    async def get_user_by_username_and_password(self, username: str, password_hash: str):
+        return await asyncio.to_thread(self._persistence.get_user_by_username_and_password, username, password_hash)
+
+    async def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None,
+                                    after: t.Optional[str] = None, fields: t.Optional[t.List[str]] = None):
+        return await asyncio.to_thread(self._persistence.get_mazes_by_username, username,
+                                       limit=limit, after=after, fields=fields)
+
+    async def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        return await asyncio.to_thread(self._persistence.get_maze_by_id_and_owner, maze_id, username)
+
+    async def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        return await asyncio.to_thread(self._persistence.get_mazes_by_ids_and_owner, maze_ids, username)
+
+    async def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        return await asyncio.to_thread(self._persistence.get_maze_version, maze_id, username)
+
+    async def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
+        return await asyncio.to_thread(self._persistence.update_maze_walls, maze_id, username, added, removed)
+
+    async def create_token(self, username: str, token: str):
+        return await asyncio.to_thread(self._persistence.create_token, username, token)
+
+    async def get_user_for_token(self, token: str):
+        return await asyncio.to_thread(self._persistence.get_user_for_token, token)
+
+    async def delete_token(self, token: str):
+        return await asyncio.to_thread(self._persistence.delete_token, token)
+
+    async def save_maze_solution(self, solution: schemas.MazeSolution):
+        return await asyncio.to_thread(self._persistence.save_maze_solution, solution)
+
+    async def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        return await asyncio.to_thread(self._persistence.get_maze_solution, maze_id, steps)
+
+    async def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        return await asyncio.to_thread(self._persistence.get_maze_solutions, maze_ids)
+
+
+def as_async(persistence: t.Union[Persistence, AsyncPersistence]) -> AsyncPersistence:
+    if isinstance(persistence, AsyncPersistence):
+        return persistence
+    return ThreadedPersistence(persistence)
@@ -1,8 +1,11 @@
 from app.database import Base
-from sqlalchemy import Column, ForeignKey, String, ARRAY
+from sqlalchemy import Column, ForeignKey, String, ARRAY, Boolean, Index, Integer, JSON
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel
 
+# postgres arrays, stored as JSON when running against SQLite (tests, local development)
+StringArray = ARRAY(String).with_variant(JSON, "sqlite")
+
 
 class User(Base):
     __tablename__ = "users"
@@ -29,9 +32,27 @@ class Maze(Base):
     id = Column("id", String, primary_key=True, index=True)
     entrance = Column("entrance", String)
     gridSize = Column("grid_size", String)
-    walls = Column("walls", ARRAY(String))
+    walls = Column("walls", StringArray)
+    # bumped by every edit of the walls
+    version = Column("version", Integer, nullable=False, default=0, server_default="0")
     owner_username = Column("owner_username", String, ForeignKey("users.username"))
 
     owner = relationship("User", back_populates="mazes")
 
+    __table_args__ = (
+        # serves both owner lookups and keyset pagination over a user's mazes
+        Index("ix_mazes_owner_username_id", owner_username, id),
+    )
+
+
+class MazeSolution(Base):
+    __tablename__ = "maze_solutions"
 
+    maze_id = Column("maze_id", String, ForeignKey("mazes.id"), primary_key=True)
+    steps = Column("steps", String, primary_key=True)
+    path = Column("path", StringArray, nullable=True)
+    exit = Column("exit", String, nullable=True)
+    exact = Column("exact", Boolean, default=True)
+    error = Column("error", String, nullable=True)
+    # version of the maze the solution was found for, solutions of older walls are ignored
+    maze_version = Column("maze_version", Integer, nullable=False, default=0, server_default="0")
@@ -1,9 +1,71 @@
-from sqlalchemy.orm import Session
+from contextlib import contextmanager
+
+from sqlalchemy import ARRAY, String, cast, func, inspect, insert, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, sessionmaker
 import typing as t
+from app import metrics
 from . import models, schemas
 from ..database import SessionLocal, engine
 
 
+# columns added to existing tables, which create_all leaves as they are
+ADDED_COLUMNS = (
+    (models.Maze.__table__, "version"),
+    (models.MazeSolution.__table__, "maze_version"),
+)
+
+
+def migrate(connection):
+    """Brings tables created by earlier versions up to date."""
+    for index in models.Maze.__table__.indexes:
+        # a no-op on tables created with it
+        index.create(bind=connection, checkfirst=True)
+    inspector = inspect(connection)
+    for table, name in ADDED_COLUMNS:
+        if name in {column['name'] for column in inspector.get_columns(table.name)}:
+            continue
+        column = table.c[name]
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} "
+                                f"{column.type.compile(connection.dialect)} NOT NULL "
+                                f"DEFAULT {column.server_default.arg}"))
+
+
+def init_db(bind=engine):
+    with bind.begin() as connection:
+        models.Base.metadata.create_all(bind=connection)
+        migrate(connection)
+
+
+@contextmanager
+def sqlalchemy_persistence(session_maker: sessionmaker = SessionLocal) -> t.Iterator['SqlAlchemyPersistence']:
+    with session_maker() as session:
+        yield SqlAlchemyPersistence(session)
+
+
+def apply_walls_delta(walls: t.List[str], added: t.List[str], removed: t.List[str]) -> t.List[str]:
+    removed_walls = set(removed)
+    return [wall for wall in walls if wall not in removed_walls] + added
+
+
+def array_walls_delta(added: t.List[str], removed: t.List[str]):
+    """The walls column with the changes applied by postgres, so the array isn't sent back and forth."""
+    walls = models.Maze.walls
+    for wall in removed:
+        walls = func.array_remove(walls, wall)
+    if added:
+        # an array of literals is text[], and array_cat wants both arrays of the column's varchar[]
+        walls = func.array_cat(walls, cast(postgresql.array(added), ARRAY(String)))
+    return walls
+
+
+def update_maze_walls_statement(maze_id: str, username: str, walls):
+    return update(models.Maze).where(
+        models.Maze.id == maze_id,
+        models.Maze.owner_username == username
+    ).values(walls=walls, version=models.Maze.version + 1).execution_options(synchronize_session=False)
+
+
 class Persistence:
     def _get_session(self) -> Session:
         pass
@@ -17,10 +79,26 @@ class Persistence:
     def create_maze(self, maze: schemas.Maze, username: str):
         pass
 
+    def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        pass
+
     def get_user_by_username_and_password(self, username: str, password_hash: str):
         pass
 
-    def get_mazes_by_username(self, username: str):
+    def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None, after: t.Optional[str] = None,
+                              fields: t.Optional[t.List[str]] = None):
+        pass
+
+    def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        pass
+
+    def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        pass
+
+    def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        pass
+
+    def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
         pass
 
     def create_token(self, username: str, token: str):
@@ -29,70 +107,139 @@ class Persistence:
     def get_user_for_token(self, token: str):
         pass
 
+    def delete_token(self, token: str):
+        pass
 
-class SqlAlchemyPersistence(Persistence):
+    def save_maze_solution(self, solution: schemas.MazeSolution):
+        pass
 
-    def __init__(self, session_maker: SessionLocal):
-        self._session_maker = session_maker
-        self._init_db()
+    def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        pass
+
+    def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        pass
 
-    def _init_db(self):
-        models.Base.metadata.create_all(bind=engine)
+
+@metrics.instrument(metrics.PERSISTENCE_SECONDS)
+class SqlAlchemyPersistence(Persistence):
+
+    def __init__(self, session: Session):
+        self._session = session
 
     def create_user(self, user: schemas.UserCreate):
-        with SessionLocal() as db:
-            db_user = models.User(username=user.username, hashed_password=user.hashed_password)
-            db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
-            return db_user
+        db_user = models.User(username=user.username, hashed_password=user.hashed_password)
+        self._session.add(db_user)
+        self._session.commit()
+        self._session.refresh(db_user)
+        return db_user
 
     def get_user_by_username(self, username: str):
-        with SessionLocal() as db:
-            db_user = db.query(models.User).filter(models.User.username == username).first()
-            return db_user
+        db_user = self._session.query(models.User).filter(models.User.username == username).first()
+        return db_user
 
     def create_maze(self, maze: schemas.Maze, username: str):
-        with SessionLocal() as db:
-            db_maze = models.Maze(**maze.dict(), owner_username=username)
-            db.add(db_maze)
-            db.commit()
-            db.refresh(db_maze)
-            return db_maze
+        db_maze = models.Maze(**maze.dict(), owner_username=username)
+        self._session.add(db_maze)
+        self._session.commit()
+        self._session.refresh(db_maze)
+        return db_maze
+
+    def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        # a single executemany, which the postgres dialect sends as multi-row INSERT ... VALUES
+        self._session.execute(insert(models.Maze), [dict(maze.dict(), owner_username=username) for maze in mazes])
+        self._session.commit()
 
     def get_user_by_username_and_password(self, username: str, password_hash: str):
-        with SessionLocal() as db:
-            return db.query(models.User).filter(
-                models.User.username == username,
-                models.User.hashed_password == password_hash
-            ).first()
+        return self._session.query(models.User).filter(
+            models.User.username == username,
+            models.User.hashed_password == password_hash
+        ).first()
 
-    def get_mazes_by_username(self, username: str):
-        with SessionLocal() as db:
-            return db.query(models.Maze).filter(models.Maze.owner_username == username).all()
+    def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None, after: t.Optional[str] = None,
+                              fields: t.Optional[t.List[str]] = None):
+        columns = [getattr(models.Maze, field) for field in fields] if fields else [models.Maze]
+        query = self._session.query(*columns).filter(models.Maze.owner_username == username)
+        if after is not None:
+            query = query.filter(models.Maze.id > after)
+        query = query.order_by(models.Maze.id)
+        if limit is not None:
+            query = query.limit(limit)
+        if fields:
+            return [dict(row._mapping) for row in query]  # pylint: disable=protected-access
+        return query.all()
+
+    def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        return self._session.query(models.Maze).filter(
+            models.Maze.id == maze_id,
+            models.Maze.owner_username == username
+        ).first()
+
+    def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        return self._session.query(models.Maze).filter(
+            models.Maze.id.in_(maze_ids),
+            models.Maze.owner_username == username
+        ).all()
+
+    def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        return self._session.query(models.Maze.version).filter(
+            models.Maze.id == maze_id,
+            models.Maze.owner_username == username
+        ).scalar()
+
+    def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
+        if self._session.get_bind().dialect.name == 'postgresql':
+            walls = array_walls_delta(added, removed)
+        else:
+            # JSON walls (SQLite) are rewritten whole
+            maze = self.get_maze_by_id_and_owner(maze_id, username)
+            if maze is None:
+                return
+            walls = apply_walls_delta(maze.walls, added, removed)
+        if self._session.execute(update_maze_walls_statement(maze_id, username, walls)).rowcount:
+            # stored solutions are for the walls before the edit
+            self._session.query(models.MazeSolution).filter(models.MazeSolution.maze_id == maze_id).delete()
+        self._session.commit()
 
     def create_token(self, username: str, token: str):
-        with SessionLocal() as db:
-            db_token = models.AuthToken(owner_username=username, token=token)
-            db.add(db_token)
-            db.commit()
-            return token
+        db_token = models.AuthToken(owner_username=username, token=token)
+        self._session.add(db_token)
+        self._session.commit()
+        return token
 
     def get_user_for_token(self, token: str):
-        with SessionLocal() as db:
-            return db.query(models.AuthToken).filter(models.AuthToken.token == token).first()
+        return self._session.query(models.AuthToken).filter(models.AuthToken.token == token).first()
+
+    def delete_token(self, token: str):
+        self._session.query(models.AuthToken).filter(models.AuthToken.token == token).delete()
+        self._session.commit()
+
+    def save_maze_solution(self, solution: schemas.MazeSolution):
+        self._session.merge(models.MazeSolution(**solution.dict()))
+        self._session.commit()
+
+    def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        db_solution = self._session.get(models.MazeSolution, (maze_id, steps))
+        if db_solution is not None:
+            return schemas.MazeSolution.from_orm(db_solution)
+        return None
+
+    def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        return [schemas.MazeSolution.from_orm(db_solution) for db_solution in
+                self._session.query(models.MazeSolution).filter(models.MazeSolution.maze_id.in_(maze_ids))]
 
 
 class InMemoryPersistence(Persistence):
-    _mazes: t.Dict[str, list[schemas.Maze]]
+    _mazes: t.Dict[str, t.Dict[str, schemas.Maze]]
     _users: dict[str, schemas.UserCreate]
     _auth: dict[str, str]
+    _solutions: dict[t.Tuple[str, str], schemas.MazeSolution]
 
     def __init__(self) -> None:
         super().__init__()
         self._mazes = {}
         self._auth = {}
         self._users = {}
+        self._solutions = {}
 
     def create_user(self, user: schemas.UserCreate):
         if user.username not in self._users:
@@ -106,25 +253,62 @@ class InMemoryPersistence(Persistence):
         return None
 
     def create_maze(self, maze: schemas.Maze, username: str):
-        if username in self._mazes:
-            self._mazes[username].append(maze)
-        else:
-            self._mazes[username] = [maze]
+        self._mazes.setdefault(username, {})[maze.id] = maze
+
+    def create_mazes(self, mazes: t.List[schemas.Maze], username: str):
+        for maze in mazes:
+            self.create_maze(maze, username)
 
     def get_user_by_username_and_password(self, username: str, password_hash: str):
         if username in self._users and self._users[username].hashed_password == password_hash:
             return self._users[username]
         return None
 
-    def get_mazes_by_username(self, username: str):
-        if username in self._mazes:
-            return self._mazes[username]
-        return []
+    def get_mazes_by_username(self, username: str, limit: t.Optional[int] = None, after: t.Optional[str] = None,
+                              fields: t.Optional[t.List[str]] = None):
+        mazes = self._mazes.get(username, {})
+        ids = sorted(maze_id for maze_id in mazes if after is None or maze_id > after)[:limit]
+        if fields:
+            return [{field: getattr(mazes[maze_id], field) for field in fields} for maze_id in ids]
+        return [mazes[maze_id] for maze_id in ids]
+
+    def get_maze_by_id_and_owner(self, maze_id: str, username: str):
+        return self._mazes.get(username, {}).get(maze_id)
+
+    def get_mazes_by_ids_and_owner(self, maze_ids: t.List[str], username: str):
+        mazes = self._mazes.get(username, {})
+        return [mazes[maze_id] for maze_id in maze_ids if maze_id in mazes]
+
+    def get_maze_version(self, maze_id: str, username: str) -> t.Optional[int]:
+        maze = self._mazes.get(username, {}).get(maze_id)
+        return maze.version if maze is not None else None
+
+    def update_maze_walls(self, maze_id: str, username: str, added: t.List[str], removed: t.List[str]):
+        maze = self._mazes.get(username, {}).get(maze_id)
+        if maze is None:
+            return
+        self._mazes[username][maze_id] = maze.copy(update={'walls': apply_walls_delta(maze.walls, added, removed),
+                                                           'version': maze.version + 1})
+        for steps in [steps for (solved_id, steps) in self._solutions if solved_id == maze_id]:
+            del self._solutions[(maze_id, steps)]
 
     def create_token(self, username: str, token: str):
         self._auth[token] = username
 
     def get_user_for_token(self, token: str):
         if token in self._auth:
-            return self._users[self._auth[token]]
+            return schemas.AuthToken(token=token, owner_username=self._auth[token])
         return None
+
+    def delete_token(self, token: str):
+        self._auth.pop(token, None)
+
+    def save_maze_solution(self, solution: schemas.MazeSolution):
+        self._solutions[(solution.maze_id, solution.steps)] = solution
+
+    def get_maze_solution(self, maze_id: str, steps: str) -> t.Optional[schemas.MazeSolution]:
+        return self._solutions.get((maze_id, steps))
+
+    def get_maze_solutions(self, maze_ids: t.List[str]) -> t.List[schemas.MazeSolution]:
+        wanted = set(maze_ids)
+        return [solution for (maze_id, _), solution in self._solutions.items() if maze_id in wanted]
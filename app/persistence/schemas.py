@@ -15,6 +15,20 @@ class Maze(BaseModel):
     entrance: str
     gridSize: str
     walls: t.List[str]
+    version: int = 0
+
+    class Config:
+        orm_mode = True
+
+
+class MazeSolution(BaseModel):
+    maze_id: str
+    steps: str
+    path: t.Optional[t.List[str]]
+    exit: t.Optional[str]
+    exact: bool = True
+    error: t.Optional[str]
+    maze_version: int = 0
 
     class Config:
         orm_mode = True
@@ -22,3 +36,10 @@ class Maze(BaseModel):
 
 class Token(BaseModel):
     token: str
+
+
+class AuthToken(Token):
+    owner_username: str
+
+    class Config:
+        orm_mode = True
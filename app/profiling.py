@@ -0,0 +1,89 @@
+"""Opt-in cProfile profiling of single requests.
+
+A profiled request runs with a ``RequestProfile`` in ``current_profile``, so
+work handed to solver processes can be profiled there and added to it. Only
+the event loop thread and the solver processes are profiled, time spent in
+other threads shows up as waiting. Other requests served concurrently on the
+event loop are captured too, so profile on a quiet instance when possible.
+Only one request is profiled at a time, see ``RequestProfile.busy``.
+"""
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import typing as t
+from uuid import uuid4
+
+StatsDict = t.Dict[t.Tuple[str, int, str], t.Tuple[int, int, float, float, t.Dict]]
+
+current_profile: 'contextvars.ContextVar[t.Optional[RequestProfile]]' = contextvars.ContextVar(
+    'current_profile', default=None)
+
+
+class _Stats:
+    """The attributes pstats.Stats.add reads from a profiler, for stats collected elsewhere."""
+
+    def __init__(self, stats: StatsDict) -> None:
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def collect(func: t.Callable, *args) -> t.Tuple[t.Any, StatsDict]:
+    """Calls func under cProfile, returning its result and the raw, picklable stats."""
+    profile = cProfile.Profile()
+    result = profile.runcall(func, *args)
+    profile.create_stats()
+    return result, profile.stats
+
+
+class RequestProfile:
+    _active: t.Optional['RequestProfile'] = None
+
+    @classmethod
+    def busy(cls) -> bool:
+        """Whether another request is being profiled, cProfile can't run twice on the same thread."""
+        return cls._active is not None
+
+    def __init__(self) -> None:
+        self.id = uuid4().hex
+        self._profile = cProfile.Profile()
+        self._collected: t.List[StatsDict] = []
+        self._token: t.Optional[contextvars.Token] = None
+
+    def __enter__(self) -> 'RequestProfile':
+        RequestProfile._active = self
+        self._token = current_profile.set(self)
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.disable()
+        current_profile.reset(self._token)
+        RequestProfile._active = None
+
+    def add(self, stats: StatsDict):
+        self._collected.append(stats)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        for collected in self._collected:
+            stats.add(_Stats(collected))
+        return stats
+
+    def summary(self, top: int) -> str:
+        """The ``top`` functions by cumulative time, as ``file:line(function)=seconds`` separated by ``; ``."""
+        stats = self.stats().sort_stats(pstats.SortKey.CUMULATIVE)
+        entries = []
+        for (filename, line, function) in stats.fcn_list[:top]:  # pylint: disable=no-member
+            cumulative = stats.stats[(filename, line, function)][3]  # pylint: disable=no-member
+            entries.append(f"{os.path.basename(filename)}:{line}({function})={cumulative:.4f}")
+        return '; '.join(entries)
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.prof")
+        self.stats().dump_stats(path)
+        return path
@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import hmac
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+SIGNED_TOKEN_PREFIX = "s1"
+
+
+class TokenCache:
+    """Bounded TTL cache of auth token -> owner username.
+
+    Unknown tokens are cached too (as ``None``) for a shorter time, so clients
+    retrying with a bad token don't reach the database either.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int) -> None:
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        self._entries: 'OrderedDict[str, t.Tuple[float, t.Optional[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> t.Tuple[bool, t.Optional[str]]:
+        """Returns whether the token was found, and the username it belongs to."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return False, None
+            expires_at, username = entry
+            if expires_at < time.monotonic():
+                del self._entries[token]
+                return False, None
+            self._entries.move_to_end(token)
+            return True, username
+
+    def put(self, token: str, username: t.Optional[str], ttl: t.Optional[float] = None):
+        if ttl is None:
+            ttl = self._ttl if username is not None else self._negative_ttl
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, username)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class TokenSigner:
+    """Self-contained tokens carrying the username and expiry, signed with HMAC-SHA256.
+
+    They are verified without a database round trip, and therefore can only be
+    revoked in the process that revoked them. Revoked tokens are kept until
+    they expire, never evicted, so a logout holds however many tokens are
+    revoked meanwhile.
+    """
+
+    def __init__(self, secret: str, ttl: int) -> None:
+        self._secret = secret.encode('utf-8')
+        self._ttl = ttl
+        # revoked token -> the time it expires at
+        self._revoked: t.Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_signed(token: str) -> bool:
+        return token.startswith(f"{SIGNED_TOKEN_PREFIX}.")
+
+    def issue(self, username: str) -> str:
+        payload = f"{SIGNED_TOKEN_PREFIX}.{_b64encode(username.encode('utf-8'))}.{int(time.time()) + self._ttl}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> t.Optional[str]:
+        parts = token.split('.')
+        if len(parts) != 4 or parts[0] != SIGNED_TOKEN_PREFIX:
+            return None
+        payload = '.'.join(parts[:3])
+        # compare_digest only takes ASCII strings, and any byte can come in a header
+        if not hmac.compare_digest(self._sign(payload).encode('ascii'), parts[3].encode('utf-8')):
+            return None
+        if not parts[2].isdigit() or int(parts[2]) < time.time():
+            return None
+        with self._lock:
+            if token in self._revoked:
+                return None
+        try:
+            return _b64decode(parts[1]).decode('utf-8')
+        except ValueError:
+            return None
+
+    def revoke(self, token: str):
+        """Rejects a token verified before until it expires."""
+        now = time.time()
+        with self._lock:
+            for revoked, expires_at in list(self._revoked.items()):
+                if expires_at < now:
+                    del self._revoked[revoked]
+            self._revoked[token] = int(token.split('.')[2])
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._secret, payload.encode('utf-8'), hashlib.sha256).digest())
@@ -1,8 +1,11 @@
+import typing as t
 from uuid import uuid4
 
+from app.persistence.async_persistence import AsyncPersistence, as_async
 from app.persistence.persistence import Persistence
 from app.persistence.schemas import UserCreate
 from app.user.models import User
+from app.user.tokens import TokenCache, TokenSigner
 import hashlib
 
 Credentials = User
@@ -20,32 +23,66 @@ class UserAlreadyExistsException(Exception):
 
 class UserService:
 
-    def __init__(self, persistence: Persistence, salt: str):
-        self._persistence = persistence
+    def __init__(self, persistence: t.Union[Persistence, AsyncPersistence], salt: str,
+                 token_cache: t.Optional[TokenCache] = None, token_signer: t.Optional[TokenSigner] = None):
+        self._persistence = as_async(persistence)
         self._salt = salt
+        self._token_cache = token_cache
+        self._token_signer = token_signer
 
     def _hash_password(self, password: str) -> str:
         return hashlib.sha512(f"{password}{self._salt}".encode('utf-8')).hexdigest()
 
-    def register(self, user: User):
-        existing = self._persistence.get_user_by_username(username=user.username)
+    async def register(self, user: User):
+        existing = await self._persistence.get_user_by_username(username=user.username)
         if existing is not None:
             raise UserAlreadyExistsException
         password_hash = self._hash_password(user.password)
-        self._persistence.create_user(UserCreate(username=user.username, hashed_password=password_hash))
+        await self._persistence.create_user(UserCreate(username=user.username, hashed_password=password_hash))
 
     # TODO use hash for password
-    def login(self, credentials: Credentials):
+    async def login(self, credentials: Credentials):
         password_hash = self._hash_password(credentials.password)
-        user = self._persistence.get_user_by_username_and_password(credentials.username, password_hash)
+        user = await self._persistence.get_user_by_username_and_password(credentials.username, password_hash)
         if user is not None:
+            if self._token_signer is not None:
+                return self._token_signer.issue(user.username)
             token = str(uuid4())
-            self._persistence.create_token(user.username, token)
+            await self._persistence.create_token(user.username, token)
             return token
         raise AuthException("Invalid credentials.")
 
-    def get_user_for_token_or_throw(self, token: str) -> str:
-        user = self._persistence.get_user_for_token(token)
-        if user is not None:
-            return user.owner_username
+    async def logout(self, token: str):
+        await self.get_user_for_token_or_throw(token)
+        if self._is_signed(token):
+            # signed tokens aren't stored, the signer rejects them until they expire
+            self._token_signer.revoke(token)
+        else:
+            await self._persistence.delete_token(token)
+        if self._token_cache is not None:
+            self._token_cache.invalidate(token)
+
+    async def get_user_for_token_or_throw(self, token: str) -> str:
+        if self._token_cache is not None:
+            found, username = self._token_cache.get(token)
+            if found:
+                if username is None:
+                    raise AuthException("Invalid token.")
+                return username
+
+        if self._is_signed(token):
+            username = self._token_signer.verify(token)
+            if username is not None:
+                return username
+            raise AuthException("Invalid token.")
+
+        user = await self._persistence.get_user_for_token(token)
+        username = user.owner_username if user is not None else None
+        if self._token_cache is not None:
+            self._token_cache.put(token, username)
+        if username is not None:
+            return username
         raise AuthException("Invalid token.")
+
+    def _is_signed(self, token: str) -> bool:
+        return self._token_signer is not None and TokenSigner.is_signed(token)
@@ -0,0 +1,116 @@
+"""Seeded maze generators for the benchmarks.
+
+Every generator returns a ``CreateMazePayload``-shaped dict whose maze has
+exactly one exit on the bottom row, so both min and max steps are solvable.
+"""
+import random
+import typing as t
+
+from app.maze.coords import Coords, print_coords
+
+Payload = t.Dict[str, t.Any]
+
+
+def _payload(width: int, height: int, entrance: Coords, open_cells: t.Set[Coords]) -> Payload:
+    walls = [print_coords((x, y)) for y in range(height) for x in range(width) if (x, y) not in open_cells]
+    return {'entrance': print_coords(entrance), 'gridSize': f"{width}x{height}", 'walls': walls}
+
+
+def open_room(width: int, height: int, rng: random.Random) -> Payload:
+    """No walls at all, apart from the bottom row which has a single exit."""
+    cells = {(x, y) for y in range(height - 1) for x in range(width)}
+    cells.add((rng.randrange(width), height - 1))
+    return _payload(width, height, (0, 0), cells)
+
+
+def _carve(width: int, height: int, rng: random.Random) -> t.Tuple[t.Set[Coords], t.Dict[Coords, t.Set[Coords]]]:
+    """Recursive backtracker over rooms on even coordinates, leaving the bottom row untouched."""
+    rooms = [(x, y) for y in range(0, height - 1, 2) for x in range(0, width, 2)]
+    links: t.Dict[Coords, t.Set[Coords]] = {room: set() for room in rooms}
+    visited = {rooms[0]}
+    stack = [rooms[0]]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [room for room in ((x - 2, y), (x + 2, y), (x, y - 2), (x, y + 2))
+                      if room in links and room not in visited]
+        if not neighbours:
+            stack.pop()
+            continue
+        room = rng.choice(neighbours)
+        links[(x, y)].add(room)
+        links[room].add((x, y))
+        visited.add(room)
+        stack.append(room)
+    return set(rooms), links
+
+
+def _open_links(rooms: t.Set[Coords], links: t.Dict[Coords, t.Set[Coords]]) -> t.Set[Coords]:
+    cells = set(rooms)
+    for (x1, y1), neighbours in links.items():
+        for (x2, y2) in neighbours:
+            cells.add(((x1 + x2) // 2, (y1 + y2) // 2))
+    return cells
+
+
+def _add_exit(width: int, height: int, cells: t.Set[Coords], rng: random.Random):
+    x = rng.randrange(0, width, 2)
+    y = height - 1
+    while (x, y) not in cells:
+        cells.add((x, y))
+        y -= 1
+
+
+def perfect(width: int, height: int, rng: random.Random) -> Payload:
+    """A spanning tree of corridors: exactly one path between any two cells."""
+    rooms, links = _carve(width, height, rng)
+    cells = _open_links(rooms, links)
+    _add_exit(width, height, cells, rng)
+    return _payload(width, height, (0, 0), cells)
+
+
+def braided(width: int, height: int, rng: random.Random, braid: float = 0.5) -> Payload:
+    """A perfect maze with a share of its dead ends opened up, which creates loops."""
+    rooms, links = _carve(width, height, rng)
+    for (x, y) in sorted(rooms):
+        if len(links[(x, y)]) == 1 and rng.random() < braid:
+            others = [room for room in ((x - 2, y), (x + 2, y), (x, y - 2), (x, y + 2))
+                      if room in links and room not in links[(x, y)]]
+            if others:
+                room = rng.choice(others)
+                links[(x, y)].add(room)
+                links[room].add((x, y))
+    cells = _open_links(rooms, links)
+    _add_exit(width, height, cells, rng)
+    return _payload(width, height, (0, 0), cells)
+
+
+def spiral(width: int, height: int, rng: random.Random) -> Payload:  # pylint: disable=unused-argument
+    """Nested ring corridors from the centre out to the border, with one long path between them.
+
+    Cells at an even distance from the border are walls, each wall ring has a
+    single gap at alternating corners and the outermost one has the exit.
+    """
+    depth = (min(width, height) - 1) // 2
+    entrance_depth = depth if depth % 2 else depth - 1
+
+    def distance(x: int, y: int) -> int:
+        return min(x, y, width - 1 - x, height - 1 - y)
+
+    cells = {(x, y) for y in range(height) for x in range(width)
+             if distance(x, y) % 2 and distance(x, y) <= entrance_depth}
+    for ring in range(2, entrance_depth, 2):
+        cells.add((ring + 1, ring) if ring % 4 else (width - 2 - ring, height - 1 - ring))
+    cells.add((width - 2, height - 1))
+    return _payload(width, height, (entrance_depth, entrance_depth), cells)
+
+
+GENERATORS: t.Dict[str, t.Callable[[int, int, random.Random], Payload]] = {
+    'open': open_room,
+    'perfect': perfect,
+    'braided': braided,
+    'spiral': spiral,
+}
+
+
+def generate(kind: str, width: int, height: int, seed: int = 0) -> Payload:
+    return GENERATORS[kind](width, height, random.Random(f"{kind}-{width}x{height}-{seed}"))
@@ -0,0 +1,145 @@
+"""Times the solver and API hot paths on generated mazes.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 1.25
+
+Results are keyed ``<case>/<kind>/<width>x<height>`` and hold the best and
+median wall time of the repeats in seconds. With ``--baseline`` every median
+that got slower than ``threshold`` times its baseline is reported, and the
+exit status is 1.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import typing as t
+
+from app.maze.maze_solver import solve_maze
+from app.maze.models import CreateMazePayload, Maze, Steps
+from app.maze.utils import maze_to_grid, maze_to_matrix
+from benchmarks.generators import GENERATORS, Payload, generate
+
+DEFAULT_SIZES = [5, 25, 100, 250, 1000]
+# the same budget as the API defaults
+MAX_EXPANSIONS = 200000
+TIME_LIMIT = 2.0
+
+Results = t.Dict[str, t.Dict[str, float]]
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int) -> t.Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {'best': min(timings), 'median': statistics.median(timings)}
+
+
+def solve(maze: Maze, steps: Steps):
+    try:
+        solve_maze(maze, steps, max_expansions=MAX_EXPANSIONS, time_limit=TIME_LIMIT)
+    except Exception as e:  # pylint: disable=broad-except
+        raise RuntimeError(f"Generated maze {maze.gridSize} can't be solved for {steps.value}") from e
+
+
+def api_client():
+    """TestClient on the real app, with in-memory persistence and without the solution cache."""
+    from fastapi.testclient import TestClient  # pylint: disable=import-outside-toplevel
+
+    from app.main import app, get_persistence, get_solution_cache, get_user  # pylint: disable=import-outside-toplevel
+    from app.maze.solution_cache import NoSolutionCache  # pylint: disable=import-outside-toplevel
+    from app.persistence.persistence import InMemoryPersistence  # pylint: disable=import-outside-toplevel
+
+    persistence = InMemoryPersistence()
+    app.dependency_overrides[get_persistence] = lambda: persistence
+    app.dependency_overrides[get_solution_cache] = NoSolutionCache
+    app.dependency_overrides[get_user] = lambda: 'benchmark'
+    return TestClient(app)
+
+
+def api_round_trip(client, payload: Payload):
+    maze_id = client.post('/maze', json=payload).json()['id']
+    response = client.get(f'/maze/{maze_id}/solution?steps=min')
+    if response.status_code != 200:
+        raise RuntimeError(f"Solving {payload['gridSize']} through the API failed: {response.text}")
+
+
+def run(kinds: t.List[str], sizes: t.List[int], repeat: int, seed: int, api_max_size: int) -> Results:
+    client = api_client() if api_max_size > 0 else None
+    results: Results = {}
+    for kind in kinds:
+        for size in sizes:
+            payload = generate(kind, size, size, seed)
+            maze = Maze(id='benchmark', **payload)
+            rows = [maze_to_grid(maze).render_row(y) for y in range(size)]
+            grid_payload = {'entrance': payload['entrance'], 'gridSize': payload['gridSize'], 'wallsGrid': rows}
+            suffix = f"{kind}/{size}x{size}"
+            cases = {
+                'validate': lambda: CreateMazePayload(**payload),  # pylint: disable=cell-var-from-loop
+                'validate_grid': lambda: CreateMazePayload(**grid_payload),  # pylint: disable=cell-var-from-loop
+                'maze_to_matrix': lambda: maze_to_matrix(maze),  # pylint: disable=cell-var-from-loop
+                'solve_min': lambda: solve(maze, Steps.MIN),  # pylint: disable=cell-var-from-loop
+                'solve_max': lambda: solve(maze, Steps.MAX),  # pylint: disable=cell-var-from-loop
+            }
+            if client is not None and size <= api_max_size:
+                cases['api_min'] = lambda: api_round_trip(client, payload)  # pylint: disable=cell-var-from-loop
+            for case, func in cases.items():
+                results[f"{case}/{suffix}"] = measure(func, repeat)
+                print(f"{case}/{suffix}: {results[f'{case}/{suffix}']['median']:.6f}s", file=sys.stderr)
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float, min_duration: float) -> t.List[str]:
+    """Regressions against the baseline, ignoring timings too short to compare reliably."""
+    regressions = []
+    for key, timing in sorted(results.items()):
+        previous = baseline.get(key)
+        if previous is None or max(timing['median'], previous['median']) < min_duration:
+            continue
+        ratio = timing['median'] / previous['median']
+        if ratio > threshold:
+            regressions.append(f"{key}: {previous['median']:.6f}s -> {timing['median']:.6f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kinds', default=','.join(GENERATORS), help="comma separated maze generators")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="comma separated grid sizes")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--api-max-size', type=int, default=100, help="largest size timed through the API, 0 to skip")
+    parser.add_argument('--output', help="file to write the results to, stdout by default")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="slowdown ratio reported as a regression")
+    parser.add_argument('--min-duration', type=float, default=0.001, help="timings below this are not compared")
+    args = parser.parse_args(argv)
+
+    results = run(args.kinds.split(','), [int(size) for size in args.sizes.split(',')],
+                  args.repeat, args.seed, args.api_max_size)
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'seed': args.seed, 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline:
+            regressions = compare(results, json.load(baseline)['results'], args.threshold, args.min_duration)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
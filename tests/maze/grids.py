@@ -0,0 +1,29 @@
+import random
+import typing as t
+
+from app.maze.coords import Coords
+from app.maze.grid import Grid
+from app.maze.models import Maze
+from app.maze.utils import print_coords
+
+
+def random_walls(rng: random.Random, width: int, height: int, density: float,
+                 entrance: t.Optional[Coords] = (0, 0)) -> t.List[Coords]:
+    """Every cell but the entrance is a wall with probability ``density``."""
+    return [(x, y) for y in range(height) for x in range(width) if (x, y) != entrance and rng.random() < density]
+
+
+def random_grid(rng: random.Random, width: int, height: int, density: float = 0.3,
+                entrance: t.Optional[Coords] = (0, 0)) -> Grid:
+    return Grid.from_walls(width, height, random_walls(rng, width, height, density, entrance))
+
+
+def random_maze(rng: random.Random, width: int, height: int, density: float) -> Maze:
+    walls = [print_coords(wall) for wall in random_walls(rng, width, height, density)]
+    return Maze(id="1", entrance="A1", gridSize=f"{width}x{height}", walls=walls)
+
+
+def assert_valid_path(grid: Grid, path: t.Sequence[int]) -> None:
+    """Every step of ``path`` moves to a neighbouring open cell."""
+    for a, b in zip(path, path[1:]):
+        assert abs(b - a) in (1, grid.stride) and not grid.is_wall(b), (grid.coords(a), grid.coords(b))
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from app.maze.grid import Grid
+from app.maze.maze_solver import MazeSolver
+from app.maze.models import Maze
+from app.maze.shortest_path import ShortestPathTree
+
+np = pytest.importorskip("numpy")
+
+from app.maze import numpy_solver  # pylint: disable=wrong-import-position
+from app.maze.numpy_solver import DistanceField  # pylint: disable=wrong-import-position
+from .grids import assert_valid_path, random_grid  # pylint: disable=wrong-import-position
+
+
+# every level in NumPy, levels of either kind, every level in Python
+@pytest.mark.parametrize('small_frontier', [0, 4, len(Grid(12, 12))])
+def test_distance_field_should_match_breadth_first_search(monkeypatch, small_frontier):
+    monkeypatch.setattr(numpy_solver, 'SMALL_FRONTIER', small_frontier)
+    rng = random.Random(7)
+    for _ in range(50):
+        grid = random_grid(rng, rng.randint(1, 12), rng.randint(1, 12))
+        root = grid.index(0, 0)
+        tree = ShortestPathTree(grid, root)
+        field = DistanceField(grid, root)
+
+        assert field.distances() == tree.distances()
+        for node in range(len(grid)):
+            expected, path = tree.path_to(node), field.path_to(node)
+            if expected is None:
+                assert path is None
+                continue
+            assert len(path) == len(expected)
+            assert path[0] == root and path[-1] == node
+            assert_valid_path(grid, path)
+
+
+def test_maze_solver_should_use_numpy_above_threshold():
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["B1", "B2", "B3"])
+    solver = MazeSolver(maze, numpy_min_cells=9)
+
+    assert isinstance(solver._tree, DistanceField)  # pylint: disable=protected-access
+    assert solver.get_shortest_path() == [(0, 0), (0, 1), (0, 2)]
+    assert solver.get_longest_path() == [(0, 0), (0, 1), (0, 2)]
+    assert not isinstance(MazeSolver(maze, numpy_min_cells=10)._tree, DistanceField)  # pylint: disable=protected-access
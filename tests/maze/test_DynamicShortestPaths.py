@@ -0,0 +1,52 @@
+import random
+
+from app.maze.incremental import DynamicShortestPaths, IncrementalSolutions
+from app.maze.maze_solver import MazeSolver
+from app.maze.models import Maze
+from app.maze.shortest_path import ShortestPathTree
+from .grids import assert_valid_path, random_grid
+
+
+def test_repaired_distances_should_match_breadth_first_search():
+    rng = random.Random(11)
+    for _ in range(50):
+        width, height = rng.randint(1, 12), rng.randint(1, 12)
+        grid = random_grid(rng, width, height)
+        root = grid.index(0, 0)
+        paths = DynamicShortestPaths(grid, root)
+
+        for _ in range(5):
+            for _ in range(rng.randint(1, 4)):
+                x, y = rng.randrange(width), rng.randrange(height)
+                if (x, y) != (0, 0):
+                    paths.set_wall(x, y, wall=not grid.is_wall(grid.index(x, y)))
+            paths.repair()
+
+            tree = ShortestPathTree(grid, root)
+            assert paths.distances() == tree.distances()
+            assert sorted(paths.reached_cells()) == sorted(tree.reached_cells())
+            for node in range(len(grid)):
+                expected, path = tree.path_to(node), paths.path_to(node)
+                if expected is None:
+                    assert path is None
+                    continue
+                assert len(path) == len(expected)
+                assert path[0] == root and path[-1] == node
+                assert_valid_path(grid, path)
+
+
+def test_incremental_solutions_should_only_answer_for_the_edited_walls():
+    solutions = IncrementalSolutions(max_mazes=1)
+    maze = Maze(id="1", entrance="A1", gridSize="2x3", walls=["B1", "B2", "B3"])
+    edited = Maze(id="1", entrance="A1", gridSize="2x3", walls=["B1", "A3"])
+
+    assert solutions.solution(maze) is None
+    solutions.edit(maze, ["A3"], ["B2", "B3"])
+    assert solutions.solution(maze) is None
+    solution = solutions.solution(edited)
+    assert solution.path == ["A1", "A2", "B2", "B3"]
+    assert solution.strategy == "incremental"
+    assert solution.path == [f"{chr(65 + x)}{y + 1}" for x, y in MazeSolver(edited).get_shortest_path()]
+
+    solutions.edit(Maze(id="2", entrance="A1", gridSize="1x1", walls=[]), [], [])
+    assert solutions.solution(edited) is None
@@ -0,0 +1,29 @@
+from app.maze.grid import Grid
+from app.maze.models import Maze
+from app.maze.utils import print_maze
+
+
+def test_should_map_coords_to_index_and_back():
+    grid = Grid(3, 2)
+    for x in range(3):
+        for y in range(2):
+            assert grid.coords(grid.index(x, y)) == (x, y)
+
+
+def test_should_surround_cells_with_walls():
+    grid = Grid.from_walls(2, 2, [(1, 0)])
+    top_left = grid.index(0, 0)
+    assert [grid.is_wall(top_left + offset) for offset in grid.offsets] == [True, True, True, False]
+
+
+def test_should_print_maze():
+    maze = Maze(entrance="A1", gridSize="4x3", walls=["B1", "D3"], id="test")
+    assert print_maze(maze) == "0100\n0000\n0001"
+
+
+def test_should_set_rows_and_list_walls():
+    grid = Grid(3, 2)
+    grid.set_row(0, b'101')
+    grid.set_row(1, b'010')
+    assert list(grid.walls()) == [(0, 0), (2, 0), (1, 1)]
+    assert grid.render_row(0) == '101'
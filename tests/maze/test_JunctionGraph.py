@@ -0,0 +1,63 @@
+from app.maze.junction_graph import JunctionGraph, NO_NODE, prune_dead_ends
+from app.maze.longest_path import LongestPathSearch
+from app.maze.models import Maze
+from app.maze.shortest_path import ShortestPathTree
+from app.maze.utils import maze_to_grid
+
+
+def junction_graph(maze: Maze, target: str):
+    grid = maze_to_grid(maze)
+    root = grid.index(0, 0)
+    target_cell = grid.index(*target)
+    graph = JunctionGraph(grid, root, target_cell, ShortestPathTree(grid, root).reached_cells())
+    return grid, graph
+
+
+def test_should_prune_dead_ends_but_not_the_kept_cells():
+    # the A2 A3 pocket is a dead end, A1 and C3 are kept
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["B2", "B3"])
+    grid = maze_to_grid(maze)
+    cells = prune_dead_ends(grid, (grid.index(0, 0), grid.index(2, 2)), range(len(grid)))
+
+    assert [cells[grid.index(x, y)] for y in range(3) for x in range(3)] == [
+        0, 0, 0,
+        1, 1, 0,
+        1, 1, 0,
+    ]
+
+
+def test_should_collapse_corridors_into_weighted_edges():
+    # a spiral shaped single corridor from A1 to C3
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["A2", "B2"])
+    grid, graph = junction_graph(maze, (0, 2))
+
+    assert len(graph) == 2
+    start, target = graph.node(grid.index(0, 0)), graph.node(grid.index(0, 2))
+    [slot] = [slot for slot in range(4 * start, 4 * start + 4) if graph.neighbours[slot] != NO_NODE]
+    assert graph.neighbours[slot] == target
+    assert graph.gains[slot] == 6
+    assert graph.expand([start, target], [graph.edges[slot]]) == [
+        grid.index(*coords) for coords in [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2)]]
+
+
+def test_should_keep_only_the_longest_of_parallel_corridors():
+    # A1 and C1 are joined by the short corridor through B1 and the long one around B2
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["B2"])
+    grid, graph = junction_graph(maze, (2, 0))
+    start, target = graph.node(grid.index(0, 0)), graph.node(grid.index(2, 0))
+
+    assert len(graph) == 2
+    [slot] = [slot for slot in range(4 * start, 4 * start + 4) if graph.neighbours[slot] != NO_NODE]
+    assert graph.neighbours[slot] == target
+    assert graph.gains[slot] == 6
+    assert graph.expand([start, target], [graph.edges[slot]]) == [
+        grid.index(*coords) for coords in [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0)]]
+
+
+def test_longest_path_search_should_expand_the_path_into_cells():
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["A3", "B3"])
+    grid, graph = junction_graph(maze, (2, 2))
+
+    result = LongestPathSearch(graph, graph.node(grid.index(0, 0)), graph.node(grid.index(2, 2))).search()
+    assert [grid.coords(cell) for cell in result.path] == [(0, 0), (0, 1), (1, 1), (1, 0), (2, 0), (2, 1), (2, 2)]
+    assert result.exact
@@ -1,6 +1,6 @@
 import pytest
 
-from app.maze.maze_solver import MazeSolver, MazeException
+from app.maze.maze_solver import MazeSolver, MazeException, find_exits
 from app.maze.models import Maze
 from app.maze.utils import print_coords
 
@@ -63,3 +63,63 @@ def test_should_throw__when_multiple_exits_exist_empty_maze():
         MazeSolver(maze)
 
     assert e.value.message == "Multiple exits detected: A4, B4, C4, D4."
+
+
+def test_should_find_shortest_path__when_maze_is_open():
+    maze = Maze(
+        entrance="A1",
+        gridSize="9x9",
+        walls=["A9", "B9", "C9", "D9", "E9", "F9", "G9", "H9"],
+        id="test"
+    )
+
+    solver = MazeSolver(maze)
+    shortest_path = solver.get_shortest_path()
+    assert print_coords(solver.get_exit()) == "I9"
+    assert len(shortest_path) == 17
+    assert print_coords(shortest_path[0]) == "A1"
+    assert print_coords(shortest_path[-1]) == "I9"
+
+
+def test_should_find_longest_path__when_maze_has_cycle():
+    maze = Maze(
+        entrance="A1",
+        gridSize="3x3",
+        walls=["A3", "B3"],
+        id="test"
+    )
+
+    solver = MazeSolver(maze)
+    assert [print_coords(c) for c in solver.get_shortest_path()] == ["A1", "B1", "C1", "C2", "C3"]
+    assert [print_coords(c) for c in solver.get_longest_path()] == ["A1", "A2", "B2", "B1", "C1", "C2", "C3"]
+    assert solver.is_longest_path_exact()
+
+
+def test_should_return_best_path_so_far__when_budget_runs_out():
+    maze = Maze(
+        entrance="A1",
+        gridSize="3x3",
+        walls=["A3", "B3"],
+        id="test"
+    )
+
+    solver = MazeSolver(maze, max_expansions=0)
+    assert solver.get_longest_path() == solver.get_shortest_path()
+    assert not solver.is_longest_path_exact()
+
+
+def test_find_exits_should_return_every_exit_with_its_distance():
+    maze = Maze(id="1", entrance="B1", gridSize="3x3", walls=["B2"])
+    solution = find_exits(maze, distances=True)
+
+    assert [(e.exit, e.distance) for e in solution.exits] == [("A3", 3), ("C3", 3), ("B3", 4)]
+    assert solution.exits[0].path == ["B1", "A1", "A2", "A3"]
+    assert solution.distances == [[1, 0, 1], [2, None, 2], [3, 4, 3]]
+
+
+def test_find_exits_should_return_no_exits_for_closed_maze():
+    maze = Maze(id="1", entrance="A1", gridSize="2x2", walls=["A2", "B2"])
+    solution = find_exits(maze)
+
+    assert solution.exits == []
+    assert solution.distances is None
@@ -0,0 +1,48 @@
+import random
+
+from app.maze.models import Maze
+from app.maze.routes import RouteIndex, RouteIndexes
+from app.maze.shortest_path import ShortestPathTree, UNVISITED
+from .grids import assert_valid_path, random_grid
+
+
+def test_routes_should_match_breadth_first_search():
+    rng = random.Random(13)
+    # sparse walls are searched with A*, dense ones bidirectionally
+    for density, open_space, size in ((0.05, True, 20), (0.4, False, 10)):
+        for _ in range(50):
+            grid = random_grid(rng, rng.randint(size // 2, size), rng.randint(size // 2, size), density,
+                               entrance=None)
+            index = RouteIndex(grid)
+            assert index.open_space == open_space
+            cells = [node for node in range(len(grid)) if not grid.is_wall(node)]
+            for _ in range(10):
+                source, target = rng.choice(cells), rng.choice(cells)
+                distance = ShortestPathTree(grid, source).distances()[target]
+                path = index.route(source, target)
+                if distance == UNVISITED:
+                    assert path is None and not index.connected(source, target)
+                    continue
+                assert len(path) == distance + 1
+                assert path[0] == source and path[-1] == target
+                assert_valid_path(grid, path)
+
+
+def test_route_indexes_should_be_rebuilt_when_walls_change():
+    indexes = RouteIndexes(max_mazes=1)
+    maze = Maze(id="1", entrance="A1", gridSize="3x1", walls=["B1"])
+    assert indexes.get("1", 0) is None
+    index = indexes.build(maze, 0)
+    assert indexes.get("1", 0) is index
+    assert not index.connected(index.grid.index(0, 0), index.grid.index(2, 0))
+
+    edited = indexes.build(Maze(id="1", entrance="A1", gridSize="3x1", walls=[]), 1)
+    assert indexes.get("1", 0) is None
+    assert indexes.get("1", 1) is edited
+    assert edited.connected(edited.grid.index(0, 0), edited.grid.index(2, 0))
+    # a query that loaded the walls before the edit doesn't replace the index of the edited ones
+    indexes.build(maze, 0)
+    assert indexes.get("1", 1) is edited
+
+    indexes.build(Maze(id="2", entrance="A1", gridSize="1x1", walls=[]), 0)
+    assert indexes.get("1", 1) is None
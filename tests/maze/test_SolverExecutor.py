@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.maze.maze_solver import MazeException
+from app.maze.models import Maze, Steps
+from app.maze.solver_executor import SolverExecutor, SolverBusyException, SolverTimeoutException
+from app.maze.utils import print_coords
+
+open_maze = Maze(
+    entrance="A1",
+    gridSize="26x9",
+    walls=[f"{column}9" for column in "ABCDEFGHIJKLMNOPQRSTUVWXY"],
+    id="test"
+)
+# a million open cells, a second or so of BFS, with the exit in the bottom right corner
+slow_maze = Maze(entrance="A1", gridSize="1000x1000", walls=[print_coords((x, 999)) for x in range(999)], id="slow")
+
+
+def solve(executor, maze, steps, timeout=None):
+    return asyncio.run(executor.solve(maze, steps, timeout))
+
+
+def test_should_solve_in_worker_process():
+    executor = SolverExecutor(max_workers=1, max_pending=1, timeout=10)
+    try:
+        maze = Maze(entrance="A1", gridSize="2x2", walls=["A2"], id="test")
+        assert solve(executor, maze, Steps.MIN).path == ["A1", "B1", "B2"]
+
+        with pytest.raises(MazeException) as e:
+            solve(executor, Maze(entrance="A1", gridSize="2x2", walls=[], id="test"), Steps.MIN)
+        assert e.value.message == "Multiple exits detected: A2, B2."
+    finally:
+        executor.shutdown()
+
+
+def test_should_reject_solves_over_queue_depth():
+    executor = SolverExecutor(max_workers=1, max_pending=0, timeout=10, retry_after=3)
+    try:
+        with pytest.raises(SolverBusyException) as e:
+            solve(executor, open_maze, Steps.MIN)
+        assert e.value.retry_after == 3
+    finally:
+        executor.shutdown()
+
+
+def test_should_time_out_and_recycle_workers():
+    executor = SolverExecutor(max_workers=1, max_pending=1, timeout=10)
+    try:
+        with pytest.raises(SolverTimeoutException):
+            solve(executor, open_maze, Steps.MAX, timeout=0)
+        assert len(solve(executor, open_maze, Steps.MIN).path) == 34
+    finally:
+        executor.shutdown()
+
+
+def test_should_requeue_solves_queued_behind_a_timed_out_one():
+    executor = SolverExecutor(max_workers=1, max_pending=5, timeout=10)
+    maze = Maze(entrance="A1", gridSize="2x2", walls=["A2"], id="test")
+
+    async def solve_concurrently():
+        return await asyncio.gather(executor.solve(slow_maze, Steps.MIN, timeout=0.2),
+                                    *(executor.solve(maze, Steps.MIN) for _ in range(4)), return_exceptions=True)
+
+    try:
+        timed_out, *solved = asyncio.run(solve_concurrently())
+        assert isinstance(timed_out, SolverTimeoutException)
+        assert [solution.path for solution in solved] == [["A1", "B1", "B2"]] * 4
+    finally:
+        executor.shutdown()
+
+
+def test_should_let_running_solves_finish_when_another_one_times_out():
+    executor = SolverExecutor(max_workers=2, max_pending=2, timeout=10)
+
+    async def solve_concurrently():
+        running = asyncio.ensure_future(executor.solve(slow_maze, Steps.MIN))
+        with pytest.raises(SolverTimeoutException):
+            await executor.solve(slow_maze, Steps.MIN, timeout=0.2)
+        return await running
+
+    try:
+        assert len(asyncio.run(solve_concurrently()).path) == 2 * 999 + 1
+    finally:
+        executor.shutdown()
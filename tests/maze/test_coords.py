@@ -0,0 +1,22 @@
+import pytest
+
+from app.maze.coords import parse_coords, print_coords
+
+
+@pytest.mark.parametrize("coords,expected", [
+    ("A1", (0, 0)),
+    ("Z9", (25, 8)),
+    ("AA10", (26, 9)),
+    ("AZ1", (51, 0)),
+    ("BA3", (52, 2)),
+    ("ALL1000", (999, 999)),
+])
+def test_should_parse_and_print_multi_letter_columns(coords, expected):
+    assert parse_coords(coords) == expected
+    assert print_coords(expected) == coords
+
+
+@pytest.mark.parametrize("coords", ["1", "A", "A0", "a1", "A1B", "", "A\u0661", "A\u00b2"])
+def test_should_reject_invalid_coords(coords):
+    with pytest.raises(ValueError):
+        parse_coords(coords)
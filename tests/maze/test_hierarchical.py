@@ -0,0 +1,60 @@
+import asyncio
+import random
+
+import pytest
+
+from app.maze.grid import Grid
+from app.maze.hierarchical import split_grid, solve_tiles_locally
+from app.maze.maze_solver import MazeException, solve_maze
+from app.maze.models import Maze, Steps
+from app.maze.solver_executor import SolverExecutor
+from .grids import random_maze
+
+
+def test_tiled_solve_should_match_breadth_first_search():
+    rng = random.Random(5)
+    for _ in range(100):
+        maze = random_maze(rng, rng.randint(1, 15), rng.randint(1, 15), 0.35)
+        try:
+            expected = solve_maze(maze, Steps.MIN).path
+        except MazeException as e:
+            with pytest.raises(MazeException) as tiled_error:
+                solve_tiles_locally(maze, tile_size=4)
+            assert tiled_error.value.message == e.message
+            continue
+        for tile_size in (1, 3, 4):
+            solution = solve_tiles_locally(maze, tile_size)
+            assert solution.path[0] == expected[0] and solution.path[-1] == expected[-1]
+            assert len(set(solution.path) & set(maze.walls)) == 0
+            if solution.exact:
+                assert len(solution.path) == len(expected)
+            else:
+                assert len(solution.path) >= len(expected)
+            assert solution.strategy == "hierarchical"
+
+
+def test_tile_keys_should_only_change_around_an_edit():
+    grid = Grid(8, 8)
+    tiles = [tile.key() for tile in split_grid(grid, 4)]
+    grid.set_wall(1, 1)
+    assert [tile.key() for tile in split_grid(grid, 4)] != tiles
+    assert [tile.key() for tile in split_grid(grid, 4)][1:] == tiles[1:]
+    # a wall on the border of a tile is seen by the tile next to it
+    grid.set_wall(3, 1)
+    assert [tile.key() for tile in split_grid(grid, 4)][2:] == tiles[2:]
+
+
+def test_solver_executor_should_solve_large_grids_over_cached_tiles():
+    executor = SolverExecutor(max_workers=2, max_pending=1, timeout=10, tiled_min_cells=16, tile_size=2)
+    try:
+        maze = Maze(id="1", entrance="A1", gridSize="4x4", walls=["A2", "B2", "C2", "B4", "C4", "D4"])
+        solution = asyncio.run(executor.solve(maze, Steps.MIN))
+        assert solution.path == ["A1", "B1", "C1", "D1", "D2", "D3", "C3", "B3", "A3", "A4"]
+        assert solution.strategy == "hierarchical"
+
+        edited = Maze(id="1", entrance="A1", gridSize="4x4", walls=["A2", "C2", "B4", "C4", "D4"])
+        solution = asyncio.run(executor.solve(edited, Steps.MIN))
+        assert solution.path == ["A1", "B1", "B2", "B3", "A3", "A4"]
+        assert asyncio.run(executor.solve(maze, Steps.MAX)).strategy != "hierarchical"
+    finally:
+        executor.shutdown()
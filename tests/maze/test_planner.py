@@ -0,0 +1,33 @@
+from app.maze.maze_solver import MazeSolver
+from app.maze.models import Maze, Steps
+from app.maze.planner import Strategy, count_edges
+
+
+def test_count_edges_should_count_adjacent_open_cells():
+    # a 2x2 open block inside a border: 2 horizontal and 2 vertical pairs
+    cells = bytes([1, 1, 1, 1,
+                   1, 0, 0, 1,
+                   1, 0, 0, 1,
+                   1, 1, 1, 1])
+    assert count_edges(cells, 4) == 4
+
+
+def test_should_plan_a_tree_walk_for_perfect_mazes():
+    # a corridor down column A, and a closed off pocket that is left out of the analysis
+    maze = Maze(id="1", entrance="A1", gridSize="4x4", walls=["B1", "B2", "D2", "B3", "D3", "B4", "C4", "D4"])
+    solver = MazeSolver(maze)
+
+    analysis = solver.analysis()
+    assert (analysis.open_cells, analysis.reachable_cells, analysis.edges) == (8, 4, 3)
+    assert analysis.cycle_rank == 0
+    assert solver.plan(Steps.MAX) == Strategy.TREE_WALK
+    assert solver.get_longest_path() == solver.get_shortest_path()
+
+
+def test_should_plan_a_search_for_mazes_with_cycles():
+    maze = Maze(id="1", entrance="A1", gridSize="3x3", walls=["A3", "B3"])
+    solver = MazeSolver(maze)
+
+    assert solver.analysis().cycle_rank == 2
+    assert solver.plan(Steps.MIN) == Strategy.BFS
+    assert solver.plan(Steps.MAX) == Strategy.JUNCTION_SEARCH
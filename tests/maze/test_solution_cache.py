@@ -0,0 +1,55 @@
+import pytest
+
+from app.maze.models import Maze, Steps
+from app.maze.solution_cache import InMemorySolutionCache, SqliteSolutionCache, solution_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    def make(max_entries=100, max_bytes=1024 * 1024):
+        if request.param == 'memory':
+            return InMemorySolutionCache(max_entries, max_bytes)
+        return SqliteSolutionCache(str(tmp_path / 'cache.sqlite3'), max_entries, max_bytes)
+
+    return make
+
+
+def test_key_should_ignore_id_and_wall_order():
+    maze1 = Maze(entrance="A1", gridSize="4x4", walls=["B1", "A2", "B1"], id="first")
+    maze2 = Maze(entrance="A1", gridSize="4x4", walls=["A2", "B1"], id="second")
+
+    assert solution_key(maze1, Steps.MIN) == solution_key(maze2, Steps.MIN)
+    assert solution_key(maze1, Steps.MIN) != solution_key(maze1, Steps.MAX)
+
+
+def test_should_count_hits_and_misses(make_cache):
+    cache = make_cache()
+    assert cache.get('key') is None
+    cache.put('key', {'path': ['A1'], 'exact': True})
+    assert cache.get('key') == {'path': ['A1'], 'exact': True}
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+
+
+def test_should_evict_least_recently_used_entry(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.put('first', {'error': 'No exit found.'})
+    cache.put('second', {'error': 'No exit found.'})
+    cache.get('first')
+    cache.put('third', {'error': 'No exit found.'})
+
+    assert cache.get('second') is None
+    assert cache.get('first') is not None
+    assert cache.get('third') is not None
+
+
+def test_should_evict_when_over_byte_budget(make_cache):
+    cache = make_cache(max_bytes=40)
+    cache.put('first', {'path': ['A1', 'A2', 'A3']})
+    cache.put('second', {'path': ['A1', 'A2', 'A3']})
+
+    assert cache.get('first') is None
+    assert cache.get('second') is not None
@@ -0,0 +1,12 @@
+from app.maze.utils import print_directions, parse_directions
+
+
+def test_print_directions_should_run_length_encode_moves():
+    path = [(0, 0), (0, 1), (0, 2), (0, 3), (1, 3), (2, 3), (2, 4), (1, 4)]
+    assert print_directions(path) == "D3 R2 D1 L1"
+    assert print_directions([(0, 0)]) == ""
+
+
+def test_parse_directions_should_restore_path():
+    path = [(2, 2), (2, 1), (1, 1), (0, 1), (0, 2)]
+    assert parse_directions((2, 2), print_directions(path)) == path
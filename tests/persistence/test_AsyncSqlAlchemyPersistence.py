@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.persistence import schemas
+from app.persistence.async_persistence import async_sqlalchemy_persistence, init_db_async
+
+pytest.importorskip("aiosqlite")
+
+
+def run_with_persistence(test):
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            await init_db_async(engine)
+            session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            async with async_sqlalchemy_persistence(session_maker) as persistence:
+                await test(persistence)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_should_store_users_and_tokens():
+    async def test(persistence):
+        await persistence.create_user(schemas.UserCreate(username="user1", hashed_password="hash"))
+        await persistence.create_token("user1", "token1")
+
+        assert (await persistence.get_user_by_username_and_password("user1", "hash")).username == "user1"
+        assert (await persistence.get_user_for_token("token1")).owner_username == "user1"
+        assert await persistence.get_user_for_token("token2") is None
+
+    run_with_persistence(test)
+
+
+def test_should_store_mazes_and_solutions():
+    async def test(persistence):
+        await persistence.create_user(schemas.UserCreate(username="user1", hashed_password="hash"))
+        for maze_id in ["b", "a", "c"]:
+            await persistence.create_maze(
+                schemas.Maze(id=maze_id, entrance="A1", gridSize="2x2", walls=["B1"]), "user1")
+        await persistence.save_maze_solution(
+            schemas.MazeSolution(maze_id="a", steps="min", path=["A1", "A2"], exit="A2"))
+
+        assert (await persistence.get_maze_by_id_and_owner("a", "user1")).walls == ["B1"]
+        assert await persistence.get_maze_by_id_and_owner("a", "user2") is None
+        assert await persistence.get_mazes_by_username("user1", limit=2, after="a", fields=["id"]) == [
+            {"id": "b"}, {"id": "c"}]
+        assert (await persistence.get_maze_solution("a", "min")).path == ["A1", "A2"]
+        assert await persistence.get_maze_solution("a", "max") is None
+
+    run_with_persistence(test)
+
+
+def test_should_store_mazes_in_batch():
+    async def test(persistence):
+        await persistence.create_user(schemas.UserCreate(username="user1", hashed_password="hash"))
+        await persistence.create_mazes([schemas.Maze(id=maze_id, entrance="A1", gridSize="2x2", walls=["B1"])
+                                        for maze_id in ["a", "b"]], "user1")
+        await persistence.save_maze_solution(
+            schemas.MazeSolution(maze_id="b", steps="max", error="No exit found."))
+
+        mazes = await persistence.get_mazes_by_ids_and_owner(["a", "b", "c"], "user1")
+        assert sorted((maze.id, maze.walls) for maze in mazes) == [("a", ["B1"]), ("b", ["B1"])]
+        assert await persistence.get_mazes_by_ids_and_owner(["a"], "user2") == []
+        assert [solution.error for solution in await persistence.get_maze_solutions(["a", "b"])] == [
+            "No exit found."]
+
+    run_with_persistence(test)
+
+
+def test_should_update_maze_walls_and_drop_solutions():
+    async def test(persistence):
+        await persistence.create_user(schemas.UserCreate(username="user1", hashed_password="hash"))
+        await persistence.create_maze(schemas.Maze(id="a", entrance="A1", gridSize="2x2", walls=["B1", "B2"]), "user1")
+        await persistence.save_maze_solution(
+            schemas.MazeSolution(maze_id="a", steps="min", path=["A1", "A2"], exit="A2"))
+
+        await persistence.update_maze_walls("a", "user2", ["A2"], ["B1"])
+        assert (await persistence.get_maze_by_id_and_owner("a", "user1")).walls == ["B1", "B2"]
+        assert await persistence.get_maze_version("a", "user1") == 0
+        assert await persistence.get_maze_version("a", "user2") is None
+
+        await persistence.update_maze_walls("a", "user1", ["A2"], ["B1"])
+        assert (await persistence.get_maze_by_id_and_owner("a", "user1")).walls == ["B2", "A2"]
+        assert await persistence.get_maze_version("a", "user1") == 1
+        assert await persistence.get_maze_solution("a", "min") is None
+
+    run_with_persistence(test)
@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.persistence import schemas
+from app.persistence.persistence import SqlAlchemyPersistence, init_db
+
+# the tables as created before mazes had versions
+OLD_SCHEMA = (
+    "CREATE TABLE users (username VARCHAR PRIMARY KEY, hashed_password VARCHAR)",
+    "CREATE TABLE mazes (id VARCHAR PRIMARY KEY, entrance VARCHAR, grid_size VARCHAR, walls JSON, "
+    "owner_username VARCHAR REFERENCES users (username))",
+    "CREATE TABLE maze_solutions (maze_id VARCHAR REFERENCES mazes (id), steps VARCHAR, path JSON, exit VARCHAR, "
+    "exact BOOLEAN, error VARCHAR, PRIMARY KEY (maze_id, steps))",
+    "INSERT INTO users VALUES ('user1', 'hash')",
+    "INSERT INTO mazes VALUES ('a', 'A1', '2x2', '[\"B1\", \"B2\"]', 'user1')",
+    "INSERT INTO maze_solutions VALUES ('a', 'min', '[\"A1\", \"A2\"]', 'A2', 1, NULL)",
+)
+
+
+def test_init_db_should_add_columns_and_indexes_missing_from_existing_tables():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.execute(text(statement))
+
+    init_db(engine)
+    init_db(engine)
+    assert "ix_mazes_owner_username_id" in {index['name'] for index in inspect(engine).get_indexes("mazes")}
+    with sessionmaker(bind=engine)() as session:
+        persistence = SqlAlchemyPersistence(session)
+        assert persistence.get_maze_version("a", "user1") == 0
+        assert persistence.get_maze_solution("a", "min").maze_version == 0
+
+        persistence.update_maze_walls("a", "user1", ["A2"], ["B1"])
+        assert persistence.get_maze_version("a", "user1") == 1
+        persistence.create_maze(schemas.Maze(id="b", entrance="A1", gridSize="1x1", walls=[]), "user1")
+        assert persistence.get_maze_version("b", "user1") == 0
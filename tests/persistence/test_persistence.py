@@ -0,0 +1,12 @@
+from sqlalchemy.dialects import postgresql
+
+from app.persistence.persistence import array_walls_delta, update_maze_walls_statement
+
+
+def test_walls_delta_should_keep_postgres_arrays_of_the_column_type():
+    statement = update_maze_walls_statement("a", "user1", array_walls_delta(["A2", "C1"], ["B1"]))
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    # array_cat(varchar[], text[]) doesn't exist
+    assert "walls=array_cat(array_remove(mazes.walls, %(array_remove_1)s), " \
+           "CAST(ARRAY[%(param_1)s, %(param_2)s] AS VARCHAR[]))" in sql
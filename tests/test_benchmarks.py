@@ -0,0 +1,23 @@
+import pytest
+
+from app.maze.maze_solver import MazeSolver
+from app.maze.models import Maze
+from benchmarks.generators import GENERATORS, generate
+from benchmarks.run import compare
+
+
+@pytest.mark.parametrize("kind", GENERATORS)
+@pytest.mark.parametrize("width,height", [(5, 5), (6, 6), (12, 9), (9, 12)])
+def test_generated_mazes_should_have_a_single_exit(kind, width, height):
+    payload = generate(kind, width, height)
+    assert payload == generate(kind, width, height)
+
+    solver = MazeSolver(Maze(id="1", **payload))
+    assert solver.get_exit()[1] == height - 1
+
+
+def test_compare_should_report_slower_timings_only():
+    baseline = {'a': {'median': 1.0}, 'b': {'median': 1.0}, 'c': {'median': 0.0001}}
+    results = {'a': {'median': 1.1}, 'b': {'median': 1.5}, 'c': {'median': 0.0009}, 'd': {'median': 9.0}}
+
+    assert compare(results, baseline, threshold=1.25, min_duration=0.001) == ["b: 1.000000s -> 1.500000s (1.50x)"]
@@ -1,8 +1,21 @@
-from fastapi.testclient import TestClient
-from fastapi.testclient import TestClient
+import asyncio
+import base64
+import json
+from contextlib import nullcontext
 
-from app.main import app, get_user, get_persistence
-from app.persistence.persistence import InMemoryPersistence
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.main import app, get_user, get_persistence, get_incremental_solutions, get_route_indexes
+from app.maze.incremental import IncrementalSolutions
+from app.maze.maze_service import EagerSolver, MazeService
+from app.maze.models import CreateMazePayload
+from app.maze.routes import RouteIndexes
+from app.maze.solver_executor import SolverExecutor
+from app.persistence import schemas
+from app.persistence.persistence import InMemoryPersistence, SqlAlchemyPersistence, init_db
 
 client = TestClient(app)
 
@@ -61,6 +74,63 @@ def test_create_maze_should_fail_for_invalid_grid_size():
     assert resp.json()['detail'][0]['msg'] == 'string does not match regex "[1-9][0-9]*x[1-9][0-9]*"'
 
 
+def test_create_maze_should_fail_for_invalid_coords():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "3x3",
+        "walls": ["B1", "B0"],
+    }
+    resp = client.post('/maze', json=payload)
+    assert resp.status_code == 422
+    assert resp.json()['detail'][0]['msg'] == 'Invalid coordinates B0.'
+
+
+def test_create_maze_should_drop_duplicate_walls():
+    payload = {"entrance": "A1", "gridSize": "3x3", "walls": ["B1", "B2", "B1", "B3", "B2"]}
+    resp = client.post('/maze', json=payload)
+    assert resp.status_code == 200
+    assert resp.json()['walls'] == ["B1", "B2", "B3"]
+
+
+def test_create_maze_should_accept_compact_wall_encodings():
+    # 010 / 010 / 010 row by row is 0b010010010 padded to 0b01001001_00000000
+    for walls in ({"wallsGrid": ["010", "010", "010"]}, {"wallsBitmap": base64.b64encode(b'\x49\x00').decode()}):
+        resp = client.post('/maze', json={"entrance": "A1", "gridSize": "3x3", **walls})
+        assert resp.status_code == 200
+        assert resp.json()['walls'] == ["B1", "B2", "B3"]
+        assert 'wallsGrid' not in resp.json() and 'wallsBitmap' not in resp.json()
+
+
+def test_create_maze_should_fail_for_invalid_compact_wall_encodings():
+    cases = [
+        ({"walls": ["B1"], "wallsGrid": ["010", "010", "010"]},
+         "Exactly one of walls, wallsBitmap and wallsGrid must be given."),
+        ({}, "Exactly one of walls, wallsBitmap and wallsGrid must be given."),
+        ({"wallsGrid": ["010", "0x0", "010"]}, "Walls grid row 2 must be 3 characters of 0 and 1."),
+        ({"wallsGrid": ["010", "010"]}, "Walls grid must have 3 rows."),
+        ({"wallsBitmap": "SQ"}, "Walls bitmap is not valid base64."),
+        ({"wallsBitmap": "SQ=="}, "Walls bitmap must have 2 bytes for a 3x3 grid."),
+        ({"wallsGrid": ["100", "000", "000"]}, "Entrance can't be where wall is."),
+    ]
+    for walls, message in cases:
+        resp = client.post('/maze', json={"entrance": "A1", "gridSize": "3x3", **walls})
+        assert resp.status_code == 422
+        assert resp.json()['detail'][0]['msg'] == message
+
+
+def test_get_solution_should_support_more_than_26_columns():
+    payload = {
+        "entrance": "AB1",
+        "gridSize": "30x12",
+        "walls": [f"{column}{row}" for column in ["AA", "AC"] for row in range(1, 13)],
+    }
+    id = client.post('/maze', json=payload).json()['id']
+
+    resp = client.get(f'/maze/{id}/solution?steps=min')
+    assert resp.status_code == 200
+    assert resp.json() == [f"AB{row}" for row in range(1, 13)]
+
+
 def test_get_solution_with_invalid_steps_returns_400():
     payload = {
         "entrance": "A1",
@@ -106,6 +176,81 @@ def test_get_max_solution_should_return_path():
     resp = client.get(f'/maze/{id}/solution?steps=max')
     assert resp.status_code == 200
     assert resp.json() == ['A1', 'B1', 'B2', 'B3', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']
+    assert resp.headers['X-Solution-Exact'] == 'true'
+    assert resp.headers['X-Solution-Strategy'] == 'tree-walk'
+
+
+def test_get_solution_should_stream_ndjson_and_encode_directions():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "8x8",
+        "walls": ["C1", "G1", "A2", "C2", "E2", "G2", "C3", "E3", "B4", "C4", "E4", "F4", "G4",
+                  "B5", "E5", "B6", "D6",
+                  "E6", "G6", "H6", "B7", "D7", "G7", "B8"],
+    }
+    id = client.post('/maze', json=payload).json()['id']
+
+    resp = client.get(f'/maze/{id}/solution?steps=min', headers={'Accept': 'application/x-ndjson'})
+    assert resp.headers['content-type'] == 'application/x-ndjson'
+    assert resp.headers['X-Solution-Exact'] == 'true'
+    assert [json.loads(line) for line in resp.text.splitlines()] == [
+        ['A1', 'B1', 'B2', 'B3', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']]
+
+    resp = client.get(f'/maze/{id}/solution?steps=min&format=directions')
+    assert resp.json() == 'R1 D2 L1 D5'
+    resp = client.get(f'/maze/{id}/solution?steps=min&format=directions&stream=true')
+    assert resp.text == '["R1","D2","L1","D5"]\n'
+
+
+def test_get_solution_should_be_cached_across_identical_mazes():
+    payload = {
+        "entrance": "B1",
+        "gridSize": "3x3",
+        "walls": ["A2", "C2", "A3", "C3"],
+    }
+    first_id = client.post('/maze', json=payload).json()['id']
+    second_id = client.post('/maze', json=payload).json()['id']
+    hits = client.get('/solution-cache').json()['hits']
+
+    assert client.get(f'/maze/{first_id}/solution?steps=min').json() == ['B1', 'B2', 'B3']
+    assert client.get(f'/maze/{second_id}/solution?steps=min').json() == ['B1', 'B2', 'B3']
+    assert client.get('/solution-cache').json()['hits'] == hits + 1
+
+
+def eager_solve(payload: dict, max_pending: int) -> str:
+    solver = SolverExecutor(max_workers=1, max_pending=max_pending, timeout=10)
+    eager = EagerSolver(solver, lambda: nullcontext(persistence))
+    service = MazeService(persistence, eager_solver=eager)
+
+    async def create():
+        maze = await service.create_maze(CreateMazePayload(**payload), 'test1')
+        await eager.drain()
+        return maze.id
+
+    try:
+        return asyncio.run(create())
+    finally:
+        solver.shutdown()
+
+
+def test_get_solution_should_return_precomputed_solution():
+    id = eager_solve({"entrance": "A1", "gridSize": "4x4", "walls": ["A2", "B2", "C2", "D2"]}, max_pending=1)
+
+    assert persistence.get_maze_solution(id, 'min').error == 'No exit found.'
+    resp = client.get(f'/maze/{id}/solution?steps=max')
+    assert resp.status_code == 500
+    assert resp.json() == {'message': 'No exit found.'}
+
+    id = eager_solve({"entrance": "A1", "gridSize": "2x2", "walls": ["B1", "B2"]}, max_pending=1)
+    assert persistence.get_maze_solution(id, 'min').path == ['A1', 'A2']
+    assert persistence.get_maze_solution(id, 'max').path == ['A1', 'A2']
+
+
+def test_eager_solve_should_leave_mazes_to_requests_when_solver_is_busy():
+    id = eager_solve({"entrance": "A1", "gridSize": "2x2", "walls": ["B1", "B2"]}, max_pending=0)
+
+    assert persistence.get_maze_solution(id, 'min') is None
+    assert client.get(f'/maze/{id}/solution?steps=min').json() == ['A1', 'A2']
 
 
 def test_get_solution_for_maze_without_one_should_return_500():
@@ -136,6 +281,200 @@ def test_get_solution_for_maze_with_multiple_exits_should_return_500():
     assert resp.json() == {'message': 'Multiple exits detected: A4, B4, C4, D4.'}
 
 
+def test_get_exits_should_list_every_exit_instead_of_failing():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "2x2",
+        "walls": [],
+    }
+    id = client.post('/maze', json=payload).json()['id']
+
+    resp = client.get(f'/maze/{id}/solution?steps=exits')
+    assert resp.status_code == 200
+    assert resp.json() == {'exits': [{'exit': 'A2', 'distance': 1, 'path': ['A1', 'A2']},
+                                     {'exit': 'B2', 'distance': 2, 'path': ['A1', 'B1', 'B2']}]}
+
+    resp = client.get(f'/maze/{id}/solution?steps=exits&distances=true')
+    assert resp.json()['distances'] == [[0, 1], [1, 2]]
+
+
+def test_edit_maze_should_update_walls_and_repair_solution():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "2x3",
+        "walls": ["B1", "B2", "B3"],
+    }
+    resp = client.post('/maze', json=payload)
+    id = resp.json()['id']
+    resp = client.get(f'/maze/{id}/solution?steps=min')
+    assert resp.json() == ['A1', 'A2', 'A3']
+
+    resp = client.patch(f'/maze/{id}', json={'add': ['A3', 'B1'], 'remove': ['B2', 'B3']})
+    assert resp.status_code == 200
+    assert resp.json() == {'id': id, 'entrance': 'A1', 'gridSize': '2x3', 'walls': ['B1', 'A3']}
+
+    resp = client.get(f'/maze/{id}/solution?steps=min')
+    assert resp.status_code == 200
+    assert resp.json() == ['A1', 'A2', 'B2', 'B3']
+    assert resp.headers['X-Solution-Strategy'] == 'incremental'
+
+    resp = client.get(f'/maze/{id}/solution?steps=max')
+    assert resp.json() == ['A1', 'A2', 'B2', 'B3']
+
+
+def with_sqlalchemy_persistence(test):
+    """Runs test against the sync SQLAlchemy backend, whose sessions expire rows on commit like SessionLocal's."""
+    engine = create_engine("sqlite://", connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    init_db(engine)
+    session_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with session_maker() as session:
+        SqlAlchemyPersistence(session).create_user(schemas.UserCreate(username="sql1", hashed_password="hash"))
+
+    def get_sqlalchemy_persistence():
+        with session_maker() as session:
+            yield SqlAlchemyPersistence(session)
+
+    incremental = IncrementalSolutions(max_mazes=8)
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_persistence] = get_sqlalchemy_persistence
+    app.dependency_overrides[get_user] = lambda: 'sql1'
+    app.dependency_overrides[get_incremental_solutions] = lambda: incremental
+    try:
+        test(session_maker)
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+        engine.dispose()
+
+
+def test_edit_maze_should_return_edited_walls_with_sqlalchemy_persistence():
+    def test(_):
+        payload = {"entrance": "A1", "gridSize": "3x3", "walls": ["B1", "B2"]}
+        id = client.post('/maze', json=payload).json()['id']
+
+        resp = client.patch(f'/maze/{id}', json={'add': ['C1', 'A3', 'C3'], 'remove': ['B2']})
+        assert resp.status_code == 200
+        assert resp.json()['walls'] == ['B1', 'C1', 'A3', 'C3']
+
+        resp = client.get(f'/maze/{id}/solution?steps=min')
+        assert resp.json() == ['A1', 'A2', 'B2', 'B3']
+        assert resp.headers['X-Solution-Strategy'] == 'incremental'
+
+    with_sqlalchemy_persistence(test)
+
+
+def test_edit_maze_should_ignore_solutions_stored_for_the_old_walls():
+    def test(session_maker):
+        payload = {"entrance": "A1", "gridSize": "2x3", "walls": ["B1", "B2", "B3"]}
+        id = client.post('/maze', json=payload).json()['id']
+        resp = client.patch(f'/maze/{id}', json={'add': ['A3', 'B1'], 'remove': ['B2', 'B3']})
+        assert resp.status_code == 200
+
+        # an eager solve of the original walls finishing after the edit
+        with session_maker() as session:
+            SqlAlchemyPersistence(session).save_maze_solution(schemas.MazeSolution(
+                maze_id=id, steps='min', path=['A1', 'A2', 'A3'], exit='A3', maze_version=0))
+
+        resp = client.get(f'/maze/{id}/solution?steps=min')
+        assert resp.json() == ['A1', 'A2', 'B2', 'B3']
+        resp = client.post('/maze/solutions:batch', json=[{'mazeId': id, 'steps': 'min'}])
+        assert resp.json()[0]['path'] == ['A1', 'A2', 'B2', 'B3']
+
+    with_sqlalchemy_persistence(test)
+
+
+def test_edit_maze_should_fail_for_invalid_edits():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "2x3",
+        "walls": ["B1", "B2", "B3"],
+    }
+    resp = client.post('/maze', json=payload)
+    id = resp.json()['id']
+
+    resp = client.patch(f'/maze/{id}', json={'add': ['C1']})
+    assert resp.status_code == 422
+    assert resp.json() == {'message': 'Wall C1 is not within bounds.'}
+
+    resp = client.patch(f'/maze/{id}', json={'add': ['A1']})
+    assert resp.status_code == 422
+    assert resp.json() == {'message': "Entrance can't be where wall is."}
+
+    resp = client.patch(f'/maze/{id}', json={'add': ['A2'], 'remove': ['A2']})
+    assert resp.status_code == 422
+
+    resp = client.patch('/maze/idontexist', json={'add': ['A2']})
+    assert resp.status_code == 404
+
+
+def test_get_route_should_return_shortest_path_between_any_cells():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "4x3",
+        "walls": ["B1", "C1", "B2", "D2", "D3"],
+    }
+    resp = client.post('/maze', json=payload)
+    id = resp.json()['id']
+
+    resp = client.get(f'/maze/{id}/route?from=A1&to=C2')
+    assert resp.status_code == 200
+    assert resp.json() == {'reachable': True, 'distance': 5, 'path': ['A1', 'A2', 'A3', 'B3', 'C3', 'C2']}
+
+    resp = client.get(f'/maze/{id}/route?from=C2&to=C2')
+    assert resp.json() == {'reachable': True, 'distance': 0, 'path': ['C2']}
+
+    resp = client.get(f'/maze/{id}/route?from=A1&to=D1')
+    assert resp.json() == {'reachable': False, 'distance': None, 'path': []}
+
+
+def test_get_route_should_only_load_walls_of_mazes_not_indexed_since_edited(monkeypatch):
+    indexes = RouteIndexes(max_mazes=8)
+    app.dependency_overrides[get_route_indexes] = lambda: indexes
+    loads = []
+    get_maze = persistence.get_maze_by_id_and_owner
+    monkeypatch.setattr(persistence, 'get_maze_by_id_and_owner', lambda *args: loads.append(args) or get_maze(*args))
+    id = client.post('/maze', json={"entrance": "A1", "gridSize": "2x2", "walls": ["B1", "A2"]}).json()['id']
+
+    assert client.get(f'/maze/{id}/route?from=A1&to=B2').json()['reachable'] is False
+    assert client.get(f'/maze/{id}/route?from=A1&to=B2').json()['reachable'] is False
+    assert len(loads) == 1
+
+    client.patch(f'/maze/{id}', json={'remove': ['A2']})
+    loads.clear()
+    assert client.get(f'/maze/{id}/route?from=A1&to=B2').json()['path'] == ['A1', 'A2', 'B2']
+    assert client.get(f'/maze/{id}/route?from=B2&to=A1').json()['path'] == ['B2', 'A2', 'A1']
+    assert len(loads) == 1
+    del app.dependency_overrides[get_route_indexes]
+
+
+def test_get_route_should_fail_for_invalid_cells():
+    payload = {
+        "entrance": "A1",
+        "gridSize": "4x3",
+        "walls": ["B1", "C1", "B2", "D2", "D3"],
+    }
+    resp = client.post('/maze', json=payload)
+    id = resp.json()['id']
+
+    resp = client.get(f'/maze/{id}/route?from=B1&to=A1')
+    assert resp.status_code == 422
+    assert resp.json() == {'message': 'Cell B1 is a wall.'}
+
+    resp = client.get(f'/maze/{id}/route?from=A1&to=E1')
+    assert resp.status_code == 422
+    assert resp.json() == {'message': 'Cell E1 is not within bounds.'}
+
+    resp = client.get(f'/maze/{id}/route?from=1A&to=A1')
+    assert resp.status_code == 422
+    assert resp.json() == {'message': 'Invalid coordinates 1A.'}
+
+    resp = client.get(f'/maze/{id}/route?from=A1')
+    assert resp.status_code == 422
+
+    resp = client.get('/maze/idontexist/route?from=A1&to=A2')
+    assert resp.status_code == 404
+
+
 def test_get_mazes_should_return_only_my_mazes():
     app.dependency_overrides[get_user] = lambda: 'user1'
     payload = {
@@ -166,6 +505,64 @@ def test_get_mazes_should_return_only_my_mazes():
     assert {user1_maze1, user1_maze2} != {user2_maze1, user2_maze2}
 
 
+def test_get_mazes_should_paginate_and_project_fields():
+    app.dependency_overrides[get_user] = lambda: 'user3'
+    payload = {
+        "entrance": "A1",
+        "gridSize": "4x4",
+        "walls": ["B1"],
+    }
+    ids = sorted(client.post('/maze', json=payload).json()['id'] for _ in range(3))
+
+    resp = client.get('/maze?limit=2&fields=gridSize')
+    assert resp.json() == [{'id': ids[0], 'gridSize': '4x4'}, {'id': ids[1], 'gridSize': '4x4'}]
+    cursor = resp.headers['X-Next-Cursor']
+    assert cursor == ids[1]
+
+    resp = client.get(f'/maze?limit=2&after={cursor}')
+    assert [maze['id'] for maze in resp.json()] == [ids[2]]
+    assert resp.json()[0]['walls'] == ['B1']
+    assert 'X-Next-Cursor' not in resp.headers
+
+
+def test_create_mazes_in_batch_should_validate_all_of_them():
+    app.dependency_overrides[get_user] = lambda: 'user4'
+    valid = {"entrance": "A1", "gridSize": "2x2", "walls": ["B1"]}
+    invalid = {"entrance": "A1", "gridSize": "2x2", "walls": ["C1"]}
+
+    resp = client.post('/maze/batch', json=[valid, invalid])
+    assert resp.status_code == 422
+    assert resp.json()['detail'][0]['loc'][1] == 1
+    assert client.get('/maze').json() == []
+
+    resp = client.post('/maze/batch', json=[valid, valid])
+    assert resp.status_code == 200
+    assert [maze['walls'] for maze in resp.json()] == [['B1'], ['B1']]
+    assert {maze['id'] for maze in client.get('/maze').json()} == {maze['id'] for maze in resp.json()}
+
+
+def test_get_solutions_in_batch_should_report_errors_inline():
+    app.dependency_overrides[get_user] = lambda: 'user4'
+    ids = [maze['id'] for maze in client.post('/maze/batch', json=[
+        {"entrance": "B1", "gridSize": "3x3", "walls": ["A2", "C2", "A3", "C3"]},
+        {"entrance": "A1", "gridSize": "2x2", "walls": ["A2", "B2"]},
+    ]).json()]
+
+    resp = client.post('/maze/solutions:batch', json=[
+        {'mazeId': ids[0], 'steps': 'min'},
+        {'mazeId': ids[1], 'steps': 'max'},
+        {'mazeId': 'idontexist', 'steps': 'min'},
+        {'mazeId': ids[0], 'steps': 'min'},
+    ])
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {'mazeId': ids[0], 'steps': 'min', 'path': ['B1', 'B2', 'B3'], 'exact': True, 'strategy': 'bfs'},
+        {'mazeId': ids[1], 'steps': 'max', 'error': {'status': 500, 'message': 'No exit found.'}},
+        {'mazeId': 'idontexist', 'steps': 'min', 'error': {'status': 404, 'message': 'Maze not found.'}},
+        {'mazeId': ids[0], 'steps': 'min', 'path': ['B1', 'B2', 'B3'], 'exact': True, 'strategy': 'bfs'},
+    ]
+
+
 def test_return_404_if_maze_does_not_exist():
     app.dependency_overrides[get_user] = lambda: 'user1'
     resp = client.get(f'/maze/idontexist/solution?steps=min')
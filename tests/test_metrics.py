@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app, get_user, get_persistence
+from app.metrics import Counter, Histogram, Registry
+from app.persistence.persistence import InMemoryPersistence
+
+
+def test_metrics_should_not_record_while_disabled():
+    registry = Registry()
+    counter = Counter('things_total', "Things.", ['kind'], registry=registry)
+    histogram = Histogram('thing_seconds', "Thing time.", registry=registry)
+
+    counter.inc(kind='a')
+    with histogram.time():
+        pass
+    assert registry.drain() == {'things_total': {}, 'thing_seconds': {}}
+
+
+def test_metrics_should_render_prometheus_text():
+    registry = Registry()
+    registry.enabled = True
+    counter = Counter('things_total', "Things.", ['kind'], registry=registry)
+    histogram = Histogram('thing_seconds', "Thing time.", buckets=(0.1, 1.0), registry=registry)
+
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render() == (
+        '# HELP things_total Things.\n'
+        '# TYPE things_total counter\n'
+        'things_total{kind="a"} 3\n'
+        '# HELP thing_seconds Thing time.\n'
+        '# TYPE thing_seconds histogram\n'
+        'thing_seconds_bucket{le="0.1"} 0\n'
+        'thing_seconds_bucket{le="1.0"} 1\n'
+        'thing_seconds_bucket{le="+Inf"} 2\n'
+        'thing_seconds_count 2\n'
+        'thing_seconds_sum 5.5\n'
+    )
+
+
+def test_metrics_should_merge_samples_drained_from_another_registry():
+    worker, web = Registry(), Registry()
+    worker.enabled = web.enabled = True
+    for registry in (worker, web):
+        Counter('things_total', "Things.", registry=registry).inc()
+        Histogram('thing_seconds', "Thing time.", buckets=(1.0,), registry=registry).observe(0.5)
+
+    web.merge(worker.drain())
+    assert 'things_total 2\n' in web.render()
+    assert 'thing_seconds_count 2\n' in web.render()
+    assert worker.drain() == {'things_total': {}, 'thing_seconds': {}}
+
+
+def test_instrument_should_time_sync_and_async_methods():
+    registry = Registry()
+    registry.enabled = True
+    histogram = Histogram('call_seconds', "Call time.", ['method'], registry=registry)
+
+    @metrics.instrument(histogram)
+    class Service:
+        def get(self):
+            return 1
+
+        async def fetch(self):
+            return 2
+
+    assert Service().get() == 1
+    assert asyncio.run(Service().fetch()) == 2
+    rendered = registry.render()
+    assert 'call_seconds_count{method="get"} 1\n' in rendered
+    assert 'call_seconds_count{method="fetch"} 1\n' in rendered
+
+
+def test_metrics_endpoint_should_expose_solver_metrics():
+    client = TestClient(app)
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_user] = lambda: 'metrics'
+    persistence = InMemoryPersistence()
+    app.dependency_overrides[get_persistence] = lambda: persistence
+    metrics.enable()
+    try:
+        payload = {"entrance": "A1", "gridSize": "2x3", "walls": ["B1", "B2", "B3"]}
+        maze_id = client.post('/maze', json=payload).json()['id']
+        assert client.get(f'/maze/{maze_id}/solution?steps=max').status_code == 200
+
+        body = client.get('/metrics').text
+        assert 'solver_duration_seconds_count{steps="max",size="le100"}' in body
+        assert 'solver_expansions_total{search="bfs"}' in body
+        assert 'maze_fetch_duration_seconds_count' in body
+        assert 'solution_cache_lookups_total{result="miss"}' in body
+    finally:
+        metrics.enable(False)
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import logging
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app import main
+from app.maze.maze_service import MazeService
+from app.maze.models import CreateMazePayload, Steps
+from app.persistence.persistence import InMemoryPersistence
+from app.profiling import RequestProfile, collect, current_profile
+
+
+def busy_loop(n):
+    return sum(i * i for i in range(n))
+
+
+def test_collect_should_return_result_and_stats():
+    result, stats = collect(busy_loop, 1000)
+
+    assert result == busy_loop(1000)
+    assert any(function == 'busy_loop' for (_, _, function) in stats)
+
+
+def test_request_profile_should_summarize_own_and_added_stats(tmp_path):
+    _, stats = collect(busy_loop, 1000)
+    with RequestProfile() as profile:
+        assert current_profile.get() is profile
+        assert RequestProfile.busy()
+        sum(range(1000))
+    profile.add(stats)
+
+    assert current_profile.get() is None
+    assert not RequestProfile.busy()
+    summary = profile.summary(100)
+    assert 'test_profiling.py' in summary
+    assert '(busy_loop)=' in summary
+    assert len(profile.summary(1).split('; ')) == 1
+    assert profile.save(str(tmp_path)) == str(tmp_path / f"{profile.id}.prof")
+    assert (tmp_path / f"{profile.id}.prof").exists()
+
+
+def test_slow_solves_should_be_logged_with_the_maze_geometry(caplog):
+    service = MazeService(InMemoryPersistence(), slow_solve_seconds=1e-9)
+    payload = CreateMazePayload(entrance='A1', gridSize='3x3', walls=['B1', 'B2', 'B3'])
+
+    async def solve():
+        maze = await service.create_maze(payload, 'owner')
+        return await service.get_maze_solution('owner', maze.id, Steps.MIN)
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(solve())
+
+    [record] = [record for record in caplog.records if 'steps took' in record.getMessage()]
+    geometry = json.loads(record.getMessage().split(': ', 1)[1])
+    assert CreateMazePayload(**geometry) == payload
+
+
+def test_profile_token_should_only_profile_matching_requests(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'profile_token', 'secret')
+    monkeypatch.setattr(main, 'profile_dir', str(tmp_path))
+
+    async def call_next(_):
+        return Response()
+
+    def profile(token):
+        headers = [(b'x-profile', token.encode('latin-1'))]
+        request = Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers})
+        return asyncio.run(main.profile_request(request, call_next))
+
+    assert 'X-Profile-Id' in profile('secret').headers
+    assert 'X-Profile-Id' not in profile('other').headers
+    assert 'X-Profile-Id' not in profile('s\xe9cret').headers
@@ -1,9 +1,12 @@
 import json
 
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
 
-from app.main import app, get_user_service, get_persistence
-from app.persistence.persistence import InMemoryPersistence
+from app.database import SessionLocal, engine_options
+from app.main import app, get_user_service, get_persistence, get_token_signer, get_token_cache
+from app.persistence.persistence import InMemoryPersistence, init_db
+from app.user.tokens import TokenSigner
 from app.user.user_service import UserService
 
 client = TestClient(app)
@@ -50,3 +53,56 @@ def test_login_if_credentials_dont_match__should_return_200_and_token():
     resp = client.post('/login', json.dumps({'username': 'testuser', 'password': 'passw0rd'}))
     assert resp.status_code == 200
     assert len(resp.json()['token']) > 0
+
+
+def test_logout_should_revoke_token():
+    persistence = InMemoryPersistence()
+    app.dependency_overrides[get_persistence] = lambda: persistence
+
+    client.post('/user', json.dumps({'username': 'testuser', 'password': 'passw0rd'}))
+    token = client.post('/login', json.dumps({'username': 'testuser', 'password': 'passw0rd'})).json()['token']
+
+    assert client.get('/maze', headers={'X-Token': token}).status_code == 200
+    assert client.post('/logout', headers={'X-Token': token}).status_code == 200
+    resp = client.get('/maze', headers={'X-Token': token})
+    assert resp.status_code == 403
+    assert resp.json() == {'message': 'Invalid token.'}
+
+
+def test_signed_tokens_should_not_be_stored():
+    persistence = InMemoryPersistence()
+    app.dependency_overrides[get_persistence] = lambda: persistence
+    signer = TokenSigner('secret', ttl=60)
+    app.dependency_overrides[get_token_signer] = lambda: signer
+    # the revocation mustn't depend on the token cache
+    app.dependency_overrides[get_token_cache] = lambda: None
+
+    client.post('/user', json.dumps({'username': 'testuser', 'password': 'passw0rd'}))
+    token = client.post('/login', json.dumps({'username': 'testuser', 'password': 'passw0rd'})).json()['token']
+    assert persistence.get_user_for_token(token) is None
+
+    assert client.get('/maze', headers={'X-Token': token}).status_code == 200
+    assert client.post('/logout', headers={'X-Token': token}).status_code == 200
+    assert client.get('/maze', headers={'X-Token': token}).status_code == 403
+    assert client.get('/maze', headers={'X-Token': token[:-1] + '\xe9'}).status_code == 403
+    del app.dependency_overrides[get_token_signer]
+    del app.dependency_overrides[get_token_cache]
+
+
+def test_user_should_be_able_to_register_with_sqlite_sessions(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'maze.sqlite3'}"
+    engine = create_engine(uri, **engine_options(uri))
+    init_db(engine)
+    bind = SessionLocal.kw['bind']
+    SessionLocal.configure(bind=engine)
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides.clear()
+    try:
+        # every call of a request's session runs on another thread
+        assert client.post('/user', json.dumps({'username': 'testuser', 'password': 'passw0rd'})).status_code == 200
+        token = client.post('/login', json.dumps({'username': 'testuser', 'password': 'passw0rd'})).json()['token']
+        assert client.get('/maze', headers={'X-Token': token}).status_code == 200
+    finally:
+        app.dependency_overrides.update(overrides)
+        SessionLocal.configure(bind=bind)
+        engine.dispose()
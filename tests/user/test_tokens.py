@@ -0,0 +1,56 @@
+import time
+
+from app.user.tokens import TokenCache, TokenSigner
+
+
+def test_token_cache_returns_cached_and_negative_entries():
+    cache = TokenCache(ttl=60, negative_ttl=60, max_size=10)
+    cache.put('good', 'user')
+    cache.put('bad', None)
+
+    assert cache.get('good') == (True, 'user')
+    assert cache.get('bad') == (True, None)
+    assert cache.get('unknown') == (False, None)
+
+    cache.invalidate('good')
+    assert cache.get('good') == (False, None)
+
+
+def test_token_cache_expires_and_evicts_least_recently_used():
+    cache = TokenCache(ttl=60, negative_ttl=0, max_size=2)
+    cache.put('bad', None)
+    time.sleep(0.01)
+    assert cache.get('bad') == (False, None)
+
+    cache.put('a', 'user')
+    cache.put('b', 'user')
+    cache.get('a')
+    cache.put('c', 'user')
+    assert cache.get('a') == (True, 'user')
+    assert cache.get('b') == (False, None)
+
+
+def test_token_signer_verifies_own_tokens_only():
+    signer = TokenSigner('secret', ttl=60)
+    token = signer.issue('user.name')
+
+    assert TokenSigner.is_signed(token)
+    assert signer.verify(token) == 'user.name'
+    assert TokenSigner('other', ttl=60).verify(token) is None
+    assert signer.verify(token[:-1]) is None
+    assert not TokenSigner.is_signed('3f6c1c66-0d5b-4c1e-9d3f-9d6b1c0a2b7e')
+
+
+def test_token_signer_rejects_expired_tokens():
+    signer = TokenSigner('secret', ttl=-1)
+    assert signer.verify(signer.issue('user')) is None
+
+
+def test_token_signer_rejects_revoked_and_non_ascii_tokens():
+    signer = TokenSigner('secret', ttl=60)
+    token, other = signer.issue('user'), signer.issue('other')
+    signer.revoke(token)
+
+    assert signer.verify(token) is None
+    assert signer.verify(other) == 'other'
+    assert signer.verify(other[:-1] + '\xe9') is None